@@ -2,14 +2,18 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from gui import Sidebar
+from background_job import BackgroundJob
 from db import Database
-from photo_importer import PhotoImporter
+from metadata_cache import PhotoMetadataCache
+from photo_importer import PhotoImporter, default_worker_count
 from photo_viewer import PhotoViewer
 from filmstrip_viewer import FilmstripViewer
 from exif_viewer import ExifViewer
 from score_viewer import ScoreViewer
 from duplicate_viewer import DuplicateViewer
 
+IMPORT_COUNTS = ("imported", "updated", "relinked", "skipped", "failed")  # summed over resumed runs
+
 
 class AutoCullApp(tk.Tk):
     def __init__(self):
@@ -20,10 +24,11 @@ class AutoCullApp(tk.Tk):
 
         # Database
         self.db = Database()
-        self.db.create_schema()
+        self.db.migrate()  # one query when the schema is current
+        self.metadata_cache = PhotoMetadataCache(self.db)
 
         # Importer
-        self.importer = PhotoImporter(self.db)
+        self.importer = PhotoImporter(self.db, workers=default_worker_count())
 
         # Setup menubar
         self.setup_menubar()
@@ -67,6 +72,9 @@ class AutoCullApp(tk.Tk):
         self.bind("<Configure>", lambda e: self.update_layout())
         self.update_layout()
 
+        # Offer to finish imports a previous session left unfinished
+        self.after(500, self.resume_interrupted_imports)
+
     # ---------- Layout ----------
     def update_layout(self):
         w, h = self.winfo_width(), self.winfo_height()
@@ -126,22 +134,92 @@ class AutoCullApp(tk.Tk):
         if not folder_path:
             return
 
-        # Create a collection for the import
-        collection_id = self.db.add_collection("Imported Collection")
+        # Importing the same folder again adds to its existing collection
+        collection_id = self.db.get_or_create_collection("Imported Collection", folder_path)
 
-        try:
-            imported_count = self.importer.import_folder(
-                folder_path, collection_id, default_styles=["Travel"]
+        # Show the collection now; new photos are appended as each batch is written
+        self.photo_viewer.refresh_photos(collection_id)
+        self.filmstrip.refresh_thumbs()
+
+        def run(job):
+            self.importer.import_folder(
+                folder_path, collection_id, default_styles=["Travel"],
+                progress=self._import_progress(job), cancel_event=job.cancel_event
             )
-            messagebox.showinfo("Import Complete", f"Imported {imported_count} photos.")
-        except Exception as e:
-            messagebox.showerror("Import Error", str(e))
+            return self.importer.last_import_stats
+
+        self.left_sidebar.start_job("Importing", run, on_progress=self._show_imported, on_done=self._import_done)
+
+    def _import_progress(self, job, show_photos=True):
+        """
+        Importer progress callback (import thread): add the new photos' rows for the viewers.
+        :param show_photos: False when the collection being imported is not the one on screen
+        """
+        def report(event):
+            event["photos"] = self.db.get_photos_by_ids(event["photo_ids"]) if show_photos else []
+            job.report(event)
+        return report
+
+    def _show_imported(self, event):
+        if event["photos"]:
+            self.photo_viewer.append_photos(event["photos"])
+            self.filmstrip.append_photos(event["photos"])
+
+    def _import_done(self, stats):
+        """:param stats: the import job's stats (see _add_import_stats); None if nothing was imported"""
+        if stats is None:
+            return
+        messagebox.showinfo(
+            "Import Cancelled" if stats["cancelled"] else "Import Complete",
+            f"Imported {stats['imported'] + stats['updated']} photos "
+            f"({stats['skipped'] + stats['relinked']} already up to date)."
+        )
 
-        # Refresh viewer
-        self.photo_viewer.refresh_photos(collection_id)
+    @staticmethod
+    def _add_import_stats(totals, stats):
+        """Sum the counts of several imports' last_import_stats; either may be None."""
+        if stats is None or totals is None:
+            return totals if stats is None else dict(stats)
+        combined = {key: totals[key] + stats[key] for key in IMPORT_COUNTS}
+        return {**combined, "cancelled": totals["cancelled"] or stats["cancelled"]}
+
+    def resume_interrupted_imports(self):
+        """Look for interrupted imports off the Tk thread, then offer to resume them."""
+        BackgroundJob(self, lambda job: self.importer.get_interrupted_imports(),
+                      on_done=self._offer_resume).start()
+
+    def _offer_resume(self, runs):
+        if not runs:
+            return
+        folders = "\n".join(run["source_path"] for run in runs)
+        if not messagebox.askyesno("Resume Import", f"These imports did not finish:\n{folders}\n\nResume them now?"):
+            def abandon(job):
+                for run in runs:
+                    self.importer.abandon_import(run)
+            BackgroundJob(self, abandon).start()
+            return
+
+        self.photo_viewer.refresh_photos(runs[-1]["collection_id"])
         self.filmstrip.refresh_thumbs()
 
-    
+        def run(job):
+            totals = None
+            for interrupted in runs:
+                if job.cancelled:
+                    break
+                # Only the last run's collection is on screen
+                progress = self._import_progress(job, show_photos=interrupted is runs[-1])
+                # resume_import skips runs claimed elsewhere without importing, leaving this None
+                self.importer.last_import_stats = None
+                self.importer.resume_import(
+                    interrupted, default_styles=["Travel"], progress=progress, cancel_event=job.cancel_event
+                )
+                totals = self._add_import_stats(totals, self.importer.last_import_stats)
+            return totals
+
+        self.left_sidebar.start_job("Resuming import", run, on_progress=self._show_imported, on_done=self._import_done)
+
+
 
 
 if __name__ == "__main__":
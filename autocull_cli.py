@@ -0,0 +1,300 @@
+# autocull_cli.py
+"""
+Headless AutoCull: import, scoring and near-duplicate detection without the UI.
+
+    python autocull_cli.py import /photos/2024-05-01 /photos/2024-05-02 --workers 8
+    python autocull_cli.py score /photos/2024-05-01 --missing-only
+    python autocull_cli.py duplicates /photos/2024-05-01 --threshold 6
+
+Output is JSON lines on stdout: 'progress' events while a command runs and
+one 'summary' at the end (or an 'error' if it could not run). Log messages
+go to stderr. Ctrl-C (or SIGTERM) cancels cleanly: work in flight is
+written first; a second Ctrl-C aborts.
+
+Exit codes: 0 success, 1 finished but some files failed, 2 bad arguments,
+3 could not run (e.g. database unreachable, folder missing), 130 cancelled.
+"""
+import argparse
+import contextlib
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from itertools import repeat
+
+from background_job import progress_event
+from db import Database, duplicate_scope
+from duplicates import NearDuplicateDetector
+from photo_importer import PhotoImporter, analysis_pool, default_worker_count, _analyze_file
+from photo_scorer import DEFAULT_WORKING_EDGE
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2  # argparse's own exit status
+EXIT_ERROR = 3
+EXIT_CANCELLED = 130
+
+
+# ----------------- Output -----------------
+class Reporter:
+    """Writes JSON lines to the stdout the CLI started with (library prints are sent to stderr)."""
+
+    def __init__(self, stream, command, show_progress=True):
+        self.stream = stream
+        self.command = command
+        self.show_progress = show_progress
+
+    def emit(self, event, **fields):
+        record = _rounded({"event": event, "command": self.command, **fields})
+        self.stream.write(json.dumps(record, default=str) + "\n")
+        self.stream.flush()
+
+    def progress(self, folder=None):
+        """Progress callback for one folder's run, or None with --no-progress."""
+        if not self.show_progress:
+            return None
+
+        def report(event):
+            event = dict(event)
+            photo_ids = event.pop("photo_ids", None)
+            if photo_ids is not None:
+                event["new_photos"] = len(photo_ids)
+            self.emit("progress", folder=folder, **event)
+        return report
+
+
+def _rounded(value):
+    """Round floats (timings, rates) to milliseconds for readable output."""
+    if isinstance(value, float):
+        return round(value, 3)
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_rounded(item) for item in value]
+    return value
+
+
+# ----------------- Commands -----------------
+def run_import(db, args, reporter, cancel_event):
+    importer = PhotoImporter(
+        db, near_dup_threshold=args.threshold, workers=args.workers, batch_size=args.batch_size,
+        detect_duplicates=not args.no_duplicates, score_max_edge=args.score_edge or None,
+    )
+    results = []
+    for folder in args.folders:
+        if cancel_event.is_set():
+            break
+        try:
+            if not os.path.isdir(folder):  # before a collection is created for it
+                raise ValueError(f"Folder {folder} does not exist or is not a directory")
+            name = args.collection or os.path.basename(os.path.abspath(folder)) or folder
+            collection_id = db.get_or_create_collection(name, folder)
+            importer.import_folder(
+                folder, collection_id, default_styles=args.style, recursive=not args.no_recursive,
+                progress=reporter.progress(folder), cancel_event=cancel_event,
+            )
+            results.append({"folder": folder, "collection_id": collection_id, **importer.last_import_stats})
+        except Exception as e:
+            results.append({"folder": folder, "error": str(e)})
+    return results
+
+
+def run_score(db, args, reporter, cancel_event):
+    results = []
+    for folder, collection_id in _collections(db, args.folders, results):
+        if cancel_event.is_set():
+            break
+        if args.missing_only:
+            photos = db.get_unscored_photos(collection_id)
+        else:
+            photos = db.get_photos(collection_id)
+        stats = score_photos(db, photos, args.workers, args.batch_size, args.score_edge or None,
+                             reporter.progress(folder), cancel_event)
+        results.append({"folder": folder, "collection_id": collection_id, **stats})
+    return results
+
+
+def run_duplicates(db, args, reporter, cancel_event):
+    detector = NearDuplicateDetector(db, threshold=args.threshold)
+    results = []
+    for folder, collection_id in _collections(db, args.folders, results, every_collection=True):
+        if cancel_event.is_set():
+            break
+        photos = db.get_photos(collection_id)
+        groups = detector.find_duplicates_batch(
+            photos, duplicate_scope(collection_id), progress=reporter.progress(folder), cancel_event=cancel_event
+        )
+        results.append({
+            "folder": folder, "collection_id": collection_id, "photos": len(photos),
+            "groups": groups, "cancelled": groups is None,
+        })
+    return results
+
+
+def _collections(db, folders, results, every_collection=False):
+    """
+    Yield (folder, collection_id) for each folder's collection. With no
+    folders, yield one (None, None) for every photo, or with every_collection
+    (source_path, collection_id) for each collection. Folders that were never
+    imported are recorded in results as errors.
+    """
+    if not folders:
+        if every_collection:
+            for collection in db.get_collections():
+                yield collection["source_path"], collection["id"]
+        else:
+            yield None, None
+        return
+    for folder in folders:
+        collection = db.find_collection(folder)
+        if collection is None:
+            results.append({"folder": folder, "error": "No collection was imported from this folder"})
+            continue
+        yield folder, collection["id"]
+
+
+# ----------------- Scoring -----------------
+def _score_file(file_path, max_edge):
+    """
+    Pool worker: the importer's own analysis (same per-worker scorers, so CLI
+    and import scores cannot drift apart), without thumbnails.
+    """
+    return _analyze_file(file_path, thumb_sizes=(), max_edge=max_edge)
+
+
+def score_photos(db, photos, workers, batch_size, max_edge, progress, cancel_event):
+    """
+    Rescore photos and store the scores, one transaction per batch_size photos.
+    Files are scored on a process pool when workers > 1.
+    :return: {'scored', 'failed', 'elapsed', 'cancelled'}
+    """
+    start = time.perf_counter()
+    scored = failed = 0
+    executor = analysis_pool(workers) if workers > 1 else None
+    try:
+        for first in range(0, len(photos), batch_size):
+            if cancel_event.is_set():
+                break
+            batch = photos[first:first + batch_size]
+            paths = [photo["file_path"] for photo in batch]
+            if executor is not None:
+                outcomes = list(executor.map(_score_file, paths, repeat(max_edge)))
+            else:
+                outcomes = [_score_file(path, max_edge) for path in paths]
+
+            scores, working_edges = {}, {}
+            for photo, outcome in zip(batch, outcomes):
+                error = outcome["error"] or outcome["score_error"]
+                if error:
+                    failed += 1
+                    print(f"Failed to score {photo['file_path']}: {error}")
+                    continue
+                scores[photo["id"]] = outcome["scores"]
+                working_edges[photo["id"]] = outcome["working_edge"]
+            db.add_scores_batch(scores, working_edges)
+            db.notify_changed(photo_ids=scores)
+            scored += len(scores)
+            if progress is not None:
+                progress(progress_event(scored + failed, len(photos), failed, start, scored=scored))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return {
+        "scored": scored, "failed": failed,
+        "elapsed": time.perf_counter() - start, "cancelled": cancel_event.is_set(),
+    }
+
+
+# ----------------- Entry point -----------------
+COMMANDS = {"import": run_import, "score": run_score, "duplicates": run_duplicates}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="autocull_cli.py", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workers", type=int, default=default_worker_count(),
+                        help="analysis processes (default: %(default)s); 1 runs serially")
+    common.add_argument("--batch-size", type=int, default=64, help="photos per database transaction")
+    common.add_argument("--no-progress", action="store_true", help="only print the summary")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", parents=[common], help="import folders (repeat runs only process changes)")
+    p.add_argument("folders", nargs="+")
+    p.add_argument("--collection", help="collection name for new folders (default: the folder name)")
+    p.add_argument("--style", action="append", help="style to assign to new photos (repeatable)")
+    p.add_argument("--no-recursive", action="store_true", help="do not descend into subfolders")
+    p.add_argument("--no-duplicates", action="store_true", help="skip incremental near-duplicate matching")
+    p.add_argument("--threshold", type=int, default=5, help="near-duplicate Hamming distance")
+    p.add_argument("--score-edge", type=int, default=DEFAULT_WORKING_EDGE,
+                   help="working resolution long edge for scoring; 0 scores at full resolution")
+
+    p = sub.add_parser("score", parents=[common], help="rescore the photos imported from folders (default: all)")
+    p.add_argument("folders", nargs="*")
+    p.add_argument("--missing-only", action="store_true", help="only photos without current scores")
+    p.add_argument("--score-edge", type=int, default=DEFAULT_WORKING_EDGE,
+                   help="working resolution long edge for scoring; 0 scores at full resolution")
+
+    p = sub.add_parser("duplicates", parents=[common],
+                       help="regroup near-duplicates per folder's collection (default: every collection)")
+    p.add_argument("folders", nargs="*")
+    p.add_argument("--threshold", type=int, default=5, help="near-duplicate Hamming distance")
+    return parser
+
+
+def _install_cancel_handlers(cancel_event):
+    """First Ctrl-C/SIGTERM cancels cooperatively, a second one aborts."""
+    def handle(signum, frame):
+        if cancel_event.is_set():
+            raise KeyboardInterrupt
+        cancel_event.set()
+        print("Cancelling after the work in flight; press Ctrl-C again to abort", file=sys.stderr)
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+
+def _exit_code(results, cancelled):
+    if cancelled:
+        return EXIT_CANCELLED
+    if any("error" in result for result in results):
+        return EXIT_ERROR
+    if any(result.get("failed") for result in results):
+        return EXIT_FAILURES
+    return EXIT_OK
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers < 1 or args.batch_size < 1:
+        print("--workers and --batch-size must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    reporter = Reporter(sys.stdout, args.command, show_progress=not args.no_progress)
+    cancel_event = threading.Event()
+    _install_cancel_handlers(cancel_event)
+    start = time.perf_counter()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            db = Database()
+            db.migrate()
+            results = COMMANDS[args.command](db, args, reporter, cancel_event)
+        except KeyboardInterrupt:
+            reporter.emit("error", message="Aborted", exit_code=EXIT_CANCELLED)
+            return EXIT_CANCELLED
+        except Exception as e:
+            reporter.emit("error", message=str(e), exit_code=EXIT_ERROR)
+            return EXIT_ERROR
+
+    cancelled = cancel_event.is_set()
+    exit_code = _exit_code(results, cancelled)
+    status = {EXIT_OK: "ok", EXIT_FAILURES: "partial", EXIT_ERROR: "error", EXIT_CANCELLED: "cancelled"}[exit_code]
+    reporter.emit("summary", status=status, exit_code=exit_code,
+                  elapsed=time.perf_counter() - start, results=results)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# background_job.py
+import queue
+import threading
+import time
+
+POLL_MS = 100  # how often the Tk loop collects progress events
+
+
+def progress_event(done, total=None, failed=0, start=None, **counts):
+    """
+    Build a progress event for a long-running job: items done out of total
+    (None while unknown), failures, throughput and an ETA in seconds (None
+    until it can be estimated). Extra keyword counts are included as they are.
+    :param start: time.perf_counter() value when the job started
+    """
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    per_sec = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / per_sec if total is not None and per_sec > 0 else None
+    return {
+        "done": done,
+        "total": total,
+        "failed": failed,
+        "elapsed": elapsed,
+        "per_sec": per_sec,
+        "eta": eta,
+        **counts,
+    }
+
+
+class BackgroundJob:
+    """
+    Runs target(job) on a daemon thread so the Tk loop stays responsive.
+    The target reports progress with job.report(event) and should check
+    job.cancel_event between units of work to stop early when cancelled.
+    Events are handed to the Tk loop through a queue polled with after(), so
+    the callbacks below all run on the Tk thread, in order:
+      - on_progress(event) for every reported event,
+      - then on_done(result) with target's return value, or on_error(exception).
+    """
+
+    def __init__(self, widget, target, on_progress=None, on_done=None, on_error=None, poll_ms=POLL_MS):
+        self.widget = widget
+        self.target = target
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.poll_ms = poll_ms
+        self.cancel_event = threading.Event()
+        self._events = queue.SimpleQueue()
+        self._thread = None
+        self._finished = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.widget.after(self.poll_ms, self._poll)
+        return self
+
+    def cancel(self):
+        """Ask the target to stop; it finishes its current unit of work first."""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._finished
+
+    # ----------------- Job thread -----------------
+    def report(self, event):
+        """Queue a progress event for on_progress. Safe to call from any thread."""
+        self._events.put(("progress", event))
+
+    def _run(self):
+        try:
+            self._events.put(("done", self.target(self)))
+        except Exception as e:
+            self._events.put(("error", e))
+
+    # ----------------- Tk thread -----------------
+    def _poll(self):
+        while True:
+            try:
+                kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                if self.on_progress:
+                    self.on_progress(payload)
+                continue
+            self._finished = True
+            if kind == "done" and self.on_done:
+                self.on_done(payload)
+            elif kind == "error":
+                if self.on_error:
+                    self.on_error(payload)
+                else:
+                    print(f"Background job failed: {payload}")
+            return
+        self.widget.after(self.poll_ms, self._poll)
@@ -16,7 +16,7 @@ class BaseSidebarViewer(tk.Frame):
     Subclasses should:
       - Define self.title
       - Override setup_columns(tree)
-      - Override update_content(photo_id)
+      - Override update_content(photo_id, details=None)
     """
 
     def __init__(self, parent, db: Database, title="Viewer", default_height=DEFAULT_HEIGHT, **kwargs):
@@ -76,10 +76,20 @@ class BaseSidebarViewer(tk.Frame):
         """Define columns in subclass."""
         raise NotImplementedError
 
-    def update_content(self, photo_id):
-        """Populate tree in subclass."""
+    def update_content(self, photo_id, details=None):
+        """
+        Populate tree in subclass.
+        :param details: this photo's entry from Database.get_photo_details, when the
+            caller already fetched it for all viewers; otherwise use get_details
+        """
         raise NotImplementedError
 
+    def get_details(self, photo_id, details=None):
+        """Return details if given, else fetch this photo's details in one query."""
+        if details is None:
+            details = self.db.get_photo_details([photo_id]).get(photo_id)
+        return details or {}
+
     # ----------------- Toggle -----------------
     def toggle(self):
         if self.collapsed:
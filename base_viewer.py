@@ -1,60 +1,287 @@
 # base_viewer.py
 import tkinter as tk
 from PIL import Image, ImageTk
+from thumbnail_loader import ThumbnailLoader
+from thumbnail_pool import ThumbnailPool
+
+OVERSCAN = 2  # extra rows/columns materialized beyond each edge of the viewport
+HIGHLIGHT_COLOR = "yellow"
+HIGHLIGHT_WIDTH = 3
+PLACEHOLDER_COLOR = "#2a2a2a"
+PREFETCH_NEIGHBOURS = 2  # photos on each side of the selection whose details are prefetched
+
 
 class BaseThumbnailViewer(tk.Frame):
     """
     Shared base class for displaying photo thumbnails.
-    Handles loading images, keeping references, selection,
-    and notifying parent/other viewers.
+    Thumbnails are drawn as image items on a canvas, and only the cells in
+    and near the viewport are materialized: items scrolled out of view are
+    recycled for newly visible cells and their images dropped, so memory and
+    redraw cost depend on the viewport, not the library size.
+    Thumbnails are decoded on worker threads: new cells show a placeholder
+    at once and are filled in as results arrive, viewport cells first.
+    Decoded thumbnails live in a ThumbnailPool shared by all viewers; each
+    viewer only keeps Tk images for its materialized cells.
+    Handles selection and notifying parent/other viewers.
+
+    Subclasses create self.canvas (via setup_canvas) and implement the layout:
+      - cell_origin(idx) -> (x, y) of a cell's top-left corner
+      - viewport_range() -> (first, last) indices of the cells in view
+      - line_length -> cells per row/column, used for overscan
+      - index_at(x, y) -> index of the cell under canvas coordinates, or None
+      - on_photo_click(photo_id)
     """
 
-    def __init__(self, parent, db=None, thumb_size=100, padding=5, **kwargs):
+    def __init__(self, parent, db=None, thumb_size=100, padding=5, thumbnail_pool=None, **kwargs):
         super().__init__(parent, **kwargs)
         self.db = db
+        self.thumbnail_pool = thumbnail_pool or ThumbnailPool.shared()
         self.thumb_size = thumb_size
         self.padding = padding
-        self.labels = []     # Tk Labels for thumbnails
-        self.thumbs = []     # ImageTk.PhotoImage refs
-        self.photos = []     # DB rows or metadata dicts
+        self.photos = []        # DB rows or metadata dicts, in display order
+        self.thumbs = {}        # idx -> ImageTk.PhotoImage, materialized cells only
         self.selected_id = None
+        self.canvas = None
+        self._index_by_id = {}
+        self._cells = {}        # idx -> canvas image item
+        self._free_items = []   # recycled canvas image items
+        self._highlight = None
+        self._placeholder = None
+        self._loader = None
+        self._render_pending = False
+
+    @property
+    def cell_size(self):
+        return self.thumb_size + self.padding
+
+    # ----------------- Canvas -----------------
+    def setup_canvas(self, canvas):
+        self.canvas = canvas
+        self._placeholder = ImageTk.PhotoImage(
+            Image.new("RGB", (self.thumb_size, self.thumb_size * 2 // 3), PLACEHOLDER_COLOR)
+        )
+        self._loader = ThumbnailLoader(self, self.get_thumbnail_image, self._on_thumbnail_loaded)
+        self._highlight = canvas.create_rectangle(
+            0, 0, 0, 0, outline=HIGHLIGHT_COLOR, width=HIGHLIGHT_WIDTH, state="hidden"
+        )
+        canvas.bind("<Button-1>", self._on_canvas_click)
+        canvas.bind("<MouseWheel>", self._on_mousewheel)
+        canvas.bind("<Button-4>", lambda e: self.scroll_by(-1))
+        canvas.bind("<Button-5>", lambda e: self.scroll_by(1))
+
+    def scroll_by(self, units):
+        """Scroll by whole units; subclasses pick the axis."""
+        raise NotImplementedError
+
+    def _on_mousewheel(self, event):
+        self.scroll_by(-1 if event.delta > 0 else 1)
+
+    def _on_canvas_click(self, event):
+        idx = self.index_at(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if idx is not None:
+            self.on_photo_click(self.photos[idx]["id"])
+
+    # ----------------- Layout hooks -----------------
+    def cell_origin(self, idx):
+        raise NotImplementedError
+
+    def viewport_range(self):
+        raise NotImplementedError
+
+    @property
+    def line_length(self):
+        return 1
+
+    def visible_range(self):
+        """Viewport range plus OVERSCAN lines on each side."""
+        first, last = self.viewport_range()
+        margin = OVERSCAN * self.line_length
+        return max(0, first - margin), min(len(self.photos), last + margin)
+
+    def index_at(self, x, y):
+        raise NotImplementedError
+
+    def on_photo_click(self, photo_id):
+        self.select_photo(photo_id)
+
+    # ----------------- Photos -----------------
+    def set_photos(self, photos):
+        """Replace the displayed photos and redraw the visible cells."""
+        if self._loader is not None:
+            self._loader.cancel_all()  # anything queued belongs to the old collection
+        self.clear_thumbnails()
+        self.photos = list(photos)
+        self._index_by_id = {photo["id"]: idx for idx, photo in enumerate(self.photos)}
+        self.update_scrollregion()
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.render_visible()
+
+    def append_photos(self, photos):
+        """
+        Add photos after the displayed ones (e.g. as an import writes them),
+        keeping the scroll position, selection and already loaded thumbnails.
+        """
+        new = [photo for photo in photos if photo["id"] not in self._index_by_id]
+        if not new:
+            return
+        for idx, photo in enumerate(new, len(self.photos)):
+            self._index_by_id[photo["id"]] = idx
+        self.photos.extend(new)
+        self.update_scrollregion()
+        self.schedule_render()
+
+    def index_of(self, photo_id):
+        return self._index_by_id.get(photo_id)
+
+    def update_scrollregion(self):
+        """Set the canvas scrollregion for the full (virtual) content."""
+        raise NotImplementedError
+
+    # ----------------- Rendering -----------------
+    def schedule_render(self):
+        """Coalesce scroll/resize events into one render_visible per idle cycle."""
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._run_scheduled_render)
+
+    def _run_scheduled_render(self):
+        self._render_pending = False
+        self.render_visible()
+
+    def render_visible(self):
+        """Materialize cells in the visible range and recycle the rest."""
+        if self.canvas is None:
+            return
+        first, last = self.visible_range()
+        view_first, view_last = self.viewport_range()
+        for idx in [i for i in self._cells if not first <= i < last]:
+            self._release_cell(idx)
+        for idx in range(first, last):
+            if idx not in self._cells:
+                self._materialize_cell(idx, priority=0 if view_first <= idx < view_last else 1)
+        self._place_highlight()
+
+    def relayout(self):
+        """Cell positions changed (e.g. column count): move the live cells, then fill gaps."""
+        half = self.cell_size / 2
+        for idx, item in self._cells.items():
+            x, y = self.cell_origin(idx)
+            self.canvas.coords(item, x + half, y + half)
+        self.update_scrollregion()
+        self.render_visible()
+
+    def _materialize_cell(self, idx, priority=0):
+        photo = self.photos[idx]
+        tk_img = self.thumbs.get(idx)
+        if tk_img is None:
+            img = self.thumbnail_pool.peek(photo["file_path"], self.thumb_size)
+            if img is not None:
+                tk_img = ImageTk.PhotoImage(img)
+                self.thumbs[idx] = tk_img
+            else:
+                self._loader.request(photo["id"], photo, priority)
+
+        item = self._free_items.pop() if self._free_items else self.canvas.create_image(0, 0, anchor="center")
+        x, y = self.cell_origin(idx)
+        half = self.cell_size / 2
+        self.canvas.coords(item, x + half, y + half)
+        self.canvas.itemconfigure(item, image=tk_img or self._placeholder, state="normal")
+        self._cells[idx] = item
+
+    def _on_thumbnail_loaded(self, photo_id, img):
+        """Loader callback (Tk thread): fill in the cell if it is still materialized."""
+        idx = self.index_of(photo_id)
+        if img is None or idx not in self._cells:
+            return
+        tk_img = ImageTk.PhotoImage(img)
+        self.thumbs[idx] = tk_img
+        self.canvas.itemconfigure(self._cells[idx], image=tk_img)
+
+    def _release_cell(self, idx):
+        item = self._cells.pop(idx)
+        self.canvas.itemconfigure(item, image="", state="hidden")
+        self._free_items.append(item)
+        self.thumbs.pop(idx, None)
+        if idx < len(self.photos):
+            self._loader.discard(self.photos[idx]["id"])
+
+    def _place_highlight(self):
+        idx = self.index_of(self.selected_id)
+        if idx is None:
+            self.canvas.itemconfigure(self._highlight, state="hidden")
+            return
+        x, y = self.cell_origin(idx)
+        size = self.cell_size
+        self.canvas.coords(self._highlight, x + 1, y + 1, x + size - 1, y + size - 1)
+        self.canvas.itemconfigure(self._highlight, state="normal")
+        self.canvas.tag_raise(self._highlight)
+
+    # ----------------- Thumbnails -----------------
+    def get_thumbnail_image(self, photo):
+        """
+        Return the PIL thumbnail for a photo row from the shared pool.
+        Runs on loader worker threads, so it must not touch Tk.
+        """
+        return self.thumbnail_pool.get(photo["file_path"], self.thumb_size)
 
     def load_thumbnail(self, file_path):
         """Return ImageTk.PhotoImage thumbnail."""
-        try:
-            img = Image.open(file_path)
-            img.thumbnail((self.thumb_size, self.thumb_size))
-            return ImageTk.PhotoImage(img)
-        except Exception as e:
-            print(f"Failed to load thumbnail for {file_path}: {e}")
-            return None
+        img = self.thumbnail_pool.get(file_path, self.thumb_size)
+        return ImageTk.PhotoImage(img) if img else None
 
     def clear_thumbnails(self):
-        for lbl in self.labels:
-            lbl.destroy()
-        self.labels = []
-        self.thumbs = []
+        if self.canvas is not None:
+            for idx in list(self._cells):
+                self._release_cell(idx)
+        self.thumbs = {}
 
+    # ----------------- Selection -----------------
     def select_photo(self, photo_id):
         """Highlight a selected thumbnail and update linked viewers."""
         self.selected_id = photo_id
-        for lbl in self.labels:
-            if getattr(lbl, "photo_id", None) == photo_id:
-                lbl.config(bd=3, relief="solid", highlightbackground="yellow")
-            else:
-                lbl.config(bd=0, relief="flat", highlightbackground=lbl["bg"])
+        if self.canvas is not None:
+            self._place_highlight()
 
         # Notify parent container if available
         self._notify(photo_id)
 
+    def _neighbour_ids(self, photo_id):
+        """IDs of the PREFETCH_NEIGHBOURS photos on either side of photo_id."""
+        idx = self._index_by_id.get(photo_id)
+        if idx is None:
+            return []
+        nearby = self.photos[max(0, idx - PREFETCH_NEIGHBOURS):idx + PREFETCH_NEIGHBOURS + 1]
+        return [photo["id"] for photo in nearby if photo["id"] != photo_id]
+
     def _notify(self, photo_id):
-        """Call updates on linked viewers if parent has them."""
+        """
+        Call updates on linked viewers if parent has them.
+        The sidebar viewers' data is fetched once, in one round trip, and shared.
+        It comes from the parent's metadata cache when there is one, which also
+        prefetches the neighbouring photos so stepping through them stays local.
+        """
         master = self.master
+        sidebars = [
+            viewer for viewer in (
+                getattr(master, "exif_viewer", None),
+                getattr(master, "score_viewer", None),
+                getattr(master, "duplicate_viewer", None),
+            ) if viewer
+        ]
+        details = None
+        cache = getattr(master, "metadata_cache", None)
+        db = self.db or getattr(master, "db", None)
+        if sidebars and photo_id and cache is not None:
+            details = cache.get_photo_details([photo_id], prefetch=self._neighbour_ids(photo_id)).get(photo_id, {})
+        elif sidebars and photo_id and db is not None:
+            details = db.get_photo_details([photo_id]).get(photo_id, {})
+
         if hasattr(master, "exif_viewer") and master.exif_viewer:
-            master.exif_viewer.update_content(photo_id)
+            master.exif_viewer.update_content(photo_id, details)
         if hasattr(master, "score_viewer") and master.score_viewer:
-            master.score_viewer.update_content(photo_id)
+            master.score_viewer.update_content(photo_id, details)
         if hasattr(master, "filmstrip") and master.filmstrip:
             master.filmstrip.update_highlight(photo_id)
         if hasattr(master, "duplicate_viewer") and master.duplicate_viewer:
-            master.duplicate_viewer.update_content(photo_id)
+            master.duplicate_viewer.update_content(photo_id, details)
@@ -0,0 +1,196 @@
+# benchmarks/corpus.py
+"""
+Synthetic photo corpus for the benchmarks.
+
+Generates JPEG and/or TIFF files with camera-like EXIF (and an embedded EXIF
+thumbnail for JPEGs, like camera files have), and a controlled share of near-
+duplicates: re-framed, re-exposed, re-encoded variants of another file. The
+same arguments always produce the same corpus. A manifest.json in the output
+folder records the parameters and which files are variants of which base.
+
+    python benchmarks/corpus.py /tmp/corpus --count 200 --size 3000x2000
+    python benchmarks/corpus.py /tmp/corpus --formats jpg tif --near-dup-rate 0.3
+"""
+import argparse
+import io
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+import piexif
+from PIL import Image
+
+MANIFEST = "manifest.json"
+EXIF_THUMB_SIZE = 160  # long edge, as in typical camera JPEGs
+CAMERAS = (("Canon", "EOS R5"), ("Nikon", "Z 7II"), ("Sony", "ILCE-7RM4"), ("Fujifilm", "X-T4"))
+ISOS = (100, 200, 400, 800, 1600, 3200, 6400)
+SHUTTERS = ((1, 4000), (1, 1000), (1, 250), (1, 60), (1, 15))
+APERTURES = ((14, 10), (28, 10), (40, 10), (56, 10), (80, 10))
+FOCAL_LENGTHS = (24, 35, 50, 85, 135)
+# Variant strength: small enough that variants stay within the default 5-bit phash threshold
+MAX_REFRAME = 0.01  # share of each edge cropped away
+MAX_EXPOSURE_SHIFT = 0.03
+
+
+# ----------------- Images -----------------
+def base_image(width, height, rng):
+    """
+    A distinct scene: smooth colour fields, a few hard-edged shapes and fine
+    texture, as float32 RGB. Noise is added by finish(), so variants can be
+    derived from the clean scene.
+    """
+    field = rng.random((int(rng.integers(3, 8)), int(rng.integers(3, 8)), 3), dtype=np.float32) * 255
+    img = cv2.resize(field, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(int(rng.integers(4, 10))):
+        color = [float(c) for c in rng.integers(0, 256, 3)]
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        extent = int(rng.integers(min(width, height) // 12, min(width, height) // 3))
+        if rng.random() < 0.5:
+            cv2.circle(img, (x, y), extent, color, -1)
+        else:
+            cv2.rectangle(img, (x, y), (x + extent, y + extent // 2), color, -1)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img += (12 * np.sin(x / rng.uniform(3, 9)) * np.cos(y / rng.uniform(3, 9)))[..., None]
+    return img
+
+
+def variant_image(img, rng):
+    """A near-duplicate: slightly re-framed (crop and resize back) and re-exposed, like a burst frame."""
+    height, width = img.shape[:2]
+    dx, dy = int(width * rng.uniform(0, MAX_REFRAME)), int(height * rng.uniform(0, MAX_REFRAME))
+    cropped = img[dy:height - int(height * rng.uniform(0, MAX_REFRAME)),
+                  dx:width - int(width * rng.uniform(0, MAX_REFRAME))]
+    exposure = rng.uniform(1 - MAX_EXPOSURE_SHIFT, 1 + MAX_EXPOSURE_SHIFT)
+    return cv2.resize(cropped, (width, height), interpolation=cv2.INTER_AREA) * exposure
+
+
+def finish(img, rng):
+    """Add noise and convert to uint8 RGB."""
+    noise = rng.standard_normal(img.shape[:2], dtype=np.float32) * rng.uniform(2, 10)
+    return np.clip(img + noise[..., None], 0, 255).astype(np.uint8)
+
+
+# ----------------- EXIF -----------------
+def exif_bytes(index, rng, thumbnail=None):
+    make, model = CAMERAS[int(rng.integers(len(CAMERAS)))]
+    taken = f"2024:05:{1 + index // 1000 % 28:02d} {index // 60 % 24:02d}:{index % 60:02d}:00".encode()
+    exif = {
+        "0th": {
+            piexif.ImageIFD.Make: make.encode(),
+            piexif.ImageIFD.Model: model.encode(),
+            piexif.ImageIFD.Orientation: 1,
+            piexif.ImageIFD.DateTime: taken,
+            piexif.ImageIFD.Software: b"AutoCull benchmark corpus",
+        },
+        "Exif": {
+            piexif.ExifIFD.DateTimeOriginal: taken,
+            piexif.ExifIFD.ISOSpeedRatings: ISOS[int(rng.integers(len(ISOS)))],
+            piexif.ExifIFD.ExposureTime: SHUTTERS[int(rng.integers(len(SHUTTERS)))],
+            piexif.ExifIFD.FNumber: APERTURES[int(rng.integers(len(APERTURES)))],
+            piexif.ExifIFD.FocalLength: (FOCAL_LENGTHS[int(rng.integers(len(FOCAL_LENGTHS)))], 1),
+            piexif.ExifIFD.LensModel: b"Benchmark 24-135mm",
+        },
+    }
+    if thumbnail is not None:
+        exif["1st"] = {piexif.ImageIFD.Compression: 6, piexif.ImageIFD.XResolution: (72, 1),
+                       piexif.ImageIFD.YResolution: (72, 1)}
+        exif["thumbnail"] = thumbnail
+    return piexif.dump(exif)
+
+
+def save(rgb, path, index, rng):
+    img = Image.fromarray(rgb)
+    if path.endswith(".jpg"):
+        thumb = img.copy()
+        thumb.thumbnail((EXIF_THUMB_SIZE, EXIF_THUMB_SIZE))
+        buffer = _jpeg_bytes(thumb, quality=80)
+        img.save(path, quality=int(rng.integers(85, 96)), exif=exif_bytes(index, rng, buffer))
+    else:
+        img.save(path, exif=exif_bytes(index, rng))
+
+
+def _jpeg_bytes(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+# ----------------- Corpus -----------------
+def corpus_params(count, width, height, formats, near_dup_rate, seed):
+    return {
+        "count": count, "width": width, "height": height,
+        "formats": list(formats), "near_dup_rate": near_dup_rate, "seed": seed,
+    }
+
+
+def generate_corpus(out_dir, count=100, width=3000, height=2000, formats=("jpg",), near_dup_rate=0.2,
+                    seed=0, progress=print):
+    """
+    Write the corpus to out_dir and return its manifest.
+    round(count * near_dup_rate) files are variants, spread evenly over the
+    bases; file i uses formats[i % len(formats)].
+    :return: {'params': ..., 'files': [{'file', 'format', 'base'}]}, where
+        files with the same base are near-duplicates of each other
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    variants = round(count * near_dup_rate)
+    bases = max(1, count - variants)
+    files = []
+    for index in range(count):
+        rng = np.random.default_rng([seed, index])
+        base = index if index < bases else (index - bases) % bases
+        fmt = formats[index % len(formats)]
+        # Scenes are regenerated from their seed for each variant rather than kept in memory
+        img = base_image(width, height, np.random.default_rng([seed, base, 0]))
+        if base != index:
+            img = variant_image(img, rng)
+        file_name = f"bench_{index:05d}.{fmt}"
+        save(finish(img, rng), os.path.join(out_dir, file_name), index, rng)
+        files.append({"file": file_name, "format": fmt, "base": base})
+        if progress and (index + 1) % 50 == 0:
+            progress(f"Generated {index + 1}/{count} files")
+
+    manifest = {"params": corpus_params(count, width, height, formats, near_dup_rate, seed), "files": files}
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load_or_generate(out_dir, count, width, height, formats, near_dup_rate, seed, progress=print):
+    """Reuse the corpus in out_dir if it was generated with the same parameters, else regenerate it."""
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("params") == corpus_params(count, width, height, formats, near_dup_rate, seed) and all(
+            os.path.exists(os.path.join(out_dir, entry["file"])) for entry in manifest["files"]
+        ):
+            return manifest
+    return generate_corpus(out_dir, count, width, height, formats, near_dup_rate, seed, progress)
+
+
+def parse_size(size):
+    width, height = (int(v) for v in size.lower().split("x"))
+    return width, height
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--size", default="3000x2000", help="WIDTHxHEIGHT")
+    parser.add_argument("--formats", nargs="+", choices=("jpg", "tif"), default=["jpg"])
+    parser.add_argument("--near-dup-rate", type=float, default=0.2, help="share of files that are variants")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    width, height = parse_size(args.size)
+    manifest = generate_corpus(args.out_dir, args.count, width, height, args.formats, args.near_dup_rate, args.seed)
+    print(f"Wrote {len(manifest['files'])} files to {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
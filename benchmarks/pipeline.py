@@ -0,0 +1,360 @@
+# benchmarks/pipeline.py
+"""
+Benchmark for the import pipeline's stages on a synthetic corpus.
+
+Generates (or reuses) a corpus with benchmarks/corpus.py and times, each on
+its own and single-threaded on the CPU:
+  read_exif          ExifReader.read_exif per file
+  score_photo        PhotoScorer.score_photo per file, at --score-edge
+  load_thumbnail     image_decoder.load_thumbnail per file
+  db_write           importer-sized write transactions (photos, EXIF, scores)
+  duplicates_hash    NearDuplicateDetector.find_duplicates_batch with no stored hashes
+  duplicates_stored  the same again, with the hashes stored by the first run
+
+Results can be written as JSON and compared with an earlier run:
+
+    python benchmarks/pipeline.py --output before.json
+    python benchmarks/pipeline.py --compare before.json --output after.json --repeat 3
+    python benchmarks/pipeline.py --count 500 --size 6000x4000 --formats jpg tif
+    python benchmarks/pipeline.py --db postgres   # uses DB_NAME etc., like the app
+
+--db memory (the default) uses an in-memory stand-in for Database, so
+db_write then only measures the client side. With --db postgres the rows go
+into a new collection that is deleted afterwards; point DB_NAME at a scratch
+database all the same. Files are read from the OS cache (the corpus was just
+written or read), so I/O is not part of the timings.
+
+Exits with status 1 if --compare finds a stage slower than --max-regression.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+
+import cv2
+import numpy as np
+import PIL
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from corpus import load_or_generate, parse_size  # noqa: E402
+from db import SCORE_METRICS, HASH_MASK, duplicate_scope  # noqa: E402
+from duplicates import NearDuplicateDetector  # noqa: E402
+from exif_reader import ExifReader  # noqa: E402
+from image_decoder import load_thumbnail  # noqa: E402
+from photo_scorer import PhotoScorer, DEFAULT_WORKING_EDGE  # noqa: E402
+from thumbnail_cache import GRID_THUMB_SIZE  # noqa: E402
+
+RESULTS_VERSION = 1  # bump when stage definitions change; older results are then not compared
+
+
+# ----------------- In-memory database stand-in -----------------
+class MemoryDatabase:
+    """
+    Stand-in for Database with the methods this benchmark calls, so it runs
+    without Postgres. Rows are kept in dicts; nothing is persisted.
+    """
+
+    def __init__(self):
+        self.collections = {}
+        self.photos = {}
+        self.exif = {}
+        self.scores = {}
+        self.groups = {}  # (method, scope) -> [photo ID lists]
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    def add_collection(self, name):
+        collection_id = len(self.collections) + 1
+        self.collections[collection_id] = {"id": collection_id, "name": name}
+        return collection_id
+
+    def add_photos(self, collection_id, photos, status="undecided"):
+        ids = []
+        for photo in photos:
+            photo_id = len(self.photos) + 1
+            self.photos[photo_id] = {
+                "id": photo_id, "collection_id": collection_id, "status": status,
+                "phash": None, **photo,
+            }
+            ids.append(photo_id)
+        return ids
+
+    def add_exif_batch(self, exif_by_photo):
+        self.exif.update({photo_id: dict(exif) for photo_id, exif in exif_by_photo.items() if exif})
+
+    def add_scores_batch(self, scores_by_photo, working_edges=None):
+        working_edges = working_edges or {}
+        for photo_id, scores in scores_by_photo.items():
+            row = {metric: scores.get(metric) for metric in SCORE_METRICS}
+            self.scores[photo_id] = {**row, "working_edge": working_edges.get(photo_id)}
+
+    def get_photos(self, collection_id=None):
+        return [dict(photo) for photo in self.photos.values()
+                if collection_id is None or photo["collection_id"] == collection_id]
+
+    def set_photo_hashes(self, hashes):
+        for photo_id, phash in hashes.items():
+            self.photos[photo_id]["phash"] = phash & HASH_MASK
+
+    def get_photo_hashes(self, collection_id=None):
+        return [(photo["id"], photo["phash"]) for photo in self.get_photos(collection_id)
+                if photo["phash"] is not None]
+
+    def replace_near_duplicate_groups(self, method, scope, groups):
+        self.groups[(method, scope)] = [list(members) for members in groups if members]
+        return len(self.groups[(method, scope)])
+
+    def add_listener(self, callback):
+        pass
+
+    def notify_changed(self, photo_ids=None, group_ids=None):
+        pass
+
+
+def open_database(kind):
+    """:return: (db, collection_id, scope, cleanup)"""
+    if kind == "memory":
+        db = MemoryDatabase()
+        collection_id = db.add_collection("benchmark")
+        return db, collection_id, duplicate_scope(collection_id), lambda: None
+
+    from db import Database
+    db = Database()
+    db.migrate()
+    collection_id = db.add_collection(f"benchmark {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    scope = duplicate_scope(collection_id)
+
+    def cleanup():
+        db.execute("DELETE FROM near_duplicate_groups WHERE scope=%s", (scope,))
+        db.execute("DELETE FROM collections WHERE id=%s", (collection_id,))  # cascades to its photos
+        db.close()
+    return db, collection_id, scope, cleanup
+
+
+# ----------------- Timing -----------------
+def time_each(fn, items, repeat=1, warmup=True):
+    """
+    Call fn(item) for every item. Each item's time is its best over repeat
+    passes; one untimed warm-up call lets fn allocate reusable buffers first.
+    :return: (results of the last pass, seconds per item)
+    """
+    if warmup and items:
+        fn(items[0])
+    best = [float("inf")] * len(items)
+    results = [None] * len(items)
+    for _ in range(repeat):
+        for i, item in enumerate(items):
+            start = time.perf_counter()
+            results[i] = fn(item)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return results, best
+
+
+def summarize(times, items=None, **extra):
+    """
+    Stage statistics over per-call times.
+    :param items: photos processed, when calls cover several photos each (default: one per call)
+    """
+    items = items or len(times)
+    total = float(sum(times))
+    return {
+        "calls": len(times),
+        "items": items,
+        "total_s": total,
+        "per_item_ms": total / items * 1000 if items else 0.0,
+        "median_ms": float(np.median(times)) * 1000 if times else 0.0,
+        "p95_ms": float(np.percentile(times, 95)) * 1000 if times else 0.0,
+        "per_sec": items / total if total > 0 else 0.0,
+        **extra,
+    }
+
+
+# ----------------- Stages -----------------
+def by_format(times, formats):
+    """Mean ms per file for each file format, since e.g. TIFFs have no EXIF thumbnail to decode."""
+    grouped = {}
+    for seconds, fmt in zip(times, formats):
+        grouped.setdefault(fmt, []).append(seconds)
+    return {fmt: float(np.mean(values)) * 1000 for fmt, values in grouped.items()}
+
+
+def run_stages(paths, manifest, db, collection_id, scope, args, log=print):
+    stages = {}
+    score_edge = args.score_edge or None
+    formats = [entry["format"] for entry in manifest["files"]]
+
+    log("Timing read_exif...")
+    exifs, times = time_each(ExifReader.read_exif, paths, args.repeat)
+    stages["read_exif"] = summarize(times, by_format=by_format(times, formats))
+
+    log("Timing score_photo...")
+    scorer = PhotoScorer(max_edge=score_edge)
+    scores, times = time_each(scorer.score_photo, paths, args.repeat)
+    stages["score_photo"] = summarize(times, by_format=by_format(times, formats), score_edge=score_edge)
+
+    log("Timing load_thumbnail...")
+    _, times = time_each(lambda path: load_thumbnail(path, args.thumb_size), paths, args.repeat)
+    stages["load_thumbnail"] = summarize(times, by_format=by_format(times, formats), size=args.thumb_size)
+
+    log("Timing db_write...")
+    batches = [range(first, min(first + args.batch_size, len(paths))) for first in range(0, len(paths), args.batch_size)]
+
+    def write(batch):
+        with db.transaction():
+            photo_ids = db.add_photos(collection_id, [
+                {"file_path": paths[i], "file_name": os.path.basename(paths[i])} for i in batch
+            ])
+            db.add_exif_batch({photo_id: exifs[i] for photo_id, i in zip(photo_ids, batch)})
+            db.add_scores_batch({photo_id: scores[i] for photo_id, i in zip(photo_ids, batch)})
+        return photo_ids
+
+    _, times = time_each(write, batches, warmup=False)
+    stages["db_write"] = summarize(times, items=len(paths), batch_size=args.batch_size)
+
+    expected_groups = len({entry["base"] for entry in manifest["files"]
+                           if sum(other["base"] == entry["base"] for other in manifest["files"]) > 1})
+    detector = NearDuplicateDetector(db)
+    for stage in ("duplicates_hash", "duplicates_stored"):
+        log(f"Timing {stage}...")
+        photos = db.get_photos(collection_id)
+        start = time.perf_counter()
+        groups = detector.find_duplicates_batch(photos, scope)
+        stages[stage] = summarize([time.perf_counter() - start], items=len(photos),
+                                  groups=groups, expected_groups=expected_groups)
+    return stages
+
+
+# ----------------- Results -----------------
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "pillow": PIL.__version__,
+    }
+
+
+def compare(previous, current, max_regression):
+    """
+    Print each stage's time per item against the previous run's.
+    :return: names of the stages slower by more than max_regression (a fraction)
+    """
+    if previous.get("version") != current["version"]:
+        print("Previous results use different stage definitions; not comparing")
+        return []
+    for key in ("corpus", "db", "score_edge", "thumb_size", "batch_size"):
+        if previous["config"].get(key) != current["config"].get(key):
+            print(f"Warning: {key} differs from the previous run "
+                  f"({previous['config'].get(key)!r} -> {current['config'].get(key)!r})")
+
+    regressions = []
+    print(f"\n{'per item ms':<18} {'before':>10} {'after':>10} {'change':>8}")
+    for stage, stats in current["stages"].items():
+        before = previous["stages"].get(stage)
+        if not before or not before["per_item_ms"]:
+            print(f"{stage:<18} {'-':>10} {stats['per_item_ms']:10.2f}")
+            continue
+        change = stats["per_item_ms"] / before["per_item_ms"] - 1
+        slower = change > max_regression
+        if slower:
+            regressions.append(stage)
+        print(f"{stage:<18} {before['per_item_ms']:10.2f} {stats['per_item_ms']:10.2f} {change:+8.1%}"
+              f"{'  REGRESSION' if slower else ''}")
+    return regressions
+
+
+def print_stages(stages):
+    print(f"\n{'stage':<18} {'items':>6} {'total s':>9} {'per item ms':>12} {'median ms':>10} "
+          f"{'p95 ms':>9} {'items/s':>9}")
+    for stage, stats in stages.items():
+        print(f"{stage:<18} {stats['items']:6d} {stats['total_s']:9.3f} {stats['per_item_ms']:12.2f} "
+              f"{stats['median_ms']:10.2f} {stats['p95_ms']:9.2f} {stats['per_sec']:9.1f}")
+        if len(stats.get("by_format", {})) > 1:
+            print(f"{'':<18} per item ms by format: "
+                  + ", ".join(f"{fmt} {ms:.2f}" for fmt, ms in stats["by_format"].items()))
+        if "groups" in stats:
+            print(f"{'':<18} groups found {stats['groups']}, expected {stats['expected_groups']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "autocull_bench_corpus"),
+                        help="corpus folder; regenerated when its parameters differ (default: %(default)s)")
+    parser.add_argument("--count", type=int, default=100, help="files in the corpus")
+    parser.add_argument("--size", default="3000x2000", help="image size, WIDTHxHEIGHT")
+    parser.add_argument("--formats", nargs="+", choices=("jpg", "tif"), default=["jpg"])
+    parser.add_argument("--near-dup-rate", type=float, default=0.2, help="share of files that are near-duplicates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--score-edge", type=int, default=DEFAULT_WORKING_EDGE,
+                        help="scoring working resolution; 0 scores at full resolution")
+    parser.add_argument("--thumb-size", type=int, default=GRID_THUMB_SIZE)
+    parser.add_argument("--batch-size", type=int, default=64, help="photos per db_write transaction")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus for the per-file stages")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="allowed slowdown of a stage's time per item before --compare fails")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(1)  # the importer's workers are single-threaded too
+    width, height = parse_size(args.size)
+    manifest = load_or_generate(args.corpus, args.count, width, height, args.formats, args.near_dup_rate, args.seed)
+    paths = [os.path.join(args.corpus, entry["file"]) for entry in manifest["files"]]
+
+    db, collection_id, scope, cleanup = open_database(args.db)
+    try:
+        # Library code prints per photo; keep the report readable and progress on stderr
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            stages = run_stages(paths, manifest, db, collection_id, scope, args,
+                                log=lambda message: print(message, file=sys.stderr, flush=True))
+    finally:
+        cleanup()
+
+    results = {
+        "version": RESULTS_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "config": {
+            "corpus": manifest["params"], "db": args.db, "score_edge": args.score_edge,
+            "thumb_size": args.thumb_size, "batch_size": args.batch_size, "repeat": args.repeat,
+        },
+        "stages": stages,
+    }
+    print_stages(stages)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare(previous, results, args.max_regression)
+        if regressions:
+            print(f"\nSlower than {args.compare} by more than {args.max_regression:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# benchmarks/scorer_kernels.py
+"""
+Micro-benchmark for PhotoScorer's metric kernels.
+
+Times the current kernels against the original float64 implementation on
+synthetic images and checks that every metric matches it. Memory is how far
+one call raises the process's peak RSS (Linux only), plus, for the current
+kernels, the buffers the scorer keeps between calls.
+
+    python benchmarks/scorer_kernels.py
+    python benchmarks/scorer_kernels.py --sizes 1024x683 6000x4000 --repeat 5
+    python benchmarks/scorer_kernels.py --image photo.jpg
+
+Exits with status 1 if any metric differs by more than --tolerance (relative).
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from photo_scorer import PhotoScorer  # noqa: E402
+
+
+class ArrayAnalysis:
+    """Stand-in for PhotoAnalysis over an already decoded BGR array."""
+
+    def __init__(self, bgr):
+        self.bgr = bgr
+        self.gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        self.hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        self.max_edge = None
+        self.original_size = (bgr.shape[1], bgr.shape[0])
+        self.working_edge = max(bgr.shape[:2])
+
+
+# ----------------- Reference (original float64 kernels) -----------------
+def reference_scores(img, gray, hsv):
+    (B, G, R) = cv2.split(img.astype("float"))
+    rg = np.abs(R - G)
+    yb = np.abs(0.5 * (R + G) - B)
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+    hist_norm = hist.ravel() / hist.sum()
+    hist_norm = hist_norm[hist_norm > 0]
+    return {
+        "laplacian_var": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        "sobel_energy": float(np.sum(np.square(cv2.Sobel(gray, cv2.CV_64F, 1, 0))) +
+                              np.sum(np.square(cv2.Sobel(gray, cv2.CV_64F, 0, 1)))),
+        "noise": float(np.mean(np.abs(gray - cv2.GaussianBlur(gray, (3, 3), 0)))),
+        "brightness_mean": float(np.mean(gray)),
+        "brightness_median": float(np.median(gray)),
+        "saturation_mean": float(np.mean(hsv[:, :, 1])),
+        "saturation_std": float(np.std(hsv[:, :, 1])),
+        "contrast_std": float(np.std(gray)),
+        "contrast_range": float(gray.max() - gray.min()),
+        "colorfulness": float(np.sqrt(rg.mean()**2 + yb.mean()**2) + 0.3 * (rg.std() + yb.std())),
+        "entropy": float(-np.sum(hist_norm * np.log2(hist_norm))),
+        "width": img.shape[1],
+        "height": img.shape[0],
+        "aspect_ratio": img.shape[1] / img.shape[0],
+    }
+
+
+# ----------------- Harness -----------------
+def synthetic_image(width, height, seed=0):
+    """Smooth gradients, hard edges, fine texture and sensor-like noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.empty((height, width, 3), dtype=np.float32)
+    img[..., 0] = 255 * x / width
+    img[..., 1] = 255 * y / height
+    img[..., 2] = 128 + 60 * np.sin(x / 37.0) * np.cos(y / 23.0)
+    img[(x // 200 + y // 200) % 2 == 0] *= 0.6
+    img += rng.normal(0, 8, img.shape).astype(np.float32)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def _status_bytes(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field} not in /proc/self/status")
+
+
+def peak_rss_growth(fn):
+    """
+    How far one run of fn pushes the process's peak resident memory above
+    what it was using before, in bytes. Unlike tracemalloc this sees OpenCV's
+    and numpy's native buffers. Linux only (resets VmHWM); None elsewhere.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = _status_bytes("VmRSS")
+    except OSError:
+        return None
+    fn()
+    return _status_bytes("VmHWM") - before
+
+
+def measure(fn, repeat):
+    """Best wall time over repeat runs and the peak RSS growth of one run."""
+    fn()  # warm-up (also lets the scorer allocate its reusable buffers)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best, peak_rss_growth(fn)
+
+
+def _mb(size):
+    return f"{size / 2**20:8.1f} MB" if size is not None else "     n/a   "
+
+
+def compare(expected, actual, tolerance):
+    mismatches = []
+    for metric, value in expected.items():
+        got = actual[metric]
+        if abs(got - value) > tolerance * max(1.0, abs(value)):
+            mismatches.append(f"{metric}: reference {value!r}, got {got!r}")
+    return mismatches
+
+
+def run(img, label, repeat, tolerance):
+    analysis = ArrayAnalysis(img)
+    scorer = PhotoScorer()
+    expected, ref_time, ref_peak = measure(lambda: reference_scores(img, analysis.gray, analysis.hsv), repeat)
+    actual, new_time, new_peak = measure(lambda: scorer.score_analysis(analysis), repeat)
+    mismatches = compare(expected, actual, tolerance)
+    # Kept between calls, so already resident when the scorer's peak is measured
+    buffers = sum(buf.nbytes for buf in scorer._buffers.values())
+
+    print(
+        f"{label:>12}  reference {ref_time * 1000:8.1f} ms {_mb(ref_peak)}   "
+        f"current {new_time * 1000:8.1f} ms {_mb(new_peak)} + {buffers / 2**20:6.1f} MB buffers   "
+        f"speedup {ref_time / new_time:5.1f}x   parity {'ok' if not mismatches else 'FAILED'}"
+    )
+    for mismatch in mismatches:
+        print(f"    {mismatch}")
+    return not mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1024x683", "3000x2000", "6000x4000"],
+                        help="synthetic image sizes, WIDTHxHEIGHT")
+    parser.add_argument("--image", action="append", default=[], help="also benchmark this image file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="max relative difference per metric")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(1)  # the importer's workers are single-threaded too
+    ok = True
+    for size in args.sizes:
+        width, height = (int(v) for v in size.lower().split("x"))
+        ok &= run(synthetic_image(width, height), size, args.repeat, args.tolerance)
+    for path in args.image:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"Cannot read {path}")
+            ok = False
+            continue
+        ok &= run(img, os.path.basename(path), args.repeat, args.tolerance)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,41 +1,303 @@
 # db.py
+import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from dotenv import load_dotenv
 
 load_dotenv()  # loads DB credentials from .env
 
+BATCH_PAGE_SIZE = 1000  # rows per multi-row VALUES statement
+DEFAULT_POOL_SIZE = 8    # max open connections (override with DB_POOL_SIZE)
+POOL_TIMEOUT = 30        # seconds to wait for a free connection
+HEALTH_CHECK_IDLE = 30   # seconds idle before a connection is pinged on checkout
+IMPORT_RUN_LOCK = 1  # advisory lock class of import runs: (IMPORT_RUN_LOCK, run_id) is held while a run is live
+DEFAULT_DUPLICATE_SCOPE = "all"  # legacy scope of groups found before they were kept per collection
+
+# photo_scores metric columns, in display order; bump SCORER_VERSION when a metric's definition changes
+SCORE_METRICS = (
+    "laplacian_var", "sobel_energy", "noise",
+    "brightness_mean", "brightness_median", "saturation_mean", "saturation_std",
+    "contrast_std", "contrast_range", "colorfulness", "entropy",
+    "width", "height", "aspect_ratio",
+)
+SIZE_SCORE_METRICS = ("width", "height", "aspect_ratio")
+SCORE_COLUMN_TYPES = {
+    "laplacian_var": "DOUBLE PRECISION", "sobel_energy": "DOUBLE PRECISION", "width": "INT", "height": "INT",
+}
+SCORER_VERSION = "2"
+
+# Typed photo_exif columns filled from the tags (see photo_exif_fill_columns in migrations/)
+EXIF_COLUMNS = ("capture_time", "iso", "exposure_time", "f_number", "focal_length", "lens", "camera")
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+HASH_MASK = (1 << 64) - 1
+
+
+def _to_bigint(value):
+    """Map an unsigned 64-bit hash onto Postgres' signed BIGINT range."""
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _load_migrations(migrations_dir):
+    """[(version, name, path)] for the NNNN_description.sql files in migrations_dir, by version."""
+    migrations = []
+    for file_name in os.listdir(migrations_dir):
+        prefix = file_name.split("_", 1)[0]
+        if file_name.endswith(".sql") and prefix.isdigit():
+            migrations.append((int(prefix), file_name[:-4], os.path.join(migrations_dir, file_name)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {migrations_dir}")
+    return migrations
+
+
+def duplicate_scope(collection_id):
+    """Scope of a collection's near-duplicate groups; incremental and batch detection both write to it."""
+    return f"collection:{collection_id}"
+
+
+def _exif_json(exif):
+    """EXIF dict as JSON for a JSONB column; values JSON cannot hold are stored as strings."""
+    return Json(exif, dumps=lambda value: json.dumps(value, default=str).replace("\\u0000", ""))
+
 
 class Database:
-    def __init__(self):
-        self.conn = psycopg2.connect(
+    """
+    Data access layer backed by a bounded, thread-safe connection pool.
+    Every query checks out a connection for its own duration, so the UI,
+    importer and background jobs can use one Database from different threads.
+    A thread inside transaction() keeps its connection until the transaction ends.
+    """
+
+    def __init__(self, max_connections=None):
+        max_connections = max_connections or int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE))
+        self._pool = ThreadedConnectionPool(
+            1, max_connections,
             dbname=os.getenv("DB_NAME", "autocull_db"),
             user=os.getenv("DB_USER", "postgres"),
             password=os.getenv("DB_PASS", "admin"),
             host=os.getenv("DB_HOST", "localhost"),
             port=os.getenv("DB_PORT", "5432")
         )
-        self.conn.autocommit = True
+        # The pool raises when exhausted; the semaphore makes callers wait instead.
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+        self._last_used = {}  # id(conn) -> monotonic time it was last checked in
+        self._listeners = []  # callables told about metadata changes (see notify_changed)
+        self._run_locks = {}  # run_id -> connection holding the run's session advisory lock
+
+    # ----------------- Connections -----------------
+    @contextmanager
+    def connection(self):
+        """
+        Check out a healthy autocommit connection for the calling thread.
+        Inside transaction() this is the transaction's connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=POOL_TIMEOUT):
+            raise PoolError(f"No database connection available after {POOL_TIMEOUT}s")
+        try:
+            for _ in range(2):
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                self._discard(conn)
+            raise psycopg2.OperationalError("Could not get a working database connection")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def _is_healthy(self, conn):
+        """Cheap health check: closed flag always, a round trip only after the connection sat idle."""
+        if conn.closed:
+            return False
+        if not conn.autocommit:  # fresh from the pool
+            conn.autocommit = True
+        if time.monotonic() - self._last_used.get(id(conn), 0) < HEALTH_CHECK_IDLE:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _run(self, work):
+        """
+        Run work(conn) on a pooled connection. If the connection turns out to be
+        dead (server restart, network drop), reconnect and retry once, unless we
+        are inside a transaction, which the caller has to restart as a whole.
+        """
+        for attempt in range(2):
+            with self.connection() as conn:
+                try:
+                    return work(conn)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    if not conn.closed or attempt or getattr(self._local, "conn", None) is not None:
+                        raise
+                    print("[WARN] Lost database connection, reconnecting")
+
+    def close(self):
+        self._pool.closeall()
 
     # ----------------- Helper Methods -----------------
     def fetch(self, query, params=None):
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, params or ())
-            return cur.fetchall()
+        def work(conn):
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params or ())
+                return cur.fetchall()
+        return self._run(work)
 
     def execute(self, query, params=None):
-        with self.conn.cursor() as cur:
-            cur.execute(query, params or ())
-            return True
+        def work(conn):
+            with conn.cursor() as cur:
+                cur.execute(query, params or ())
+                return True
+        return self._run(work)
+
+    def execute_batch(self, query, rows, template=None, fetch=False):
+        """
+        Run a multi-row INSERT (query must contain a single VALUES %s) for all rows.
+        Rows are sent in pages of BATCH_PAGE_SIZE, so a few round trips replace one per row.
+        """
+        if not rows:
+            return [] if fetch else True
+
+        def work(conn):
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                result = execute_values(cur, query, rows, template=template,
+                                        page_size=BATCH_PAGE_SIZE, fetch=fetch)
+                return result if fetch else True
+        return self._run(work)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group several writes into one transaction on one pooled connection
+        (connections are autocommit otherwise). Nested use joins the outer transaction.
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield self
+            return
+        with self.connection() as conn:
+            conn.autocommit = False
+            self._local.conn = conn
+            try:
+                yield self
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self._local.conn = None
+                if not conn.closed:
+                    conn.autocommit = True
+
+    # ----------------- Change notification -----------------
+    def add_listener(self, callback):
+        """Register callback(photo_ids=..., group_ids=...) to be told about metadata changes."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def notify_changed(self, photo_ids=None, group_ids=None):
+        """
+        Tell listeners (e.g. PhotoMetadataCache) that stored metadata changed.
+        Writers call this explicitly once their transaction has committed.
+        :param photo_ids: photos whose EXIF/scores/styles/groups changed; None means any photo
+        :param group_ids: near-duplicate groups whose membership changed
+        """
+        photo_ids = list(photo_ids) if photo_ids is not None else None
+        group_ids = list(group_ids) if group_ids is not None else None
+        for callback in list(self._listeners):
+            try:
+                callback(photo_ids=photo_ids, group_ids=group_ids)
+            except Exception as e:
+                print(f"Change listener failed: {e}")
 
     # ----------------- Schema -----------------
-    def create_schema(self, schema_file="schema.sql"):
-        """Run schema.sql to create tables."""
-        with open(schema_file, "r") as f:
-            sql = f.read()
-        self.execute(sql)
-        print("Database schema created.")
+    def create_schema(self, migrations_dir=MIGRATIONS_DIR):
+        """Create or upgrade the schema by applying pending migrations (see migrate)."""
+        return self.migrate(migrations_dir)
+
+    def schema_version(self):
+        """Highest applied migration version; 0 for a database without schema_migrations."""
+        try:
+            return self.fetch("SELECT max(version) AS version FROM schema_migrations")[0]["version"] or 0
+        except psycopg2.errors.UndefinedTable:
+            return 0
+
+    def migrate(self, migrations_dir=MIGRATIONS_DIR):
+        """
+        Apply the migrations in migrations_dir that have not been applied yet,
+        in version order, in one transaction, recording each in schema_migrations.
+        When the schema is current this costs a single query. An advisory lock
+        keeps two processes starting at once from applying the same migration.
+        :return: names of the applied migrations
+        """
+        migrations = _load_migrations(migrations_dir)
+        if not migrations or self.schema_version() >= migrations[-1][0]:
+            return []
+
+        applied = []
+        with self.transaction(), self.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('autocull:schema_migrations'))")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            cur.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cur.fetchall()}
+            for version, name, path in migrations:
+                if version in done:
+                    continue
+                with open(path, "r") as f:
+                    cur.execute(f.read())
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                applied.append(name)
+                print(f"Applied migration {name}")
+        return applied
 
     # ----------------- Collections -----------------
     def add_collection(self, name: str):
@@ -45,13 +307,159 @@ class Database:
     def get_collections(self):
         return self.fetch("SELECT * FROM collections ORDER BY created_at DESC")
 
+    def get_or_create_collection(self, name: str, source_path: str):
+        """
+        Return the collection imported from source_path, creating it if needed,
+        so importing the same folder again adds to the same collection.
+        """
+        source_path = os.path.abspath(source_path)
+        with self.transaction():
+            self.execute("SELECT pg_advisory_xact_lock(hashtext('collection:' || %s))", (source_path,))
+            rows = self.fetch(
+                "SELECT id FROM collections WHERE source_path=%s ORDER BY id LIMIT 1", (source_path,)
+            )
+            if rows:
+                return rows[0]["id"]
+            return self.fetch(
+                "INSERT INTO collections (name, source_path) VALUES (%s, %s) RETURNING id",
+                (name, source_path),
+            )[0]["id"]
+
+    def find_collection(self, source_path: str):
+        """The collection imported from source_path, or None."""
+        rows = self.fetch(
+            "SELECT * FROM collections WHERE source_path=%s ORDER BY id LIMIT 1", (os.path.abspath(source_path),)
+        )
+        return rows[0] if rows else None
+
+    def get_collection(self, collection_id: int):
+        rows = self.fetch("SELECT * FROM collections WHERE id=%s", (collection_id,))
+        return rows[0] if rows else None
+
     # ----------------- Photos -----------------
-    def add_photo(self, collection_id: int, file_path: str, file_name: str, status="undecided"):
+    def add_photo(self, collection_id: int, file_path: str, file_name: str, status="undecided", phash=None):
+        """
+        :param phash: optional 64-bit perceptual hash (unsigned int), stored as BIGINT
+        """
+        query = """
+        INSERT INTO photos (collection_id, file_path, file_name, status, phash)
+        VALUES (%s,%s,%s,%s,%s) RETURNING id
+        """
+        params = (collection_id, file_path, file_name, status, _to_bigint(phash))
+        return self.fetch(query, params)[0]["id"]
+
+    def add_photos(self, collection_id: int, photos: list[dict], status="undecided"):
+        """
+        Insert many photos in one statement.
+        :param photos: dicts with 'file_path', 'file_name' and optional 'phash',
+            'file_size', 'file_mtime_ns' and 'content_hash'
+        :return: new photo IDs, in the same order as photos
+        """
+        rows = [
+            (
+                collection_id, p["file_path"], p["file_name"], status, _to_bigint(p.get("phash")),
+                p.get("file_size"), p.get("file_mtime_ns"), p.get("content_hash"),
+            )
+            for p in photos
+        ]
+        query = """
+        INSERT INTO photos (collection_id, file_path, file_name, status, phash,
+                            file_size, file_mtime_ns, content_hash)
+        VALUES %s RETURNING id
+        """
+        with self.transaction():
+            return [row["id"] for row in self.execute_batch(query, rows, fetch=True)]
+
+    def update_photos(self, photos: list[dict]):
+        """
+        Update the file and fingerprint columns of existing photos in one statement.
+        Status, styles and group membership are kept.
+        :param photos: dicts with 'id', 'file_path', 'file_name', 'phash',
+            'file_size', 'file_mtime_ns' and 'content_hash'
+        """
+        rows = [
+            (
+                p["id"], p["file_path"], p["file_name"], _to_bigint(p.get("phash")),
+                p.get("file_size"), p.get("file_mtime_ns"), p.get("content_hash"),
+            )
+            for p in photos
+        ]
         query = """
-        INSERT INTO photos (collection_id, file_path, file_name, status)
-        VALUES (%s,%s,%s,%s) RETURNING id
+        UPDATE photos p SET file_path = v.file_path, file_name = v.file_name,
+               phash = COALESCE(v.phash, p.phash), file_size = v.file_size,
+               file_mtime_ns = v.file_mtime_ns, content_hash = v.content_hash
+        FROM (VALUES %s) AS v(id, file_path, file_name, phash, file_size, file_mtime_ns, content_hash)
+        WHERE p.id = v.id
+        """
+        template = "(%s::int, %s, %s, %s::bigint, %s::bigint, %s::bigint, %s)"
+        self.execute_batch(query, rows, template=template)
+
+    def clear_photo_metadata(self, photo_ids):
+        """
+        Delete EXIF, scores and near-duplicate group memberships of photos whose
+        file changed, before they are re-analyzed. Groups left with fewer than
+        two photos are dropped.
+        :return: IDs of the groups the photos were removed from
+        """
+        if not photo_ids:
+            return []
+        photo_ids = list(photo_ids)
+        with self.transaction():
+            self.execute("DELETE FROM photo_exif WHERE photo_id = ANY(%s)", (photo_ids,))
+            self.execute("DELETE FROM photo_scores WHERE photo_id = ANY(%s)", (photo_ids,))
+            scopes = self.fetch("""
+                SELECT DISTINCT g.method, g.scope FROM near_duplicate_groups g
+                JOIN near_duplicate_photos ndp ON ndp.group_id = g.id
+                WHERE ndp.photo_id = ANY(%s)
+                ORDER BY g.method, g.scope
+            """, (photo_ids,))
+            for row in scopes:
+                self._lock_near_duplicate_scope(row["method"], row["scope"])
+            rows = self.fetch(
+                "DELETE FROM near_duplicate_photos WHERE photo_id = ANY(%s) RETURNING group_id", (photo_ids,)
+            )
+            group_ids = sorted({row["group_id"] for row in rows})
+            if group_ids:
+                self.execute("""
+                    DELETE FROM near_duplicate_groups g WHERE g.id = ANY(%s)
+                    AND (SELECT COUNT(*) FROM near_duplicate_photos ndp WHERE ndp.group_id = g.id) < 2
+                """, (group_ids,))
+        return group_ids
+
+    def get_photo_fingerprints(self, collection_id: int):
+        """Return id, file_path and fingerprint columns for every photo in a collection."""
+        return self.fetch(
+            """
+            SELECT id, file_path, file_size, file_mtime_ns, content_hash
+            FROM photos WHERE collection_id=%s
+            """,
+            (collection_id,),
+        )
+
+    def set_photo_phash(self, photo_id, phash):
+        self.execute("UPDATE photos SET phash=%s WHERE id=%s", (_to_bigint(phash), photo_id))
+
+    def set_photo_hashes(self, hashes: dict):
+        """
+        Store the perceptual hashes of many photos in one statement.
+        :param hashes: photo_id -> 64-bit phash (unsigned int)
         """
-        return self.fetch(query, (collection_id, file_path, file_name, status))[0]["id"]
+        rows = [(photo_id, _to_bigint(phash)) for photo_id, phash in hashes.items()]
+        query = "UPDATE photos p SET phash = v.phash FROM (VALUES %s) AS v(id, phash) WHERE p.id = v.id"
+        self.execute_batch(query, rows, template="(%s::int, %s::bigint)")
+
+    def get_photo_hashes(self, collection_id=None):
+        """
+        Return (photo_id, phash) for every photo with a stored hash, optionally
+        only those in one collection. Hashes come back as unsigned 64-bit ints.
+        """
+        query = "SELECT id, phash FROM photos WHERE phash IS NOT NULL"
+        params = None
+        if collection_id is not None:
+            query += " AND collection_id=%s"
+            params = (collection_id,)
+        rows = self.fetch(query, params)
+        return [(row["id"], row["phash"] & HASH_MASK) for row in rows]
 
     def get_photos(self, collection_id=None):
         query = "SELECT * FROM photos"
@@ -63,27 +471,291 @@ class Database:
     def get_all_photos(self):
         return self.fetch("SELECT * FROM photos")
 
+    def get_photos_by_ids(self, photo_ids):
+        """Photo rows for the given IDs, in ID (import) order."""
+        if not photo_ids:
+            return []
+        return self.fetch("SELECT * FROM photos WHERE id = ANY(%s) ORDER BY id", (list(photo_ids),))
+
+    # ----------------- Import Runs -----------------
+    def start_import_run(self, collection_id: int, source_path=None):
+        """
+        Record a new run and take its lock in the same statement, so no other
+        process ever sees it 'running' and unlocked. Release with unlock_import_run.
+        """
+        query = """
+        INSERT INTO import_runs (collection_id, source_path) VALUES (%s, %s)
+        RETURNING id, pg_try_advisory_lock(%s, id) AS locked
+        """
+        return self._hold_run_lock(query, (collection_id, source_path, IMPORT_RUN_LOCK))
+
+    def lock_import_run(self, run_id):
+        """
+        Take a run's session advisory lock on a dedicated connection, held
+        until unlock_import_run (or until this process dies).
+        :return: False if another session holds it, i.e. the run is live elsewhere
+        """
+        query = "SELECT %s AS id, pg_try_advisory_lock(%s, %s) AS locked"
+        return self._hold_run_lock(query, (run_id, IMPORT_RUN_LOCK, run_id)) is not None
+
+    def _hold_run_lock(self, query, params):
+        """Run query (returning id, locked) on a connection kept out of the pool while the lock is held."""
+        conn = self._checkout()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params)
+                row = cur.fetchone()
+        except Exception:
+            self._checkin(conn)
+            raise
+        if not row["locked"]:
+            self._checkin(conn)
+            return None
+        self._run_locks[row["id"]] = conn
+        return row["id"]
+
+    def unlock_import_run(self, run_id):
+        conn = self._run_locks.pop(run_id, None)
+        if conn is None:
+            return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s, %s)", (IMPORT_RUN_LOCK, run_id))
+        except psycopg2.Error:
+            pass  # the connection is gone, and the lock with it
+        finally:
+            self._checkin(conn)
+
+    def live_import_runs(self, run_ids):
+        """IDs among run_ids whose lock another session holds: imports still running, here or elsewhere."""
+        run_ids = list(run_ids)
+        if not run_ids:
+            return set()
+
+        def work(conn):
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, pg_try_advisory_lock(%s, id) FROM unnest(%s::int[]) AS id",
+                    (IMPORT_RUN_LOCK, run_ids)
+                )
+                rows = cur.fetchall()
+                free = [run_id for run_id, locked in rows if locked]
+                if free:
+                    cur.execute("SELECT pg_advisory_unlock(%s, id) FROM unnest(%s::int[]) AS id",
+                                (IMPORT_RUN_LOCK, free))
+            return {run_id for run_id, locked in rows if not locked}
+        return self._run(work)
+
+    def update_import_run(self, run_id, counts: dict, status=None):
+        """
+        Record a run's progress and optionally its new status.
+        :param counts: 'imported', 'updated', 'relinked', 'skipped' and 'failed' file counts so far
+        """
+        query = """
+        UPDATE import_runs SET files_imported=%s, files_updated=%s, files_relinked=%s, files_skipped=%s,
+               files_failed=%s,
+               status=COALESCE(%s, status), updated_at=NOW(),
+               finished_at=CASE WHEN %s IN ('completed', 'interrupted', 'cancelled') THEN NOW() ELSE finished_at END
+        WHERE id=%s
+        """
+        params = (
+            counts.get("imported", 0), counts.get("updated", 0), counts.get("relinked", 0), counts.get("skipped", 0),
+            counts.get("failed", 0), status, status, run_id,
+        )
+        self.execute(query, params)
+
+    def get_import_run(self, run_id):
+        rows = self.fetch("SELECT * FROM import_runs WHERE id=%s", (run_id,))
+        return rows[0] if rows else None
+
+    def get_import_runs(self, status=None):
+        if status:
+            return self.fetch("SELECT * FROM import_runs WHERE status=%s ORDER BY id", (status,))
+        return self.fetch("SELECT * FROM import_runs ORDER BY id")
+
     # ----------------- EXIF -----------------
     def add_exif(self, photo_id, tag_name, tag_value):
+        """Set one tag, keeping the photo's other tags."""
+        query = """
+        INSERT INTO photo_exif (photo_id, tags) VALUES (%s, %s)
+        ON CONFLICT (photo_id) DO UPDATE SET tags = photo_exif.tags || EXCLUDED.tags
+        """
+        self.execute(query, (photo_id, _exif_json({tag_name: tag_value})))
+
+    def add_exif_batch(self, exif_by_photo: dict):
+        """
+        Store the EXIF tags of one or many photos in one statement, one JSONB
+        document per photo (replacing any stored one). The typed columns
+        (capture_time, iso, ...) are filled in by a trigger.
+        :param exif_by_photo: photo_id -> {tag_name: tag_value}
+        """
+        rows = [(photo_id, _exif_json(exif)) for photo_id, exif in exif_by_photo.items() if exif]
         query = """
-        INSERT INTO exif_data (photo_id, tag_name, tag_value)
-        VALUES (%s, %s, %s)
+        INSERT INTO photo_exif (photo_id, tags) VALUES %s
+        ON CONFLICT (photo_id) DO UPDATE SET tags = EXCLUDED.tags
         """
-        self.execute(query, (photo_id, tag_name, str(tag_value)))
+        self.execute_batch(query, rows, template="(%s, %s::jsonb)")
 
     def get_exif(self, photo_id):
-        query = "SELECT tag_name, tag_value FROM exif_data WHERE photo_id=%s"
-        results = self.fetch(query, (photo_id,))
-        return {row["tag_name"]: row["tag_value"] for row in results} if results else {}
+        rows = self.fetch("SELECT tags FROM photo_exif WHERE photo_id=%s", (photo_id,))
+        return rows[0]["tags"] if rows else {}
+
+    def get_photos_by_exif(self, filters=None, tags=None, collection_id=None, order_by=None,
+                           descending=False, limit=None):
+        """
+        Find photos by EXIF in one indexed query, e.g. ISO above 3200 in a collection:
+        get_photos_by_exif({"iso": (3200, None)}, collection_id=3)
+        :param filters: column from EXIF_COLUMNS -> (min, max) range (either bound may be None)
+            or an exact value
+        :param tags: {tag_name: value} the stored tags must contain (GIN index)
+        :param order_by: EXIF_COLUMNS column to sort by
+        :return: photo rows with the typed EXIF columns added
+        """
+        unknown = set(filters or {}) - set(EXIF_COLUMNS)
+        if order_by and order_by not in EXIF_COLUMNS:
+            unknown.add(order_by)
+        if unknown:
+            raise ValueError(f"Unknown EXIF columns: {', '.join(sorted(unknown))}")
+
+        conditions = []
+        params = []
+        if collection_id:
+            conditions.append("p.collection_id = %s")
+            params.append(collection_id)
+        for column, condition in (filters or {}).items():
+            if isinstance(condition, (tuple, list)):
+                low, high = condition
+                if low is not None:
+                    conditions.append(f"e.{column} >= %s")
+                    params.append(low)
+                if high is not None:
+                    conditions.append(f"e.{column} <= %s")
+                    params.append(high)
+            else:
+                conditions.append(f"e.{column} = %s")
+                params.append(condition)
+        if tags:
+            conditions.append("e.tags @> %s::jsonb")
+            params.append(_exif_json(tags))
 
+        columns = ", ".join(f"e.{column}" for column in EXIF_COLUMNS)
+        query = f"SELECT p.*, {columns} FROM photo_exif e JOIN photos p ON p.id = e.photo_id"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if order_by:
+            query += f" ORDER BY e.{order_by} {'DESC' if descending else 'ASC'} NULLS LAST"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return self.fetch(query, params)
 
     # ----------------- Scores -----------------
-    def add_score(self, photo_id, score_type, value):
-        query = "INSERT INTO scores (photo_id, type, value) VALUES (%s,%s,%s)"
-        self.execute(query, (photo_id, score_type, value))
+    def add_score(self, photo_id, score_type, value, scorer_version=SCORER_VERSION):
+        self.add_scores_batch({photo_id: {score_type: value}}, scorer_version=scorer_version)
+
+    def add_scores_batch(self, scores_by_photo: dict, working_edges=None, scorer_version=SCORER_VERSION):
+        """
+        Upsert metrics for one or many photos in one statement, one photo_scores
+        row per photo. Metrics not given keep their stored value.
+        :param scores_by_photo: photo_id -> {metric_name: value}, names from SCORE_METRICS
+        :param working_edges: optional photo_id -> long edge (px) the pixel metrics were computed at
+        """
+        working_edges = working_edges or {}
+        unknown = {metric for scores in scores_by_photo.values() for metric in scores} - set(SCORE_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown score metrics: {', '.join(sorted(unknown))}")
+        rows = [
+            (photo_id, scorer_version, working_edges.get(photo_id),
+             *(None if scores.get(metric) is None else float(scores[metric]) for metric in SCORE_METRICS))
+            for photo_id, scores in scores_by_photo.items()
+        ]
+        columns = ", ".join(SCORE_METRICS)
+        updates = ", ".join(
+            f"{column} = COALESCE(EXCLUDED.{column}, photo_scores.{column})"
+            for column in ("working_edge",) + SCORE_METRICS
+        )
+        query = f"""
+        INSERT INTO photo_scores (photo_id, scorer_version, working_edge, {columns})
+        VALUES %s
+        ON CONFLICT (photo_id, scorer_version) DO UPDATE SET {updates}, scored_at = NOW()
+        """
+        template = "(%s, %s, %s, " + ", ".join(
+            f"%s::{SCORE_COLUMN_TYPES.get(metric, 'REAL')}" for metric in SCORE_METRICS
+        ) + ")"
+        self.execute_batch(query, rows, template=template)
 
     def get_scores(self, photo_id):
-        return self.fetch("SELECT * FROM scores WHERE photo_id=%s", (photo_id,))
+        """
+        Metrics of a photo from its most recent scoring, one row per metric:
+        photo_id, type, value and resolution (long edge in px it was computed at).
+        """
+        rows = self.fetch(
+            "SELECT * FROM photo_scores WHERE photo_id=%s ORDER BY scored_at DESC LIMIT 1", (photo_id,)
+        )
+        return self._score_rows(rows[0]) if rows else []
+
+    @staticmethod
+    def _score_rows(row):
+        original_edge = max(row["width"] or 0, row["height"] or 0) or None
+        return [
+            {
+                "photo_id": row["photo_id"],
+                "type": metric,
+                "value": row[metric],
+                "resolution": original_edge if metric in SIZE_SCORE_METRICS else row["working_edge"],
+            }
+            for metric in SCORE_METRICS if row[metric] is not None
+        ]
+
+    def get_unscored_photos(self, collection_id=None, scorer_version=SCORER_VERSION):
+        """Photos with no scores from scorer_version (never scored, or scored by an older scorer)."""
+        query = """
+        SELECT p.* FROM photos p
+        WHERE NOT EXISTS (SELECT 1 FROM photo_scores s WHERE s.photo_id = p.id AND s.scorer_version = %s)
+        """
+        params = [scorer_version]
+        if collection_id:
+            query += " AND p.collection_id = %s"
+            params.append(collection_id)
+        return self.fetch(query + " ORDER BY p.id", params)
+
+    def get_photos_by_scores(self, order_by=None, descending=True, filters=None, collection_id=None,
+                             limit=None, scorer_version=SCORER_VERSION):
+        """
+        Rank and/or filter photos on their scores in one indexed query.
+        :param order_by: metric to sort by; photos without it are left out
+        :param filters: metric -> (min, max), either bound may be None
+        :return: photo rows with the order_by metric added as 'score'
+        """
+        metrics = ([order_by] if order_by else []) + list(filters or {})
+        unknown = set(metrics) - set(SCORE_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown score metrics: {', '.join(sorted(unknown))}")
+
+        conditions = ["s.scorer_version = %s"]
+        params = [scorer_version]
+        if collection_id:
+            conditions.append("p.collection_id = %s")
+            params.append(collection_id)
+        for metric, (low, high) in (filters or {}).items():
+            if low is not None:
+                conditions.append(f"s.{metric} >= %s")
+                params.append(low)
+            if high is not None:
+                conditions.append(f"s.{metric} <= %s")
+                params.append(high)
+
+        query = f"SELECT p.*, {f's.{order_by}' if order_by else 'NULL'} AS score " \
+                "FROM photo_scores s JOIN photos p ON p.id = s.photo_id"
+        if order_by:
+            conditions.append(f"s.{order_by} IS NOT NULL")
+        query += " WHERE " + " AND ".join(conditions)
+        if order_by:
+            query += f" ORDER BY s.{order_by} {'DESC' if descending else 'ASC'}"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return self.fetch(query, params)
 
     # ----------------- Styles -----------------
     def add_style(self, name, description=None):
@@ -95,6 +767,30 @@ class Database:
         query = "INSERT INTO photo_styles (photo_id, style_id) VALUES (%s,%s) ON CONFLICT DO NOTHING"
         self.execute(query, (photo_id, style_id))
 
+    def get_or_create_styles(self, names):
+        """
+        Return {name: style_id} for all names, creating missing styles.
+        Unlike add_style, existing styles resolve to their ID instead of None.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        with self.transaction():
+            self.execute_batch(
+                "INSERT INTO styles (name) VALUES %s ON CONFLICT (name) DO NOTHING",
+                [(name,) for name in names]
+            )
+            rows = self.fetch("SELECT id, name FROM styles WHERE name = ANY(%s)", (names,))
+        return {row["name"]: row["id"] for row in rows}
+
+    def assign_styles_batch(self, photo_ids, style_ids):
+        """Assign every style in style_ids to every photo in photo_ids in a single transaction."""
+        rows = [(photo_id, style_id) for photo_id in photo_ids for style_id in style_ids]
+        with self.transaction():
+            self.execute_batch(
+                "INSERT INTO photo_styles (photo_id, style_id) VALUES %s ON CONFLICT DO NOTHING", rows
+            )
+
     def get_styles_for_photo(self, photo_id):
         return self.fetch("""
             SELECT s.* FROM styles s
@@ -103,23 +799,20 @@ class Database:
         """, (photo_id,))
 
     # ----------------- Near Duplicates -----------------
-    def add_near_duplicate_group(self, method=None):
+    def add_near_duplicate_group(self, method=None, scope=DEFAULT_DUPLICATE_SCOPE):
         """
         Create a new near-duplicate group and return its ID.
         :param method: method used to detect duplicates (e.g., 'phash')
+        :param scope: which photos the detection run covered (e.g., 'all', 'collection:3')
         """
-        query = "INSERT INTO near_duplicate_groups (method) VALUES (%s) RETURNING id"
-        cursor = self.conn.cursor()
+        query = "INSERT INTO near_duplicate_groups (method, scope) VALUES (%s, %s) RETURNING id"
         try:
-            cursor.execute(query, (method,))
-            group_id = cursor.fetchone()[0]
+            group_id = self.fetch(query, (method, scope))[0]["id"]
             print(f"[DEBUG] Created near-duplicate group_id={group_id}, method={method}")
             return group_id
         except Exception as e:
             print(f"[ERROR] Failed to create near-duplicate group (method={method}): {e}")
             return None
-        finally:
-            cursor.close()
 
 
     def assign_photo_to_near_duplicate_group(self, group_id, photo_id):
@@ -133,30 +826,112 @@ class Database:
             VALUES (%s, %s)
             ON CONFLICT DO NOTHING
         """
-        cursor = self.conn.cursor()
         try:
-            cursor.execute(query, (group_id, photo_id))
+            self.execute(query, (group_id, photo_id))
             print(f"[DEBUG] Assigned photo_id={photo_id} to group_id={group_id}")
         except Exception as e:
             print(f"[ERROR] Failed to assign photo_id={photo_id} to group_id={group_id}: {e}")
-        finally:
-            cursor.close()
 
 
+    def replace_near_duplicate_groups(self, method, scope, groups):
+        """
+        Atomically replace the grouping stored for (method, scope) with groups.
+        Old groups are deleted and the new ones bulk-inserted in one transaction,
+        so readers see either the previous or the new grouping, and reruns do
+        not accumulate groups.
+        :param groups: iterable of photo ID collections, one per group
+        :return: number of groups written
+        """
+        groups = [list(members) for members in groups if members]
+        with self.transaction():
+            self._lock_near_duplicate_scope(method, scope)
+            self.execute("DELETE FROM near_duplicate_groups WHERE method=%s AND scope=%s", (method, scope))
+            group_ids = self._insert_near_duplicate_groups(method, scope, len(groups))
+            self.execute_batch(
+                "INSERT INTO near_duplicate_photos (group_id, photo_id) VALUES %s ON CONFLICT DO NOTHING",
+                [(group_id, photo_id) for group_id, members in zip(group_ids, groups) for photo_id in members]
+            )
+        return len(group_ids)
+
+    def add_to_near_duplicate_groups(self, method, scope, components):
+        """
+        Merge connected photo sets into the stored grouping for (method, scope),
+        in one transaction. A component touching no group becomes a new group,
+        one touching a single group joins it, and one touching several merges
+        them into the oldest.
+        :param components: iterable of photo ID collections
+        :return: IDs of the groups that were created, grown or merged away
+        """
+        components = [list(members) for members in components if members]
+        if not components:
+            return []
+        idxs = [idx for idx, members in enumerate(components) for _ in members]
+        photo_ids = [photo_id for members in components for photo_id in members]
+
+        with self.transaction():
+            self._lock_near_duplicate_scope(method, scope)
+            touched = self.fetch("""
+                SELECT c.idx, array_agg(DISTINCT ndp.group_id ORDER BY ndp.group_id) AS group_ids
+                FROM unnest(%s::int[], %s::int[]) AS c(idx, photo_id)
+                JOIN near_duplicate_photos ndp ON ndp.photo_id = c.photo_id
+                JOIN near_duplicate_groups g ON g.id = ndp.group_id
+                WHERE g.method = %s AND g.scope = %s
+                GROUP BY c.idx
+            """, (idxs, photo_ids, method, scope))
+            existing = {row["idx"]: row["group_ids"] for row in touched}
+
+            fresh = [idx for idx in range(len(components)) if idx not in existing]
+            targets = dict(zip(fresh, self._insert_near_duplicate_groups(method, scope, len(fresh))))
+            merge_from, merge_into = [], []
+            for idx, group_ids in existing.items():
+                targets[idx] = group_ids[0]
+                merge_from += group_ids[1:]
+                merge_into += [group_ids[0]] * (len(group_ids) - 1)
+
+            if merge_from:
+                self.execute("""
+                    INSERT INTO near_duplicate_photos (group_id, photo_id)
+                    SELECT m.target, ndp.photo_id
+                    FROM unnest(%s::int[], %s::int[]) AS m(source, target)
+                    JOIN near_duplicate_photos ndp ON ndp.group_id = m.source
+                    ON CONFLICT DO NOTHING
+                """, (merge_from, merge_into))
+                self.execute("DELETE FROM near_duplicate_groups WHERE id = ANY(%s)", (merge_from,))
+            self.execute_batch(
+                "INSERT INTO near_duplicate_photos (group_id, photo_id) VALUES %s ON CONFLICT DO NOTHING",
+                [(targets[idx], photo_id) for idx, photo_id in zip(idxs, photo_ids)]
+            )
+        return sorted(set(targets.values()) | set(merge_from))
+
+    def _insert_near_duplicate_groups(self, method, scope, count):
+        """Bulk-create count empty groups; returns their IDs."""
+        rows = self.execute_batch(
+            "INSERT INTO near_duplicate_groups (method, scope) VALUES %s RETURNING id",
+            [(method, scope)] * count, fetch=True
+        )
+        return [row["id"] for row in rows]
+
+    def _lock_near_duplicate_scope(self, method, scope):
+        """Serialize concurrent writers of the same (method, scope) until the transaction ends."""
+        self.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"near_duplicates:{method}:{scope}",))
+
     def get_near_duplicate_groups(self):
         """
         Retrieve all near-duplicate groups with their associated photos.
+        Two queries in total, however many groups there are.
         :return: List of groups with photo IDs
         """
-        query = "SELECT * FROM near_duplicate_groups"
-        groups = self.fetch(query)
+        groups = self.fetch("SELECT * FROM near_duplicate_groups ORDER BY id")
+        members = self.fetch("""
+            SELECT ndp.group_id AS _group_id, p.* FROM near_duplicate_photos ndp
+            JOIN photos p ON p.id = ndp.photo_id
+            ORDER BY ndp.group_id, p.id
+        """)
+        photos_by_group = {}
+        for member in members:
+            photos_by_group.setdefault(member.pop("_group_id"), []).append(member)
         for group in groups:
-            photos = self.fetch("""
-                SELECT p.* FROM photos p
-                JOIN near_duplicate_photos ndp ON p.id = ndp.photo_id
-                WHERE ndp.group_id=%s
-            """, (group["id"],))
-            group["photos"] = photos
+            group["photos"] = photos_by_group.get(group["id"], [])
         return groups
     
     def get_photos_in_near_duplicate_group(self, group_id):
@@ -204,3 +979,47 @@ class Database:
             WHERE ndp.group_id=%s
         """
         return self.fetch(query, (group_id,))
+
+    # ----------------- Photo Details -----------------
+    def get_photo_details(self, photo_ids):
+        """
+        Everything the sidebar viewers show for one or more photos, in one round trip.
+        :param photo_ids: iterable of photo IDs
+        :return: photo_id -> {
+            'exif': {tag_name: value},
+            'scores': rows as returned by get_scores,
+            'styles': style rows,
+            'duplicate_groups': [{'group_id', 'photos': [{'photo_id', 'file_name'}]}],
+        }; unknown IDs are left out
+        """
+        photo_ids = list(photo_ids)
+        if not photo_ids:
+            return {}
+        rows = self.fetch("""
+            SELECT p.id AS photo_id,
+                   COALESCE((SELECT e.tags FROM photo_exif e WHERE e.photo_id = p.id), '{}') AS exif,
+                   (SELECT to_jsonb(s) FROM photo_scores s WHERE s.photo_id = p.id
+                    ORDER BY s.scored_at DESC LIMIT 1) AS scores,
+                   COALESCE((SELECT jsonb_agg(to_jsonb(st) ORDER BY st.name)
+                             FROM photo_styles ps JOIN styles st ON st.id = ps.style_id
+                             WHERE ps.photo_id = p.id), '[]') AS styles,
+                   COALESCE((SELECT jsonb_agg(jsonb_build_object(
+                                 'group_id', g.group_id,
+                                 'photos', (SELECT jsonb_agg(jsonb_build_object('photo_id', m.id, 'file_name', m.file_name)
+                                                             ORDER BY m.id)
+                                            FROM near_duplicate_photos gm JOIN photos m ON m.id = gm.photo_id
+                                            WHERE gm.group_id = g.group_id)
+                             ) ORDER BY g.group_id)
+                             FROM near_duplicate_photos g WHERE g.photo_id = p.id), '[]') AS duplicate_groups
+            FROM photos p
+            WHERE p.id = ANY(%s)
+        """, (photo_ids,))
+        return {
+            row["photo_id"]: {
+                "exif": row["exif"],
+                "scores": self._score_rows(row["scores"]) if row["scores"] else [],
+                "styles": row["styles"],
+                "duplicate_groups": row["duplicate_groups"],
+            }
+            for row in rows
+        }
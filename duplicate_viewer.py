@@ -14,15 +14,15 @@ class DuplicateViewer(BaseSidebarViewer):
         tree.column("photo_id", width=80, anchor="center")
         tree.column("file_name", width=250, anchor="w")
 
-    def update_content(self, photo_id):
+    def update_content(self, photo_id, details=None):
         self.clear_tree()
         self.selected_photo_id = photo_id
         if not photo_id:
             return
-        groups = self.db.get_groups_for_photo(photo_id)
+        groups = self.get_details(photo_id, details).get("duplicate_groups")
         if not groups:
             return
         for g in groups:
             group_id = g["group_id"]
-            for p in self.db.get_photos_in_group(group_id):
+            for p in g["photos"]:
                 self.tree.insert("", "end", values=(group_id, p["photo_id"], p["file_name"]))
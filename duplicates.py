@@ -1,16 +1,32 @@
 # duplicates.py
 DEBUG = False  # Set False to suppress debug output
 
-from PIL import Image
-import imagehash
-import numpy as np
-from sklearn.cluster import DBSCAN
-from db import Database
+import time
+from db import Database, HASH_MASK, duplicate_scope
+from background_job import progress_event
+from hash_index import HammingIndex, hamming_clusters
+from photo_analysis import PhotoAnalysis
+
+METHOD = "phash"
+PROGRESS_EVERY = 100  # photos hashed between progress events in batch runs
 
 class NearDuplicateDetector:
     """
-    Detects near-duplicate photos using perceptual hashing and DBSCAN clustering.
-    Works efficiently for large photo collections.
+    Detects near-duplicate photos using perceptual hashing.
+    Batch runs cluster packed 64-bit hashes with hamming_clusters (same groups
+    as DBSCAN with min_samples=2 and eps=threshold bits, without the 64x
+    memory blow-up or brute-force distances), so they scale to large collections.
+
+    Groups are kept per collection, under duplicate_scope(collection_id), by
+    both batch and incremental runs; importing the same files into a second
+    collection does not pair them with their copies in the first.
+
+    Newly imported photos can be matched incrementally: the hashes stored on
+    a collection's photo rows are loaded once into a HammingIndex, and each
+    new photo is only compared with its candidates there before joining (or
+    merging) existing groups. Indexes are dropped by reset(), which the
+    importer calls at the start of every run, and whenever the database
+    reports that any photo may have changed.
     """
 
     def __init__(self, db: Database, threshold=5):
@@ -20,69 +36,162 @@ class NearDuplicateDetector:
         """
         self.db = db
         self.threshold = threshold
+        self.indexes = {}  # collection_id -> HammingIndex over its stored hashes, loaded on first use
+        db.add_listener(self._on_change)
 
     def _log(self, msg):
         if DEBUG:
             print(msg)
 
-    def find_duplicates_batch(self, photo_list):
+    def get_phash(self, photo):
+        """
+        Return the photo's 64-bit phash as an unsigned int.
+        Uses the hash stored at import when present, otherwise decodes the
+        file; callers store decoded hashes in one batch with _store_hashes.
+        """
+        if photo.get("phash") is not None:
+            return photo["phash"] & HASH_MASK
+        return PhotoAnalysis(photo["file_path"]).phash
+
+    def _store_hashes(self, computed):
+        """Save hashes decoded during a run in one statement, so the next run can skip decoding."""
+        if computed:
+            self.db.set_photo_hashes(computed)
+
+    # ----------------- Incremental -----------------
+    def load_index(self, collection_id):
+        """Build a collection's Hamming index from the hashes stored on its photo rows (no image decoding)."""
+        index = HammingIndex(self.threshold)
+        for photo_id, phash in self.db.get_photo_hashes(collection_id):
+            index.add(photo_id, phash)
+        self.indexes[collection_id] = index
+        self._log(f"[DEBUG] Loaded hash index for collection {collection_id} with {len(index)} photos.")
+        return index
+
+    def reset(self):
+        """Drop the loaded indexes; they are reloaded from the database when next needed."""
+        self.indexes = {}
+
+    def _on_change(self, photo_ids=None, group_ids=None):
+        """Database listener: a change to any photo (photo_ids=None) may have replaced stored hashes."""
+        if photo_ids is None:
+            self.reset()
+
+    def find_duplicates_incremental(self, new_photos, collection_id):
+        """
+        Match new photos against their collection's index and update its groups in place.
+        A new photo within threshold of grouped photos joins their group; if it
+        links several groups they are merged; photos it links that had no group
+        form a new one. Cost grows with the number of new photos, not the library.
+
+        :param new_photos: list of dicts, each with 'id', 'file_path' and optionally 'phash'
+        :param collection_id: collection the new photos were imported into
+        """
+        if not new_photos:
+            return
+        index = self.indexes.get(collection_id)
+        if index is None:
+            index = self.load_index(collection_id)
+
+        new_hashes = {}
+        computed = {}
+        for photo in new_photos:
+            try:
+                new_hashes[photo["id"]] = self.get_phash(photo)
+                if photo.get("phash") is None:
+                    computed[photo["id"]] = new_hashes[photo["id"]]
+            except Exception as e:
+                self._log(f"[ERROR] Failed to hash {photo['file_path']}: {e}")
+        self._store_hashes(computed)
+        for photo_id, phash in new_hashes.items():
+            index.add(photo_id, phash)
+
+        # Connected components of the "within threshold" graph around the new photos
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for photo_id, phash in new_hashes.items():
+            find(photo_id)
+            for other_id, _ in index.query(phash, exclude=photo_id):
+                parent[find(other_id)] = find(photo_id)
+
+        components = {}
+        for photo_id in parent:
+            components.setdefault(find(photo_id), set()).add(photo_id)
+        components = [members for members in components.values() if len(members) > 1]
+        if not components:
+            return
+
+        group_ids = self.db.add_to_near_duplicate_groups(METHOD, duplicate_scope(collection_id), components)
+        self.db.notify_changed(photo_ids=set().union(*components), group_ids=group_ids)
+        self._log(f"[DEBUG] Matched {len(new_hashes)} new photos into {len(components)} groups.")
+
+    # ----------------- Batch -----------------
+    def find_duplicates_batch(self, photo_list, scope, progress=None, cancel_event=None):
         """
         Run near-duplicate detection on a batch of photos.
+        The resulting groups atomically replace the previous run's groups for
+        the same scope (one transaction, bulk inserts).
 
         :param photo_list: list of dicts, each with 'id' and 'file_path'
+        :param scope: duplicate_scope(collection_id) of the collection photo_list covers
+        :param progress: called with a progress_event every PROGRESS_EVERY photos hashed
+        :param cancel_event: threading.Event; once set, hashing stops and the stored
+            groups are left as they were
+        :return: number of groups stored, or None if cancelled
         """
         self._log(f"[DEBUG] Starting batch duplicate detection for {len(photo_list)} photos.")
         if not photo_list:
-            return
+            return 0
 
         hashes = []
         photo_ids = []
+        computed = {}  # hashes decoded in this run, stored together
+        start = time.perf_counter()
+        failed = 0
 
-        for photo in photo_list:
+        for done, photo in enumerate(photo_list):
+            if cancel_event is not None and cancel_event.is_set():
+                self._store_hashes(computed)
+                self._log("[DEBUG] Batch duplicate detection cancelled.")
+                return None
+            if progress is not None and done % PROGRESS_EVERY == 0:
+                progress(progress_event(done, len(photo_list), failed, start))
             photo_id = photo["id"]
             path = photo["file_path"]
             try:
-                img = Image.open(path)
-                phash = imagehash.phash(img)
-                hashes.append(phash.hash.flatten().astype(int))
+                phash = self.get_phash(photo)
+                if photo.get("phash") is None:
+                    computed[photo_id] = phash
+                hashes.append(phash)
                 photo_ids.append(photo_id)
-                self._log(f"[DEBUG] photo_id={photo_id}, hash={phash}")
+                self._log(f"[DEBUG] photo_id={photo_id}, hash={phash:016x}")
             except Exception as e:
+                failed += 1
                 self._log(f"[ERROR] Failed to hash {path}: {e}")
+        if progress is not None:
+            progress(progress_event(len(photo_list), len(photo_list), failed, start))
+        self._store_hashes(computed)
 
         if not hashes:
             self._log("[DEBUG] No valid hashes to process.")
-            return
+            return 0
 
-        hashes_np = np.array(hashes)
-
-        clustering = DBSCAN(
-            eps=self.threshold / 64,
-            min_samples=2,
-            metric="hamming"
-        )
-        labels = clustering.fit_predict(hashes_np)
+        labels = hamming_clusters(hashes, self.threshold)
         self._log(f"[DEBUG] Clustering labels: {labels}")
 
-        cluster_map = {}
-
+        clusters = {}
         for photo_id, label in zip(photo_ids, labels):
-            try:
-                if label == -1:
-                    # Noise: create single-photo group
-                    group_id = self.db.add_near_duplicate_group(method="phash")
-                    self.db.assign_photo_to_near_duplicate_group(group_id, photo_id)
-                    self._log(f"[DEBUG] photo_id={photo_id} -> new group_id={group_id} (noise)")
-                else:
-                    # Clustered: reuse group_id per cluster
-                    if label not in cluster_map:
-                        group_id = self.db.add_near_duplicate_group(method="phash")
-                        cluster_map[label] = group_id
-                        self._log(f"[DEBUG] Created cluster group_id={group_id} for label={label}")
-                    else:
-                        group_id = cluster_map[label]
-
-                    self.db.assign_photo_to_near_duplicate_group(group_id, photo_id)
-                    self._log(f"[DEBUG] photo_id={photo_id} -> group_id={group_id}")
-            except Exception as e:
-                self._log(f"[ERROR] Failed to assign photo_id={photo_id} to group: {e}")
+            if label != -1:  # photos without a near-duplicate get no group
+                clusters.setdefault(label, []).append(photo_id)
+
+        written = self.db.replace_near_duplicate_groups(METHOD, scope, clusters.values())
+        self.db.notify_changed()  # every photo's group membership may have changed
+        self._log(f"[DEBUG] Stored {written} near-duplicate groups for scope={scope}.")
+        return written
@@ -1,34 +1,139 @@
 # exif_reader.py
+import io
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PIL import Image
 import piexif
 
+DEFAULT_EXIF_WORKERS = int(os.getenv("AUTOCULL_EXIF_WORKERS", "8"))  # reads are I/O-bound
+
+JPEG_SOI = b"\xff\xd8"
+TIFF_MAGIC = (b"II*\x00", b"MM\x00*")
+EXIF_HEADER = b"Exif\x00\x00"
+APP1 = 0xE1
+SOS = 0xDA  # image data follows; no EXIF after this
+EOI = 0xD9
+STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))  # TEM and RSTn carry no length
+
+# (ifd name, tag id) -> tag name, built once instead of per tag
+TAG_NAMES = {
+    ifd_name: {tag: info["name"] for tag, info in piexif.TAGS["Image" if ifd_name in ("0th", "1st") else ifd_name].items()}
+    for ifd_name in ("0th", "Exif", "GPS", "Interop", "1st")
+}
+# Pixel data layout of a TIFF file; thousands of offsets, meaningless as metadata
+SKIPPED_TAGS = frozenset(("StripOffsets", "StripByteCounts", "TileOffsets", "TileByteCounts"))
+
+
 class ExifReader:
     """
     Safely extract EXIF data from images.
     Handles bytes, rationals, nested tuples, None, and missing IFDs.
+    Only the header is read: for JPEG the markers are walked up to the Exif
+    APP1 segment with small bounded reads, for TIFF the file is memory-mapped
+    and only the IFDs are touched. Pixel data is never read or decoded.
     """
     @staticmethod
-    def read_exif(file_path: Path) -> dict:
-        exif_data = {}
+    def read_exif(file_path: Path, tags=None) -> dict:
         try:
-            img = Image.open(file_path)
-            raw_exif = img.info.get("exif")
-            if not raw_exif:
-                return exif_data
+            return ExifReader.load(file_path, tags)
+        except Exception as e:
+            print(f"Failed to read EXIF from {file_path}: {e}")
+        return {}
+
+    @staticmethod
+    def load(file_path: Path, tags=None) -> dict:
+        """
+        Like read_exif, but raises instead of returning {} on unreadable files.
+        :param tags: tag names to keep (e.g. {"DateTimeOriginal"}); None keeps all
+        """
+        return ExifReader.parse_exif(ExifReader.raw_exif(file_path), tags)
+
+    @staticmethod
+    def read_exif_batch(file_paths, tags=None, workers=DEFAULT_EXIF_WORKERS):
+        """
+        Read EXIF from many files on a thread pool.
+        :param tags: tag names to keep; None keeps all
+        :return: (results, errors): file_path -> EXIF dict for files that were
+            read, file_path -> error message for files that were not
+        """
+        file_paths = list(file_paths)
+        results, errors = {}, {}
+
+        def read(file_path):
+            try:
+                return file_path, ExifReader.load(file_path, tags), None
+            except Exception as e:
+                return file_path, None, f"{type(e).__name__}: {e}"
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for file_path, exif, error in pool.map(read, file_paths):
+                if error is None:
+                    results[file_path] = exif
+                else:
+                    errors[file_path] = error
+        return results, errors
+
+    # ----------------- Header extraction -----------------
+    @staticmethod
+    def raw_exif(file_path):
+        """
+        Return a file's EXIF for parse_exif, or None if it has none: the raw
+        TIFF block for JPEG and other formats, the already split IFDs for TIFF
+        (so the mapped file can be closed on return).
+        """
+        with open(file_path, "rb") as f:
+            magic = f.read(4)
+            if magic[:2] == JPEG_SOI:
+                f.seek(2)
+                return jpeg_exif_block(f)
+            if magic in TIFF_MAGIC:
+                # The IFDs can sit anywhere in a TIFF; map it so only the pages they are on are read
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return _tiff_exif(data)
+        return _pil_exif_block(file_path)
 
+    @staticmethod
+    def raw_exif_from_bytes(data):
+        """raw_exif for a file already read into memory."""
+        if data[:2] == JPEG_SOI:
+            f = io.BytesIO(data)
+            f.seek(2)
+            return jpeg_exif_block(f)
+        if data[:4] in TIFF_MAGIC:
+            return _tiff_exif(data)
+        return _pil_exif_block(io.BytesIO(data))
+
+    # ----------------- Parsing -----------------
+    @staticmethod
+    def parse_exif(raw_exif, tags=None) -> dict:
+        """
+        Parse a raw EXIF block (as returned by raw_exif, or PIL's
+        img.info["exif"]) into a tag_name -> value dict. Lets callers that
+        already have the bytes skip reading the file again.
+        :param tags: tag names to keep; None keeps all
+        """
+        exif_data = {}
+        if not raw_exif:
+            return exif_data
+        if isinstance(raw_exif, dict):  # already split into IFDs by _tiff_exif
+            exif_dict = raw_exif
+        else:
             exif_dict = piexif.load(raw_exif)
+        if tags is not None:
+            tags = frozenset(tags)
 
-            for ifd_name, ifd in exif_dict.items():
-                if not isinstance(ifd, dict):
+        for ifd_name, ifd in exif_dict.items():
+            if not isinstance(ifd, dict):
+                continue
+            names = TAG_NAMES.get(ifd_name, {})
+            for tag, value in ifd.items():
+                tag_name = names.get(tag) or str(tag)
+                if tag_name in SKIPPED_TAGS or (tags is not None and tag_name not in tags):
                     continue
-                for tag, value in ifd.items():
-                    tag_info = piexif.TAGS.get(ifd_name, {}).get(tag, {"name": str(tag)})
-                    tag_name = tag_info["name"]
-                    exif_data[tag_name] = ExifReader._normalize_value(value)
-
-        except Exception as e:
-            print(f"Failed to read EXIF from {file_path}: {e}")
+                exif_data[tag_name] = ExifReader._normalize_value(value)
 
         return exif_data
 
@@ -47,3 +152,54 @@ class ExifReader:
         if isinstance(value, list):
             return [ExifReader._normalize_value(v) for v in value]
         return value
+
+
+def jpeg_exif_block(f):
+    """
+    Walk the JPEG markers of f (positioned just after SOI), seeking over every
+    segment, and return the TIFF block of the Exif APP1 segment, or None.
+    Stops at the start of the image data.
+    """
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            raise ValueError("Corrupt JPEG: expected a marker")
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in (SOS, EOI):
+            return None
+        if marker in STANDALONE_MARKERS:
+            continue
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack(">H", header)[0] - 2
+        if length < 0:
+            raise ValueError("Corrupt JPEG: bad segment length")
+        if marker == APP1:
+            segment = f.read(length)
+            if segment.startswith(EXIF_HEADER):
+                if len(segment) < length:
+                    raise ValueError("Corrupt JPEG: truncated Exif segment")
+                return segment[len(EXIF_HEADER):]
+        else:
+            f.seek(length, io.SEEK_CUR)
+
+
+def _tiff_exif(data):
+    """Split a TIFF file's IFDs with piexif, reading only the bytes they occupy."""
+    exif_dict = piexif.load(data)
+    exif_dict.pop("thumbnail", None)
+    return exif_dict
+
+
+def _pil_exif_block(source):
+    """Other formats (e.g. PNG): PIL parses the header only, pixels stay undecoded."""
+    with Image.open(source) as img:
+        return img.info.get("exif")
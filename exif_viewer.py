@@ -11,11 +11,11 @@ class ExifViewer(BaseSidebarViewer):
         tree.column("tag", width=150, anchor="w")
         tree.column("value", width=250, anchor="w")
 
-    def update_content(self, photo_id):
+    def update_content(self, photo_id, details=None):
         self.clear_tree()
         if not photo_id:
             return
-        exif = self.db.get_exif(photo_id)
+        exif = self.get_details(photo_id, details).get("exif")
         if not exif:
             return
         for key, value in exif.items():
@@ -1,71 +1,90 @@
 # filmstrip_viewer.py
 import tkinter as tk
 from base_viewer import BaseThumbnailViewer
-
-HIGHLIGHT_BORDER = 3
+from thumbnail_cache import FILMSTRIP_THUMB_SIZE
 
 class FilmstripViewer(BaseThumbnailViewer):
-    """Horizontal scrolling strip of thumbnails."""
+    """
+    Horizontal scrolling strip of thumbnails.
+    Virtualized like PhotoViewer: only thumbnails in and near view are materialized.
+    """
 
     def __init__(self, parent, photo_viewer, exif_viewer=None, score_viewer=None, duplicates_viewer=None, **kwargs):
-        super().__init__(parent, thumb_size=80, padding=5, **kwargs)
+        super().__init__(parent, thumb_size=FILMSTRIP_THUMB_SIZE, padding=5, **kwargs)
         self.photo_viewer = photo_viewer
         self.exif_viewer = exif_viewer
         self.score_viewer = score_viewer
         self.duplicates_viewer = duplicates_viewer
 
-        self.canvas = tk.Canvas(self, height=self.thumb_size + 2*self.padding, bg="#1a1a1a", highlightthickness=0)
-        self.scrollbar = tk.Scrollbar(self, orient="horizontal", command=self.canvas.xview)
-        self.canvas.configure(xscrollcommand=self.scrollbar.set)
+        canvas = tk.Canvas(self, height=self.strip_height, bg="#1a1a1a", highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self, orient="horizontal", command=canvas.xview)
+        canvas.configure(xscrollcommand=self._on_xscroll, xscrollincrement=self.cell_size)
 
         self.scrollbar.pack(side="bottom", fill="x")
-        self.canvas.pack(side="top", fill="x", expand=True)
-
-        self.inner_frame = tk.Frame(self.canvas, bg="#1a1a1a")
-        self.window_id = self.canvas.create_window((0, 0), window=self.inner_frame, anchor="nw")
-        self.inner_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        canvas.pack(side="top", fill="x", expand=True)
+        self.setup_canvas(canvas)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_render())
 
         self.refresh_thumbs()
 
+    @property
+    def cell_size(self):
+        return self.thumb_size + 2 * self.padding
+
+    @property
+    def strip_height(self):
+        return self.thumb_size + 2 * self.padding
+
     def refresh_thumbs(self):
-        self.clear_thumbnails()
-        for lbl in self.photo_viewer.labels:
-            img_path = getattr(lbl, "photo_path", None)
-            photo_id = getattr(lbl, "photo_id", None)
-            if not img_path or not photo_id:
-                continue
-            tk_img = self.load_thumbnail(img_path)
-            if not tk_img:
-                continue
-            self.thumbs.append(tk_img)
-            thumb_lbl = tk.Label(
-                self.inner_frame, image=tk_img, bg="#1a1a1a", cursor="hand2", bd=0, relief="solid"
-            )
-            thumb_lbl.image = tk_img
-            thumb_lbl.photo_id = photo_id
-            thumb_lbl.bind("<Button-1>", lambda e, pid=photo_id: self.on_thumb_click(pid))
-            thumb_lbl.pack(side="left", padx=self.padding, pady=self.padding)
-            self.labels.append(thumb_lbl)
+        self.set_photos(self.photo_viewer.photos)
         self.update_highlight()
 
+    # ----------------- Layout -----------------
+    def cell_origin(self, idx):
+        return idx * self.cell_size, 0
+
+    def viewport_range(self):
+        left = self.canvas.canvasx(0)
+        width = self.canvas.winfo_width()
+        first = max(0, int(left // self.cell_size))
+        last = int((left + width) // self.cell_size) + 1
+        return first, min(len(self.photos), last)
+
+    def index_at(self, x, y):
+        idx = int(x // self.cell_size)
+        return idx if 0 <= x and idx < len(self.photos) else None
+
+    def update_scrollregion(self):
+        self.canvas.configure(scrollregion=(0, 0, len(self.photos) * self.cell_size, self.strip_height))
+
+    # ----------------- Scrolling -----------------
+    def _on_xscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_render()
+
+    def scroll_by(self, units):
+        self.canvas.xview_scroll(units, "units")
+
+    # ----------------- Selection -----------------
     def update_highlight(self, selected_photo_id=None):
         if selected_photo_id:
             self.selected_id = selected_photo_id
-        for lbl in self.labels:
-            if lbl.photo_id == self.selected_id:
-                lbl.config(bd=HIGHLIGHT_BORDER, relief="solid", highlightbackground="yellow")
-                self._scroll_to_label(lbl)
-            else:
-                lbl.config(bd=0, relief="flat", highlightbackground=lbl["bg"])
+        self._place_highlight()
+        idx = self.index_of(self.selected_id)
+        if idx is not None:
+            self._scroll_to_index(idx)
+
+    def on_photo_click(self, photo_id):
+        self.on_thumb_click(photo_id)
 
     def on_thumb_click(self, photo_id):
         self.select_photo(photo_id)
         if hasattr(self.photo_viewer, "_on_photo_click"):
             self.photo_viewer._on_photo_click(photo_id)
 
-    def _scroll_to_label(self, lbl):
+    def _scroll_to_index(self, idx):
         canvas_width = self.canvas.winfo_width()
-        lbl_x = lbl.winfo_x() + lbl.winfo_width() // 2
-        scroll_x = max(0, lbl_x - canvas_width // 2)
-        total_width = self.canvas.bbox("all")[2]
+        center_x = idx * self.cell_size + self.cell_size // 2
+        scroll_x = max(0, center_x - canvas_width // 2)
+        total_width = len(self.photos) * self.cell_size
         self.canvas.xview_moveto(scroll_x / max(1, total_width))
@@ -0,0 +1,47 @@
+# fingerprint.py
+import hashlib
+import os
+
+SAMPLE_BYTES = 64 * 1024  # bytes hashed from each end of a file
+
+
+def content_hash(file_path, file_size=None):
+    """
+    Fast content hash: blake2b over the file size plus the first and last
+    SAMPLE_BYTES. Reads at most 128 KB however large the file is, which is
+    enough to tell photos apart and to recognize a file that was moved or
+    renamed (its size and both ends stay the same).
+    """
+    if file_size is None:
+        file_size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(str(file_size).encode(), digest_size=16)
+    with open(file_path, "rb") as f:
+        digest.update(f.read(SAMPLE_BYTES))
+        if file_size > 2 * SAMPLE_BYTES:
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(SAMPLE_BYTES))
+        elif file_size > SAMPLE_BYTES:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path, stat=None):
+    """
+    Return {'file_size', 'file_mtime_ns', 'content_hash'} for a file.
+    :param stat: os.stat_result if the caller already has one (e.g. from a directory scan)
+    """
+    stat = stat or os.stat(file_path)
+    return {
+        "file_size": stat.st_size,
+        "file_mtime_ns": stat.st_mtime_ns,
+        "content_hash": content_hash(file_path, stat.st_size),
+    }
+
+
+def is_unchanged(stored, file_size, file_mtime_ns):
+    """True if a stored photo row still matches the file's size and mtime."""
+    return (
+        stored is not None
+        and stored.get("file_size") == file_size
+        and stored.get("file_mtime_ns") == file_mtime_ns
+    )
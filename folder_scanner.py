@@ -0,0 +1,63 @@
+# folder_scanner.py
+import os
+from fnmatch import fnmatch
+from typing import NamedTuple
+
+# Names skipped during a scan: hidden files/folders and OS/NAS metadata
+DEFAULT_IGNORE = (".*", "@eaDir", "__MACOSX", "$RECYCLE.BIN", "System Volume Information", "Thumbs.db")
+
+
+class ScannedFile(NamedTuple):
+    path: str
+    stat: os.stat_result
+
+    @property
+    def size(self):
+        return self.stat.st_size
+
+    @property
+    def mtime_ns(self):
+        return self.stat.st_mtime_ns
+
+    def __str__(self):
+        return self.path
+
+
+def scan_folder(root, extensions=None, ignore=DEFAULT_IGNORE, recursive=True, follow_symlinks=False):
+    """
+    Walk root with os.scandir and yield a ScannedFile per matching file as it
+    is found, so an import can start before a large tree is fully listed.
+    Directories are visited depth-first, each one's entries in name order.
+    Unreadable directories are reported and skipped.
+    :param extensions: lowercase suffixes to keep (e.g. (".jpg", ".tif")); None keeps every file
+    :param ignore: fnmatch patterns; matching files and directories are skipped
+    :param recursive: descend into subdirectories
+    :param follow_symlinks: follow symlinked directories (off by default to avoid cycles)
+    """
+    stack = [os.path.abspath(root)]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Cannot scan {folder}: {e}")
+            continue
+
+        subfolders = []
+        for entry in entries:
+            if any(fnmatch(entry.name, pattern) for pattern in ignore):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if recursive:
+                        subfolders.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                if extensions is not None and os.path.splitext(entry.name)[1].lower() not in extensions:
+                    continue
+                yield ScannedFile(entry.path, entry.stat())
+            except OSError as e:
+                print(f"Cannot read {entry.path}: {e}")
+        stack.extend(reversed(subfolders))
@@ -1,6 +1,8 @@
 # gui.py
 import tkinter as tk
 from tkinter import messagebox
+from background_job import BackgroundJob
+from db import duplicate_scope
 
 MIN_COLLAPSED = 30
 MAX_WIDTH = 500
@@ -8,7 +10,11 @@ DEFAULT_WIDTH = 220
 GRIP_WIDTH = 6
 
 class Sidebar(tk.Frame):
-    """Reusable sidebar with toggle, resize grip, import button, and find duplicates."""
+    """
+    Reusable sidebar with toggle, resize grip, import button, and find duplicates.
+    Long-running actions run as a BackgroundJob (see start_job): their progress
+    is shown in progress_label and they can be cancelled.
+    """
 
     def __init__(self, master, side="left", width=DEFAULT_WIDTH, db=None,
                  photo_viewer=None, import_command=None, **kwargs):
@@ -40,6 +46,7 @@ class Sidebar(tk.Frame):
         # Store db and photo viewer references
         self.db = db
         self.photo_viewer = photo_viewer
+        self.job = None
 
         # --- Import Button ---
         if import_command:
@@ -53,6 +60,9 @@ class Sidebar(tk.Frame):
             self.dup_btn = tk.Button(self, text="Find Duplicates", command=self.find_duplicates)
             self.dup_btn.pack(padx=10, pady=10, anchor="n")
 
+        # --- Cancel Button (shown while a job runs) ---
+        self.cancel_btn = tk.Button(self, text="Cancel", command=self.cancel_job)
+
 
     # ----------------- Toggle -----------------
     def toggle(self):
@@ -72,26 +82,109 @@ class Sidebar(tk.Frame):
         self.width = max(MIN_COLLAPSED, min(MAX_WIDTH, self._start_width + delta))
         self.master.update_layout()
 
-    # ----------------- Find Duplicates -----------------
-    def find_duplicates(self):
-        try:
-            if hasattr(self.master.importer, "duplicates"):
-                duplicates_detector = self.master.importer.duplicates
+    # ----------------- Background jobs -----------------
+    def start_job(self, title, target, on_progress=None, on_done=None):
+        """
+        Run target(job) as a BackgroundJob, showing its progress under the
+        buttons and a Cancel button. Only one job runs at a time.
+        :param on_progress: also called (on the Tk thread) with every progress event
+        :param on_done: called with target's result; errors are shown in a message box
+        :return: the job, or None if another job is still running
+        """
+        if self.job is not None and self.job.running:
+            messagebox.showwarning("Busy", "Please wait for the current task to finish or cancel it.")
+            return None
+
+        def progress(event):
+            self.show_progress(title, event)
+            if on_progress:
+                on_progress(event)
+
+        def done(result):
+            self._finish_job()
+            if on_done:
+                on_done(result)
+
+        def error(e):
+            self._finish_job()
+            messagebox.showerror("Error", f"{title} failed: {e}")
+
+        self._set_progress_text(f"{title}...")
+        self._set_busy(True)
+        self.job = BackgroundJob(self, target, on_progress=progress, on_done=done, on_error=error).start()
+        return self.job
+
+    def cancel_job(self):
+        if self.job is not None and self.job.running:
+            self.job.cancel()
+            self.cancel_btn.config(state="disabled")
+            self._set_progress_text("Cancelling...")
+
+    def show_progress(self, title, event):
+        """Show a progress event as e.g. 'Importing 120/800 (2 failed) - 14.2/s - ETA 0:56'."""
+        done = f"{event['done']}/{event['total']}" if event["total"] is not None else str(event["done"])
+        text = f"{title} {done}"
+        if event["failed"]:
+            text += f" ({event['failed']} failed)"
+        text += f" - {event['per_sec']:.1f}/s"
+        if event["eta"] is not None:
+            minutes, seconds = divmod(int(event["eta"]), 60)
+            text += f" - ETA {minutes}:{seconds:02d}"
+        self._set_progress_text(text)
+
+    def _finish_job(self):
+        self._set_busy(False)
+        self._set_progress_text("Cancelled" if self.job.cancelled else "")
+
+    def _set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        for button in (getattr(self, "import_btn", None), getattr(self, "dup_btn", None)):
+            if button is not None:
+                button.config(state=state)
+        if busy:
+            self.cancel_btn.config(state="normal")
+            self.cancel_btn.pack(padx=10, pady=5, anchor="n")
+        else:
+            self.cancel_btn.pack_forget()
 
-                # --- TODO:  TEMP: process all photos in DB ---
-                photo_list = self.db.get_all_photos()  # list of dicts with 'id' and 'file_path'
-                duplicates_detector.find_duplicates_batch(photo_list)
+    def _set_progress_text(self, text):
+        if hasattr(self, "progress_label"):
+            self.progress_label.config(text=text)
 
-                messagebox.showinfo(
-                    "Duplicates Found",
-                    "Near-duplicate detection complete (TEMP: all photos)."
-                )
+    # ----------------- Find Duplicates -----------------
+    def find_duplicates(self):
+        if not hasattr(self.master.importer, "duplicates"):
+            messagebox.showwarning("Not Available", "Duplicate detection is not configured.")
+            return
+        duplicates_detector = self.master.importer.duplicates
 
-                # Refresh photo viewer to mark duplicates visually
-                self.photo_viewer.refresh_photos(None)  # None -> refresh all
+        # The collection on screen, or each collection in turn when every photo is shown
+        collection_id = self.photo_viewer.collection_id
 
+        def run(job):
+            if collection_id is not None:
+                collection_ids = [collection_id]
             else:
-                messagebox.showwarning("Not Available", "Duplicate detection is not configured.")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error finding duplicates: {e}")
+                collection_ids = [collection["id"] for collection in self.db.get_collections()]
+            total = 0
+            for cid in collection_ids:
+                groups = duplicates_detector.find_duplicates_batch(
+                    self.db.get_photos(cid), duplicate_scope(cid),
+                    progress=job.report, cancel_event=job.cancel_event
+                )
+                if groups is None:
+                    return None
+                total += groups
+            return total
+
+        def done(groups):
+            if groups is None:
+                return  # cancelled: the groups not yet replaced are untouched
+            messagebox.showinfo(
+                "Duplicates Found",
+                f"Near-duplicate detection complete: {groups} group(s) found."
+            )
+            # Refresh photo viewer to mark duplicates visually
+            self.photo_viewer.refresh_photos(collection_id)
+
+        self.start_job("Finding duplicates", run, on_done=done)
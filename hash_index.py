@@ -0,0 +1,169 @@
+# hash_index.py
+from collections import defaultdict
+import numpy as np
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+KERNEL_MEMORY_BUDGET = 64 * 1024 * 1024  # bytes of temporaries per distance block
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def chunk_layout(max_distance, bits=HASH_BITS):
+    """Split bits into max_distance + 1 near-equal chunks; returns (shift, mask) per chunk."""
+    n_chunks = min(bits, max_distance + 1)
+    chunks = []
+    shift = 0
+    for i in range(n_chunks):
+        width = bits // n_chunks + (1 if i < bits % n_chunks else 0)
+        chunks.append((shift, (1 << width) - 1))
+        shift += width
+    return chunks
+
+
+class HammingIndex:
+    """
+    Multi-index hashing over 64-bit perceptual hashes.
+    The hash is split into max_distance + 1 disjoint bit chunks, each with its
+    own exact-match table. By the pigeonhole principle two hashes within
+    max_distance bits agree exactly on at least one chunk, so a query only
+    verifies the few candidates sharing a chunk value instead of scanning
+    every stored hash.
+    """
+
+    def __init__(self, max_distance, bits=HASH_BITS):
+        self.max_distance = max_distance
+        self.bits = bits
+        self._chunks = chunk_layout(max_distance, bits)
+        self._tables = [defaultdict(set) for _ in self._chunks]
+        self._hashes = {}  # item_id -> hash
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, item_id):
+        return item_id in self._hashes
+
+    def _keys(self, h):
+        return [(h >> shift) & mask for shift, mask in self._chunks]
+
+    def add(self, item_id, h):
+        h &= HASH_MASK  # accept hashes as stored (signed BIGINT)
+        if item_id in self._hashes:
+            self.remove(item_id)
+        self._hashes[item_id] = h
+        for table, key in zip(self._tables, self._keys(h)):
+            table[key].add(item_id)
+
+    def remove(self, item_id):
+        h = self._hashes.pop(item_id, None)
+        if h is None:
+            return
+        for table, key in zip(self._tables, self._keys(h)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del table[key]
+
+    def query(self, h, exclude=None):
+        """Return [(item_id, distance)] for stored hashes within max_distance of h."""
+        h &= HASH_MASK
+        candidates = set()
+        for table, key in zip(self._tables, self._keys(h)):
+            bucket = table.get(key)
+            if bucket:
+                candidates |= bucket
+        candidates.discard(exclude)
+        matches = []
+        for item_id in candidates:
+            distance = hamming(h, self._hashes[item_id])
+            if distance <= self.max_distance:
+                matches.append((item_id, distance))
+        return matches
+
+
+# ----------------- Batch clustering kernel -----------------
+if hasattr(np, "bitwise_count"):
+    def _popcount(x):
+        return np.bitwise_count(x)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x):
+        return _POPCOUNT_TABLE[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _as_uint64(hashes):
+    """Hashes as a uint64 array; signed values (as stored in a BIGINT column) keep their bits."""
+    try:
+        return np.asarray(hashes, dtype=np.uint64)
+    except OverflowError:
+        return np.array([int(h) & HASH_MASK for h in hashes], dtype=np.uint64)
+
+
+def hamming_clusters(hashes, max_distance, memory_budget=KERNEL_MEMORY_BUDGET):
+    """
+    Cluster 64-bit hashes into connected components of the graph linking
+    hashes at most max_distance bits apart. Returns one label per hash, with
+    -1 for hashes that have no neighbour; this is what DBSCAN(metric="hamming",
+    eps=max_distance / 64, min_samples=2) computes, since every point with a
+    neighbour is a core point there.
+
+    Candidate pairs are found multi-index style: hashes are bucketed by each
+    of max_distance + 1 bit chunks, and only hashes sharing a bucket are
+    compared, with a vectorized XOR + popcount over blocks sized to stay
+    within memory_budget bytes. Groups are built with union-find.
+    """
+    hashes = _as_uint64(hashes)
+    if hashes.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Identical hashes are trivially connected; cluster the distinct values only
+    unique, inverse, counts = np.unique(hashes, return_inverse=True, return_counts=True)
+    n = len(unique)
+    uf = UnionFind(n)
+    block = max(1, int((memory_budget / 10) ** 0.5))  # uint64 xor + uint8 popcount + bool mask
+
+    for shift, mask in chunk_layout(max_distance):
+        keys = (unique >> np.uint64(shift)) & np.uint64(mask)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], n]
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            members = order[start:end]
+            for a in range(0, len(members), block):
+                rows = members[a:a + block]
+                for b in range(a, len(members), block):
+                    cols = members[b:b + block]
+                    close = _popcount(unique[rows][:, None] ^ unique[cols][None, :]) <= max_distance
+                    if a == b:
+                        close = np.triu(close, k=1)
+                    for i, j in zip(*np.nonzero(close)):
+                        uf.union(int(rows[i]), int(cols[j]))
+
+    roots = np.fromiter((uf.find(i) for i in range(n)), dtype=np.int64, count=n)
+    sizes = np.bincount(roots, weights=counts, minlength=n)
+    _, labels = np.unique(roots, return_inverse=True)
+    labels = np.where(sizes[roots] > 1, labels, -1)
+    return labels[inverse.ravel()]
@@ -0,0 +1,298 @@
+# image_decoder.py
+import io
+import math
+import mmap
+import struct
+from pathlib import Path
+from typing import NamedTuple
+from PIL import Image, ImageStat
+from exif_reader import jpeg_exif_block, JPEG_SOI, TIFF_MAGIC, STANDALONE_MARKERS, SOS, EOI
+
+# TIFF-based RAW containers; only their embedded JPEG previews are decoded
+RAW_EXTENSIONS = (".dng", ".cr2", ".nef", ".arw", ".pef")
+
+SOURCE_EXIF_THUMBNAIL = "exif_thumbnail"  # JPEG thumbnail stored in the EXIF block (~160 px)
+SOURCE_PREVIEW = "embedded_preview"       # JPEG preview embedded in a RAW file
+SOURCE_REDUCED = "reduced"                # JPEG decoded at 1/2, 1/4 or 1/8 scale (DCT scaling)
+SOURCE_FULL = "full"                      # full decode
+
+ASPECT_TOLERANCE = 0.01  # thumbnails within 1% of the image's aspect ratio are used as they are
+BAR_MAX_MEAN = 24        # letterbox bars around EXIF thumbnails are near black...
+BAR_MAX_STDDEV = 8       # ...and flat
+MAX_IFDS = 32            # bound on the IFDs visited in a (possibly corrupt) TIFF
+
+# TIFF tags
+COMPRESSION = 0x0103
+STRIP_OFFSETS = 0x0111
+ORIENTATION = 0x0112
+STRIP_BYTE_COUNTS = 0x0117
+SUB_IFDS = 0x014A
+JPEG_OFFSET = 0x0201
+JPEG_LENGTH = 0x0202
+JPEG_COMPRESSIONS = (6, 7)  # old-style and new-style JPEG
+IFD_VALUE_SIZES = {3: 2, 4: 4, 13: 4}  # SHORT, LONG, IFD; the only types needed here
+IFD_VALUE_FORMATS = {3: "H", 4: "I", 13: "I"}
+# Baseline, extended and progressive Huffman frames; lossless (raw) frames are not viewable
+VIEWABLE_SOF = (0xC0, 0xC1, 0xC2)
+OTHER_SOF = tuple(m for m in range(0xC3, 0xD0) if m not in (0xC4, 0xC8, 0xCC))
+
+# EXIF orientation -> transposes that display the image upright (as in ImageOps.exif_transpose)
+ORIENTATION_TRANSPOSES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)  # EXIF orientations that swap width and height
+
+
+class Decoded(NamedTuple):
+    image: Image.Image  # RGB, upright
+    source: str         # one of the SOURCE_* constants
+    original_size: tuple  # (width, height) of the full image, upright; for RAW, of its largest preview
+
+
+def is_raw(file_path):
+    return Path(file_path).suffix.lower() in RAW_EXTENSIONS
+
+
+def decode_image(file_path, min_edge=None, data=None):
+    """
+    Decode an image from the cheapest source whose long edge is at least
+    min_edge pixels, trying in order:
+      - the EXIF thumbnail of a JPEG (letterbox bars cropped off),
+      - for RAW files, the smallest embedded JPEG preview that is large enough
+        (or the largest one),
+      - a JPEG decoded at reduced scale in the DCT domain (PIL draft mode),
+      - a full decode.
+    The image is not scaled further; callers resize it to what they need.
+    :param min_edge: smallest acceptable long edge; None asks for the full image
+    :param data: file contents, if the caller already read them
+    :return: Decoded(image, source, original_size)
+    """
+    if is_raw(file_path):
+        if data is not None:
+            return _decode_raw(data, min_edge)
+        with open(file_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return _decode_raw(buf, min_edge)
+
+    source = io.BytesIO(data) if data is not None else str(file_path)
+    with Image.open(source) as img:
+        if img.format == "JPEG" and min_edge:
+            decoded = _decode_exif_thumbnail(_jpeg_exif(data, file_path), img.size, min_edge)
+            if decoded is not None:
+                return decoded
+        return _decode_pil(img, min_edge)
+
+
+def load_thumbnail(file_path, size, data=None):
+    """Return an upright PIL RGB thumbnail fitting size x size, from the cheapest source."""
+    img = decode_image(file_path, size, data).image
+    img.thumbnail((size, size))
+    return img
+
+
+# ----------------- Sources -----------------
+def _decode_pil(img, min_edge):
+    """Reduced-scale decode for JPEG (draft mode), full decode for everything else."""
+    orientation = img.getexif().get(ORIENTATION)
+    original_size = _upright_size(img.size, orientation)
+    full_size = img.size
+    if min_edge:
+        img.draft("RGB", _draft_box(img.size, min_edge))
+    source = SOURCE_REDUCED if img.size != full_size else SOURCE_FULL
+    return Decoded(_upright(img.convert("RGB"), orientation), source, original_size)
+
+
+def _decode_exif_thumbnail(exif_block, image_size, min_edge):
+    """Use a JPEG's EXIF thumbnail if, once any letterbox bars are cropped, it is large enough."""
+    if not exif_block or exif_block[:4] not in TIFF_MAGIC:
+        return None
+    ifds = list(_tiff_ifds(exif_block))
+    if len(ifds) < 2:  # the thumbnail lives in IFD1
+        return None
+    orientation = _first(ifds[0].get(ORIENTATION))
+    stream = _jpeg_stream(exif_block, ifds[1])
+    if stream is None:
+        return None
+    start, end, size = stream
+    if max(size) < min_edge:
+        return None
+    try:
+        thumb = Image.open(io.BytesIO(bytes(exif_block[start:end])))
+        thumb = _crop_bars(thumb.convert("RGB"), image_size[0] / image_size[1])
+    except (OSError, ValueError):
+        return None
+    if thumb is None or max(thumb.size) < min_edge:
+        return None
+    return Decoded(_upright(thumb, orientation), SOURCE_EXIF_THUMBNAIL, _upright_size(image_size, orientation))
+
+
+def _decode_raw(buf, min_edge):
+    """Decode the embedded JPEG preview of a TIFF-based RAW file."""
+    if buf[:4] not in TIFF_MAGIC:
+        raise ValueError("Not a TIFF-based RAW file")
+    ifds = list(_tiff_ifds(buf))
+    orientation = _first(ifds[0].get(ORIENTATION)) if ifds else None
+    previews = sorted(
+        (stream for stream in (_jpeg_stream(buf, ifd) for ifd in ifds) if stream is not None),
+        key=lambda stream: stream[2][0] * stream[2][1],
+    )
+    if not previews:
+        raise ValueError("No embedded JPEG preview")
+    largest = previews[-1]
+    chosen = next((p for p in previews if min_edge and max(p[2]) >= min_edge), largest)
+    start, end, _ = chosen
+    img = Image.open(io.BytesIO(bytes(buf[start:end])))
+    if min_edge:
+        img.draft("RGB", _draft_box(img.size, min_edge))
+    img = _upright(img.convert("RGB"), orientation)
+    return Decoded(img, SOURCE_PREVIEW, _upright_size(largest[2], orientation))
+
+
+# ----------------- Helpers -----------------
+def _jpeg_exif(data, file_path):
+    """The EXIF (TIFF) block of a JPEG, found with bounded header reads."""
+    if data is not None:
+        f = io.BytesIO(data)
+        f.seek(2)
+        return jpeg_exif_block(f)
+    with open(file_path, "rb") as f:
+        f.seek(2)
+        return jpeg_exif_block(f)
+
+
+def _draft_box(size, min_edge):
+    """Requested draft size keeping the aspect ratio, so the long edge stays >= min_edge."""
+    scale = min(1.0, min_edge / max(size))
+    return max(1, math.ceil(size[0] * scale)), max(1, math.ceil(size[1] * scale))
+
+
+def _upright(img, orientation):
+    transpose = ORIENTATION_TRANSPOSES.get(orientation)
+    return img.transpose(transpose) if transpose is not None else img
+
+
+def _upright_size(size, orientation):
+    return (size[1], size[0]) if orientation in TRANSPOSED_ORIENTATIONS else tuple(size)
+
+
+def _first(values):
+    return values[0] if values else None
+
+
+def _crop_bars(thumb, aspect):
+    """
+    Cameras pad EXIF thumbnails to 160x120 whatever the sensor's aspect ratio.
+    Crop such bars off; return None if the excess is not flat black bars
+    (the thumbnail was cropped or stretched instead, so it cannot be used).
+    """
+    width, height = thumb.size
+    if abs(width / height - aspect) <= ASPECT_TOLERANCE * aspect:
+        return thumb
+    if width / height < aspect:
+        inner = round(width / aspect)
+        offset = (height - inner) // 2
+        box, bars = (0, offset, width, offset + inner), [(0, 0, width, offset), (0, offset + inner, width, height)]
+    else:
+        inner = round(height * aspect)
+        offset = (width - inner) // 2
+        box, bars = (offset, 0, offset + inner, height), [(0, 0, offset, height), (offset + inner, 0, width, height)]
+    for bar in bars:
+        if bar[2] <= bar[0] or bar[3] <= bar[1]:
+            continue
+        stat = ImageStat.Stat(thumb.crop(bar).convert("L"))
+        if stat.mean[0] > BAR_MAX_MEAN or stat.stddev[0] > BAR_MAX_STDDEV:
+            return None
+    return thumb.crop(box)
+
+
+# ----------------- TIFF structure -----------------
+def _tiff_ifds(buf):
+    """
+    Yield {tag: values} for every IFD of a TIFF buffer (bytes or mmap): the
+    IFD0 chain and any SubIFDs. Only SHORT/LONG/IFD values are decoded, which
+    is all that is needed to locate embedded JPEG streams.
+    """
+    endian = "<" if buf[:2] == b"II" else ">"
+    size = len(buf)
+    pending = [struct.unpack(endian + "I", buf[4:8])[0]]
+    seen = set()
+    while pending and len(seen) < MAX_IFDS:
+        offset = pending.pop(0)
+        if offset in seen or offset < 8 or offset + 2 > size:
+            continue
+        seen.add(offset)
+        count = struct.unpack(endian + "H", buf[offset:offset + 2])[0]
+        entries = {}
+        for i in range(count):
+            entry = offset + 2 + 12 * i
+            if entry + 12 > size:
+                break
+            tag, value_type, n = struct.unpack(endian + "HHI", buf[entry:entry + 8])
+            values = _ifd_values(buf, endian, value_type, n, entry + 8)
+            if values is not None:
+                entries[tag] = values
+        yield entries
+        next_at = offset + 2 + 12 * count
+        if next_at + 4 <= size:
+            next_offset = struct.unpack(endian + "I", buf[next_at:next_at + 4])[0]
+            if next_offset:
+                pending.append(next_offset)
+        pending.extend(entries.get(SUB_IFDS, ()))
+
+
+def _ifd_values(buf, endian, value_type, n, field):
+    item_size = IFD_VALUE_SIZES.get(value_type)
+    if item_size is None or not 0 < n <= 64:
+        return None
+    if n * item_size <= 4:
+        start = field
+    else:
+        start = struct.unpack(endian + "I", buf[field:field + 4])[0]
+    end = start + n * item_size
+    if end > len(buf):
+        return None
+    return struct.unpack(f"{endian}{n}{IFD_VALUE_FORMATS[value_type]}", buf[start:end])
+
+
+def _jpeg_stream(buf, ifd):
+    """(start, end, (width, height)) of a viewable JPEG stream referenced by an IFD, or None."""
+    if JPEG_OFFSET in ifd and JPEG_LENGTH in ifd:
+        start, length = ifd[JPEG_OFFSET][0], ifd[JPEG_LENGTH][0]
+    elif _first(ifd.get(COMPRESSION)) in JPEG_COMPRESSIONS and len(ifd.get(STRIP_OFFSETS, ())) == 1:
+        start, length = ifd[STRIP_OFFSETS][0], _first(ifd.get(STRIP_BYTE_COUNTS))
+    else:
+        return None
+    if not length or start + length > len(buf) or buf[start:start + 2] != JPEG_SOI:
+        return None
+    size = _jpeg_frame_size(buf, start, start + length)
+    return (start, start + length, size) if size else None
+
+
+def _jpeg_frame_size(buf, start, end):
+    """(width, height) from a JPEG stream's frame header, or None if it is not a viewable JPEG."""
+    pos = start + 2
+    while pos + 4 <= end:
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in STANDALONE_MARKERS:
+            pos += 2
+            continue
+        if marker in (SOS, EOI) or marker in OTHER_SOF:
+            return None
+        if marker in VIEWABLE_SOF:
+            if pos + 9 > end:
+                return None
+            height, width = struct.unpack(">HH", buf[pos + 5:pos + 9])
+            return (width, height) if width and height else None
+        pos += 2 + struct.unpack(">H", buf[pos + 2:pos + 4])[0]
+    return None
@@ -0,0 +1,120 @@
+# metadata_cache.py
+import os
+import threading
+from collections import OrderedDict
+from db import Database
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("AUTOCULL_METADATA_CACHE_SIZE", "2000"))
+
+
+class PhotoMetadataCache:
+    """
+    Bounded LRU cache of per-photo details (Database.get_photo_details) for
+    the sidebar viewers, so flipping between recently viewed photos does not
+    query the database again.
+    Has the same get_photo_details interface as Database. Misses for one call
+    are fetched together in one query, along with any prefetch IDs not cached
+    yet (e.g. the neighbours of the selected photo).
+    Entries are dropped when the database reports a change (Database.notify_changed,
+    called by imports, rescoring and duplicate detection). Safe to use from
+    several threads.
+    """
+
+    def __init__(self, db: Database, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db = db
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # photo_id -> details
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation; stale fetches are not stored
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.invalidations = 0
+        db.add_listener(self.invalidate)
+
+    # ----------------- Lookup -----------------
+    def get_photo_details(self, photo_ids, prefetch=()):
+        """
+        :param photo_ids: photos to return details for
+        :param prefetch: photos likely to be asked for next; fetched in the same
+            query as any misses, but not returned
+        :return: photo_id -> details, like Database.get_photo_details
+        """
+        result = {}
+        missing = []
+        with self._lock:
+            for photo_id in photo_ids:
+                details = self._entries.get(photo_id)
+                if details is not None:
+                    self._entries.move_to_end(photo_id)
+                    result[photo_id] = details
+                    self.hits += 1
+                else:
+                    missing.append(photo_id)
+                    self.misses += 1
+            if not missing:
+                return result
+            missing += [photo_id for photo_id in prefetch
+                        if photo_id not in self._entries and photo_id not in missing]
+            generation = self._generation
+
+        fetched = self.db.get_photo_details(missing)
+        with self._lock:
+            self.fetches += 1
+            if generation == self._generation:
+                for photo_id, details in fetched.items():
+                    self._store(photo_id, details)
+        result.update({photo_id: fetched[photo_id] for photo_id in photo_ids
+                       if photo_id not in result and photo_id in fetched})
+        return result
+
+    def get(self, photo_id):
+        """Details for one photo ({} if it does not exist)."""
+        return self.get_photo_details([photo_id]).get(photo_id, {})
+
+    def _store(self, photo_id, details):
+        self._entries[photo_id] = details
+        self._entries.move_to_end(photo_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ----------------- Invalidation -----------------
+    def invalidate(self, photo_ids=None, group_ids=None):
+        """
+        Drop cached details. Registered as a Database listener.
+        :param photo_ids: photos whose metadata changed; None (and no group_ids) drops everything
+        :param group_ids: near-duplicate groups that changed; every cached photo
+            listing one of them is dropped
+        """
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if photo_ids is None and group_ids is None:
+                self._entries.clear()
+                return
+            for photo_id in photo_ids or ():
+                self._entries.pop(photo_id, None)
+            if group_ids:
+                group_ids = set(group_ids)
+                stale = [
+                    photo_id for photo_id, details in self._entries.items()
+                    if any(group["group_id"] in group_ids for group in details.get("duplicate_groups", ()))
+                ]
+                for photo_id in stale:
+                    del self._entries[photo_id]
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
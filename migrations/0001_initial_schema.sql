@@ -0,0 +1,254 @@
+-- migrations/0001_initial_schema.sql
+-- Baseline schema. Idempotent, so it also brings databases created by the
+-- old schema.sql up to date.
+
+-- ----------------- Collections -----------------
+CREATE TABLE IF NOT EXISTS collections (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Folder a collection was imported from; importing the same folder again reuses it
+ALTER TABLE collections ADD COLUMN IF NOT EXISTS source_path TEXT;
+CREATE INDEX IF NOT EXISTS collections_source_path_idx ON collections (source_path);
+-- When source_path was last fully scanned (set by a completed folder import/rescan)
+ALTER TABLE collections ADD COLUMN IF NOT EXISTS last_scanned_at TIMESTAMP;
+
+-- ----------------- Photos -----------------
+CREATE TABLE IF NOT EXISTS photos (
+    id SERIAL PRIMARY KEY,
+    collection_id INT REFERENCES collections(id) ON DELETE CASCADE,
+    file_path TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    imported_at TIMESTAMP DEFAULT NOW(),
+    status TEXT DEFAULT 'undecided'
+);
+
+-- 64-bit perceptual hash computed at import (signed BIGINT)
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS phash BIGINT;
+
+-- File fingerprint: unchanged size + mtime means the file is skipped on re-import;
+-- content_hash (sampled, see fingerprint.py) recognizes moved/renamed files
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS file_size BIGINT;
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS file_mtime_ns BIGINT;
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE INDEX IF NOT EXISTS photos_collection_path_idx ON photos (collection_id, file_path);
+CREATE INDEX IF NOT EXISTS photos_collection_content_hash_idx ON photos (collection_id, content_hash);
+
+-- ----------------- Import Runs -----------------
+-- One row per import; a run left 'running' was interrupted and can be resumed.
+-- Every committed batch is a checkpoint: its photos carry fingerprints and are skipped on resume.
+CREATE TABLE IF NOT EXISTS import_runs (
+    id SERIAL PRIMARY KEY,
+    collection_id INT REFERENCES collections(id) ON DELETE CASCADE,
+    source_path TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    files_imported INT NOT NULL DEFAULT 0,
+    files_updated INT NOT NULL DEFAULT 0,
+    files_skipped INT NOT NULL DEFAULT 0,
+    files_failed INT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+
+-- ----------------- EXIF Data -----------------
+-- One JSONB document per photo; common fields are copied into typed, indexed
+-- columns by a trigger so they can be filtered and sorted directly
+CREATE TABLE IF NOT EXISTS photo_exif (
+    photo_id INT PRIMARY KEY REFERENCES photos(id) ON DELETE CASCADE,
+    tags JSONB NOT NULL DEFAULT '{}',
+    capture_time TIMESTAMP,
+    iso INT,
+    exposure_time REAL,  -- seconds
+    f_number REAL,
+    focal_length REAL,   -- mm
+    lens TEXT,
+    camera TEXT
+);
+
+CREATE INDEX IF NOT EXISTS photo_exif_tags_idx ON photo_exif USING GIN (tags jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS photo_exif_capture_time_idx ON photo_exif (capture_time);
+CREATE INDEX IF NOT EXISTS photo_exif_iso_idx ON photo_exif (iso);
+CREATE INDEX IF NOT EXISTS photo_exif_exposure_time_idx ON photo_exif (exposure_time);
+CREATE INDEX IF NOT EXISTS photo_exif_f_number_idx ON photo_exif (f_number);
+CREATE INDEX IF NOT EXISTS photo_exif_focal_length_idx ON photo_exif (focal_length);
+CREATE INDEX IF NOT EXISTS photo_exif_lens_idx ON photo_exif (lens);
+CREATE INDEX IF NOT EXISTS photo_exif_camera_idx ON photo_exif (camera);
+
+-- First number in a tag value: JSON number, first array element, or a number inside a string like '(100, 0)'
+CREATE OR REPLACE FUNCTION exif_number(value JSONB) RETURNS DOUBLE PRECISION AS $$
+BEGIN
+    IF value IS NULL THEN
+        RETURN NULL;
+    ELSIF jsonb_typeof(value) = 'number' THEN
+        RETURN value::TEXT::DOUBLE PRECISION;
+    ELSIF jsonb_typeof(value) = 'array' THEN
+        RETURN exif_number(value->0);
+    ELSIF jsonb_typeof(value) = 'string' THEN
+        RETURN substring(value #>> '{}' FROM '[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?')::DOUBLE PRECISION;
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END $$ LANGUAGE plpgsql IMMUTABLE;
+
+-- EXIF 'YYYY:MM:DD HH:MM:SS'; NULL for blank or invalid dates such as '0000:00:00 00:00:00'
+CREATE OR REPLACE FUNCTION exif_timestamp(value TEXT) RETURNS TIMESTAMP AS $$
+DECLARE
+    parts TEXT[] := regexp_match(value, '^(\d{4}):(\d{2}):(\d{2})[ T](\d{2}):(\d{2}):(\d{2})');
+BEGIN
+    IF parts IS NULL THEN
+        RETURN NULL;
+    END IF;
+    -- make_timestamp rejects year/month/day 0, unlike to_timestamp
+    RETURN make_timestamp(parts[1]::INT, parts[2]::INT, parts[3]::INT,
+                          parts[4]::INT, parts[5]::INT, parts[6]::DOUBLE PRECISION);
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END $$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION photo_exif_fill_columns() RETURNS TRIGGER AS $$
+DECLARE
+    make TEXT := NULLIF(trim(NEW.tags->>'Make'), '');
+    model TEXT := NULLIF(trim(NEW.tags->>'Model'), '');
+BEGIN
+    NEW.capture_time := exif_timestamp(COALESCE(
+        NEW.tags->>'DateTimeOriginal', NEW.tags->>'DateTimeDigitized', NEW.tags->>'DateTime'));
+    NEW.iso := round(exif_number(NEW.tags->'ISOSpeedRatings'));
+    NEW.exposure_time := exif_number(NEW.tags->'ExposureTime');
+    NEW.f_number := exif_number(NEW.tags->'FNumber');
+    NEW.focal_length := exif_number(NEW.tags->'FocalLength');
+    NEW.lens := NULLIF(trim(NEW.tags->>'LensModel'), '');
+    NEW.camera := CASE
+        WHEN model IS NULL THEN make
+        WHEN make IS NULL OR position(lower(make) IN lower(model)) = 1 THEN model
+        ELSE make || ' ' || model
+    END;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS photo_exif_fill_columns ON photo_exif;
+CREATE TRIGGER photo_exif_fill_columns BEFORE INSERT OR UPDATE OF tags ON photo_exif
+    FOR EACH ROW EXECUTE FUNCTION photo_exif_fill_columns();
+
+-- One-time move of the old one-row-per-tag exif_data table into photo_exif
+-- (values stay the strings they were stored as); the old rows are kept in exif_data_legacy.
+DO $$
+BEGIN
+    IF to_regclass('exif_data') IS NOT NULL AND to_regclass('exif_data_legacy') IS NULL THEN
+        INSERT INTO photo_exif (photo_id, tags)
+        SELECT photo_id, jsonb_object_agg(tag_name, tag_value)
+        FROM exif_data
+        WHERE photo_id IS NOT NULL
+        GROUP BY photo_id
+        ON CONFLICT DO NOTHING;
+        ALTER TABLE exif_data RENAME TO exif_data_legacy;
+    END IF;
+END $$;
+
+-- ----------------- Scores -----------------
+-- One row per photo and scorer version, one typed column per metric (see db.SCORE_METRICS)
+CREATE TABLE IF NOT EXISTS photo_scores (
+    photo_id INT NOT NULL REFERENCES photos(id) ON DELETE CASCADE,
+    scorer_version TEXT NOT NULL,
+    working_edge INT,  -- long edge (px) the pixel metrics were computed at; size metrics use the original
+    laplacian_var DOUBLE PRECISION,
+    sobel_energy DOUBLE PRECISION,
+    noise REAL,
+    brightness_mean REAL,
+    brightness_median REAL,
+    saturation_mean REAL,
+    saturation_std REAL,
+    contrast_std REAL,
+    contrast_range REAL,
+    colorfulness REAL,
+    entropy REAL,
+    width INT,
+    height INT,
+    aspect_ratio REAL,
+    scored_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (photo_id, scorer_version)
+);
+
+-- Sort/filter indexes: ranking a collection by a metric is an index scan
+CREATE INDEX IF NOT EXISTS photo_scores_laplacian_var_idx ON photo_scores (scorer_version, laplacian_var);
+CREATE INDEX IF NOT EXISTS photo_scores_sobel_energy_idx ON photo_scores (scorer_version, sobel_energy);
+CREATE INDEX IF NOT EXISTS photo_scores_noise_idx ON photo_scores (scorer_version, noise);
+CREATE INDEX IF NOT EXISTS photo_scores_brightness_mean_idx ON photo_scores (scorer_version, brightness_mean);
+CREATE INDEX IF NOT EXISTS photo_scores_brightness_median_idx ON photo_scores (scorer_version, brightness_median);
+CREATE INDEX IF NOT EXISTS photo_scores_saturation_mean_idx ON photo_scores (scorer_version, saturation_mean);
+CREATE INDEX IF NOT EXISTS photo_scores_saturation_std_idx ON photo_scores (scorer_version, saturation_std);
+CREATE INDEX IF NOT EXISTS photo_scores_contrast_std_idx ON photo_scores (scorer_version, contrast_std);
+CREATE INDEX IF NOT EXISTS photo_scores_contrast_range_idx ON photo_scores (scorer_version, contrast_range);
+CREATE INDEX IF NOT EXISTS photo_scores_colorfulness_idx ON photo_scores (scorer_version, colorfulness);
+CREATE INDEX IF NOT EXISTS photo_scores_entropy_idx ON photo_scores (scorer_version, entropy);
+
+-- One-time pivot of the old one-row-per-metric scores table into photo_scores
+-- (as scorer version '1'); the old rows are kept in scores_legacy.
+DO $$
+BEGIN
+    IF to_regclass('scores') IS NOT NULL AND to_regclass('scores_legacy') IS NULL THEN
+        ALTER TABLE scores ADD COLUMN IF NOT EXISTS resolution INT;
+        INSERT INTO photo_scores (
+            photo_id, scorer_version, working_edge,
+            laplacian_var, sobel_energy, noise, brightness_mean, brightness_median,
+            saturation_mean, saturation_std, contrast_std, contrast_range,
+            colorfulness, entropy, width, height, aspect_ratio
+        )
+        SELECT photo_id, '1',
+               max(resolution) FILTER (WHERE type NOT IN ('width', 'height', 'aspect_ratio')),
+               max(value) FILTER (WHERE type = 'laplacian_var'),
+               max(value) FILTER (WHERE type = 'sobel_energy'),
+               max(value) FILTER (WHERE type = 'noise'),
+               max(value) FILTER (WHERE type = 'brightness_mean'),
+               max(value) FILTER (WHERE type = 'brightness_median'),
+               max(value) FILTER (WHERE type = 'saturation_mean'),
+               max(value) FILTER (WHERE type = 'saturation_std'),
+               max(value) FILTER (WHERE type = 'contrast_std'),
+               max(value) FILTER (WHERE type = 'contrast_range'),
+               max(value) FILTER (WHERE type = 'colorfulness'),
+               max(value) FILTER (WHERE type = 'entropy'),
+               max(value) FILTER (WHERE type = 'width')::INT,
+               max(value) FILTER (WHERE type = 'height')::INT,
+               max(value) FILTER (WHERE type = 'aspect_ratio')
+        FROM scores
+        WHERE photo_id IS NOT NULL
+        GROUP BY photo_id
+        ON CONFLICT DO NOTHING;
+        ALTER TABLE scores RENAME TO scores_legacy;
+    END IF;
+END $$;
+
+-- ----------------- Styles -----------------
+CREATE TABLE IF NOT EXISTS styles (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE,
+    description TEXT
+);
+
+-- Many-to-many: photo_styles
+CREATE TABLE IF NOT EXISTS photo_styles (
+    photo_id INT REFERENCES photos(id) ON DELETE CASCADE,
+    style_id INT REFERENCES styles(id) ON DELETE CASCADE,
+    PRIMARY KEY(photo_id, style_id)
+);
+
+-- ----------------- Near Duplicate Groups -----------------
+CREATE TABLE IF NOT EXISTS near_duplicate_groups (
+    id SERIAL PRIMARY KEY,
+    method TEXT,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Photos a detection run covered ('all' or e.g. 'collection:3'); a rerun replaces its (method, scope)
+ALTER TABLE near_duplicate_groups ADD COLUMN IF NOT EXISTS scope TEXT NOT NULL DEFAULT 'all';
+CREATE INDEX IF NOT EXISTS near_duplicate_groups_method_scope_idx ON near_duplicate_groups (method, scope);
+
+-- Many-to-many: near_duplicate_photos
+CREATE TABLE IF NOT EXISTS near_duplicate_photos (
+    group_id INT REFERENCES near_duplicate_groups(id) ON DELETE CASCADE,
+    photo_id INT REFERENCES photos(id) ON DELETE CASCADE,
+    PRIMARY KEY(group_id, photo_id)
+);
@@ -0,0 +1,15 @@
+-- migrations/0002_foreign_key_indexes.sql
+-- Indexes for foreign keys on hot lookup paths. Columns already leading a
+-- primary key or index are covered (photos.collection_id by
+-- photos_collection_path_idx, photo_exif/photo_scores/photo_styles by
+-- photo_id, near_duplicate_photos by group_id).
+
+-- Duplicate viewer: groups a photo belongs to
+CREATE INDEX IF NOT EXISTS near_duplicate_photos_photo_id_idx ON near_duplicate_photos (photo_id);
+
+-- Deleting a style, photos by style
+CREATE INDEX IF NOT EXISTS photo_styles_style_id_idx ON photo_styles (style_id);
+
+-- Deleting a collection, resumable imports by status
+CREATE INDEX IF NOT EXISTS import_runs_collection_id_idx ON import_runs (collection_id);
+CREATE INDEX IF NOT EXISTS import_runs_status_idx ON import_runs (status);
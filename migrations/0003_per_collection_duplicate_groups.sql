@@ -0,0 +1,7 @@
+-- migrations/0003_per_collection_duplicate_groups.sql
+-- Near-duplicate groups are now kept per collection (scope 'collection:<id>'),
+-- by both incremental and batch detection. Groups in the old library-wide
+-- 'all' scope paired files with their copies in other collections and
+-- overlapped the per-collection groups; drop them. Rerunning duplicate
+-- detection rebuilds them per collection.
+DELETE FROM near_duplicate_groups WHERE scope = 'all';
@@ -0,0 +1,4 @@
+-- migrations/0004_import_run_relinked_count.sql
+-- Moved files that are relinked by content hash are never decoded, so they
+-- are counted apart from the re-analyzed files in files_updated.
+ALTER TABLE import_runs ADD COLUMN IF NOT EXISTS files_relinked INT NOT NULL DEFAULT 0;
@@ -0,0 +1,4 @@
+-- migrations/0005_drop_collections_last_scanned_at.sql
+-- collections.last_scanned_at was written after every folder import but never
+-- read: rescans decide what to re-analyze from each file's fingerprint.
+ALTER TABLE collections DROP COLUMN IF EXISTS last_scanned_at;
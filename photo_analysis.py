@@ -0,0 +1,152 @@
+# photo_analysis.py
+import io
+import cv2
+import imagehash
+import numpy as np
+from PIL import Image
+from exif_reader import ExifReader
+from image_decoder import ORIENTATION, TRANSPOSED_ORIENTATIONS, decode_image, is_raw
+
+# libjpeg can decode at 1/2, 1/4 or 1/8 scale for a fraction of the cost of a full decode
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+class PhotoAnalysis:
+    """
+    Per-file analysis context.
+    Reads the file once and decodes the pixels at most once, then shares the
+    BGR buffer and the derived grayscale/HSV planes with every consumer
+    (EXIF, scoring, perceptual hashing, thumbnails). Everything is computed
+    lazily, so a consumer only pays for what it uses.
+
+    With max_edge set, the pixel buffers are at a working resolution: the
+    long edge is reduced to max_edge, using libjpeg's reduced-size decode
+    where it applies. original_size still reports the full dimensions.
+    RAW files are analyzed through their embedded JPEG preview, so for them
+    original_size is the size of the largest preview.
+    """
+
+    def __init__(self, file_path, max_edge=None):
+        """
+        :param max_edge: long edge of the working resolution in pixels; None decodes at full size
+        """
+        self.file_path = str(file_path)
+        self.max_edge = max_edge
+        with open(self.file_path, "rb") as f:
+            self.data = f.read()
+        self._original_size = None
+        self._bgr = None
+        self._gray = None
+        self._hsv = None
+        self._exif = None
+        self._phash = None
+
+    # ----------------- Pixel buffers -----------------
+    @property
+    def original_size(self):
+        """(width, height) of the full-resolution image, after EXIF orientation."""
+        if self._original_size is None:
+            if is_raw(self.file_path):
+                self.bgr  # measured while picking the preview
+            elif self._bgr is not None and self.max_edge is None:
+                self._original_size = (self._bgr.shape[1], self._bgr.shape[0])
+            else:
+                try:
+                    # Header only: PIL does not decode pixels until asked to
+                    img = Image.open(io.BytesIO(self.data))
+                    width, height = img.size
+                    if img.getexif().get(ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+                        width, height = height, width
+                    self._original_size = (width, height)
+                except Exception:
+                    self.max_edge = None  # unknown size: decode fully and measure
+                    self._original_size = (self.bgr.shape[1], self.bgr.shape[0])
+        return self._original_size
+
+    @property
+    def working_edge(self):
+        """Long edge, in pixels, of the buffers the pixel metrics are computed on."""
+        return max(self.bgr.shape[:2])
+
+    @property
+    def bgr(self):
+        """Decoded image as an OpenCV BGR uint8 array, at the working resolution."""
+        if self._bgr is None and is_raw(self.file_path):
+            decoded = decode_image(self.file_path, self.max_edge, data=self.data)
+            self._original_size = decoded.original_size
+            self._bgr = self._fit(cv2.cvtColor(np.asarray(decoded.image), cv2.COLOR_RGB2BGR))
+        if self._bgr is None:
+            flag = cv2.IMREAD_COLOR
+            if self.max_edge:
+                long_edge = max(self.original_size)
+                for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+                    if long_edge // factor >= self.max_edge:
+                        flag = reduced_flag
+                        break
+            img = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), flag)
+            if img is None:
+                raise ValueError(f"Cannot read image: {self.file_path}")
+            self._bgr = self._fit(img)
+        return self._bgr
+
+    def _fit(self, img):
+        """Scale img down so its long edge is at most max_edge."""
+        h, w = img.shape[:2]
+        if self.max_edge and max(w, h) > self.max_edge:
+            scale = self.max_edge / max(w, h)
+            img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                             interpolation=cv2.INTER_AREA)
+        return img
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def hsv(self):
+        if self._hsv is None:
+            self._hsv = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV)
+        return self._hsv
+
+    # ----------------- Derived data -----------------
+    @property
+    def exif(self) -> dict:
+        """EXIF tags; only the header is parsed, the pixel data is not touched."""
+        if self._exif is None:
+            try:
+                self._exif = ExifReader.parse_exif(ExifReader.raw_exif_from_bytes(self.data))
+            except Exception as e:
+                print(f"Failed to read EXIF from {self.file_path}: {e}")
+                self._exif = {}
+        return self._exif
+
+    @property
+    def phash(self) -> int:
+        """64-bit perceptual hash of the grayscale plane, packed into an int."""
+        if self._phash is None:
+            bits = imagehash.phash(Image.fromarray(self.gray)).hash.flatten()
+            self._phash = int("".join("1" if b else "0" for b in bits), 2)
+        return self._phash
+
+    def thumbnail(self, size):
+        """Return a PIL RGB thumbnail fitting in size x size, made from the shared buffer."""
+        img = self.bgr
+        h, w = img.shape[:2]
+        scale = min(1.0, size / max(w, h))
+        if scale < 1.0:
+            img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                             interpolation=cv2.INTER_AREA)
+        return Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+    def release(self):
+        """Drop the file bytes and pixel buffers, keeping the small derived results."""
+        self.data = None
+        self._bgr = None
+        self._gray = None
+        self._hsv = None
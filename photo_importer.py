@@ -1,66 +1,533 @@
 # photo_importer.py
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from db import Database
+from fingerprint import file_fingerprint, is_unchanged
+from folder_scanner import scan_folder, ScannedFile, DEFAULT_IGNORE
 from duplicates import NearDuplicateDetector
-from photo_scorer import PhotoScorer
-from exif_reader import ExifReader
+from photo_scorer import PhotoScorer, DEFAULT_WORKING_EDGE
+from photo_analysis import PhotoAnalysis
+from image_decoder import RAW_EXTENSIONS
+from background_job import progress_event
+from thumbnail_cache import ThumbnailCache, THUMB_SIZES
+
+
+def default_worker_count():
+    """Leave one core for the writer/UI."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+INTERRUPTED_STATUSES = ("running", "interrupted")  # import_runs statuses a resume can pick up
+
+_local = threading.local()
+
+
+def _scorer(max_edge):
+    """One PhotoScorer per thread/worker process and working resolution, so its kernel buffers are reused."""
+    scorers = getattr(_local, "scorers", None)
+    if scorers is None:
+        scorers = _local.scorers = {}
+    if max_edge not in scorers:
+        scorers[max_edge] = PhotoScorer(max_edge=max_edge)
+    return scorers[max_edge]
+
+
+def init_worker():
+    """
+    Pool worker setup: keep OpenCV single-threaded to avoid oversubscribing
+    cores, and ignore Ctrl-C, which the parent handles by cancelling cleanly.
+    """
+    import cv2
+    cv2.setNumThreads(1)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def analysis_pool(workers):
+    """
+    Process pool for _analyze_file and friends. Workers are spawned rather
+    than forked: a forked child would inherit the parent's libpq sockets
+    (keeping the import run's advisory lock alive if the parent dies) and a
+    copy of a process with UI and loader threads running.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def _analyze_file(file_path: str, thumb_sizes=THUMB_SIZES, max_edge=DEFAULT_WORKING_EDGE):
+    """
+    CPU-heavy part of an import: EXIF extraction, scoring, perceptual hashing
+    and thumbnails (encoded, ready for the cache). The file is decoded once
+    into a PhotoAnalysis shared by all of them, at a working resolution of
+    max_edge pixels on the long edge (None for full resolution).
+    May run in a worker process, so it must not touch the database.
+    Returns a dict with the results, or the error that stopped this file.
+    Scoring, hashing and thumbnails fail independently: whatever succeeded is
+    kept, and each failure is recorded in its own '*_error' field.
+    """
+    result = {
+        "file_path": file_path, "exif": {}, "scores": None, "working_edge": None,
+        "phash": None, "thumbnails": {}, "score_error": None, "hash_error": None,
+        "thumbnail_error": None, "error": None,
+    }
+    try:
+        file = Path(file_path)
+        if file.suffix.lower() not in PhotoImporter.SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {file.suffix}")
+        analysis = PhotoAnalysis(file, max_edge=max_edge)
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+
+    try:
+        result["exif"] = analysis.exif
+        try:
+            result["scores"] = _scorer(max_edge).score_analysis(analysis)
+            result["working_edge"] = analysis.working_edge
+        except Exception as e:
+            result["score_error"] = str(e)
+        try:
+            result["phash"] = analysis.phash
+        except Exception as e:
+            result["hash_error"] = str(e)
+        for size in thumb_sizes:
+            try:
+                result["thumbnails"][size] = ThumbnailCache.encode(analysis.thumbnail(size))
+            except Exception as e:
+                result["thumbnail_error"] = str(e)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        analysis.release()
+    return result
+
 
 class PhotoImporter:
-    SUPPORTED_EXTENSIONS = (".jpg", ".jpeg", ".tif", ".tiff")
+    SUPPORTED_EXTENSIONS = (".jpg", ".jpeg", ".tif", ".tiff") + RAW_EXTENSIONS
 
-    def __init__(self, db: Database, near_dup_threshold=5):
+    def __init__(self, db: Database, near_dup_threshold=5, workers=1, batch_size=64,
+                 thumbnail_cache=None, detect_duplicates=True, score_max_edge=DEFAULT_WORKING_EDGE):
+        """
+        :param db: Database instance (the only writer, always used from this process)
+        :param near_dup_threshold: maximum Hamming distance for near-duplicates
+        :param workers: number of processes used for EXIF/scoring; 1 imports serially
+        :param batch_size: photos written per database transaction
+        :param thumbnail_cache: where import-time thumbnails go (default: the shared cache)
+        :param detect_duplicates: match each written batch against existing near-duplicate groups
+        :param score_max_edge: working resolution (long edge) for scoring, hashing and
+            thumbnails; None analyzes at full resolution
+        """
         self.db = db
         self.duplicates = NearDuplicateDetector(db, threshold=near_dup_threshold)
-        self.scorer = PhotoScorer(db)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.thumbnail_cache = thumbnail_cache or ThumbnailCache.shared()
+        self.detect_duplicates = detect_duplicates
+        self.score_max_edge = score_max_edge
+        self.last_import_stats = None
 
-    def import_files(self, file_paths: list[str], collection_id: int, default_styles=None):
-        imported_count = 0
-        for file_path in file_paths:
-            try:
-                self._import_file(Path(file_path), collection_id, default_styles)
-                imported_count += 1
-            except Exception as e:
-                print(f"Skipping {file_path}: {e}")
-        print(f"Imported {imported_count} photos")
-        return imported_count
+    def import_files(self, file_paths, collection_id: int, default_styles=None, workers=None,
+                     source_path=None, progress=None, cancel_event=None):
+        """
+        Import files into a collection. Safe to repeat: files already in the
+        collection with the same size and mtime are skipped, changed files are
+        re-analyzed in place and moved/renamed files are relinked by content hash.
+        The import is recorded in import_runs; every committed batch is a
+        checkpoint, so rerunning an interrupted import only does the remaining work.
+        :param source_path: folder being imported, recorded so the run can be resumed
+        :param progress: called with a progress_event after every committed batch, with
+            the 'imported', 'updated', 'relinked' and 'skipped' counts and the IDs of the photos
+            the batch added as 'photo_ids'; 'total' is known when file_paths is a list,
+            or once a streamed file_paths is exhausted
+        :param cancel_event: threading.Event; once set, no new files are started, the
+            ones in flight are written and the run is recorded as cancelled
+        :return: number of photos added or re-analyzed
+        """
+        workers = workers or self.workers or 1
+        start = time.perf_counter()
+        style_ids = list(self.db.get_or_create_styles(default_styles).values()) if default_styles else []
+        stats = {"imported": 0, "updated": 0, "relinked": 0, "skipped": 0, "failed": 0}
+        run_id = self.db.start_import_run(collection_id, source_path)
+        self.duplicates.reset()  # the hash index is reloaded once per run, so it reflects other writers
+        total = len(file_paths) if hasattr(file_paths, "__len__") else None
+
+        def counted(items):
+            """Pass a streamed scan through and set the total once it is exhausted."""
+            nonlocal total
+            found = 0
+            for found, item in enumerate(items, 1):
+                yield item
+            total = found
+
+        def report(photo_ids=()):
+            if progress is not None:
+                progress(progress_event(
+                    sum(stats.values()), total, stats["failed"], start,
+                    imported=stats["imported"], updated=stats["updated"], relinked=stats["relinked"],
+                    skipped=stats["skipped"],
+                    photo_ids=list(photo_ids),
+                ))
+
+        status = "interrupted"
+        try:
+            if total is None:
+                file_paths = counted(file_paths)
+            jobs = self._plan(file_paths, collection_id, stats, report, cancel_event)
+            if workers > 1:
+                results = self._analyze_parallel(jobs, workers)
+            else:
+                results = (
+                    {**_analyze_file(job["file_path"], max_edge=self.score_max_edge), **job} for job in jobs
+                )
+            self._write_results(results, collection_id, style_ids, stats, run_id, report)
+            status = "cancelled" if cancel_event is not None and cancel_event.is_set() else "completed"
+        finally:
+            self.db.update_import_run(run_id, stats, status=status)
+            self.db.unlock_import_run(run_id)
+
+        report()
+        self._report(stats, time.perf_counter() - start, workers, cancelled=status == "cancelled")
+        return stats["imported"] + stats["updated"]
 
-    def import_folder(self, folder_path: str, collection_id: int, default_styles=None):
+    def import_folder(self, folder_path: str, collection_id=None, default_styles=None, workers=None,
+                      recursive=True, ignore=DEFAULT_IGNORE, progress=None, cancel_event=None):
+        """
+        Import a folder tree. Files are streamed from the scanner into the
+        pipeline as they are found, so work starts before the walk finishes.
+        Progress events have no total (and no ETA) until the walk is done.
+        :param collection_id: target collection; by default the collection this
+            folder was imported into before (created on first import)
+        :param recursive: include subfolders
+        :param ignore: fnmatch patterns of file/folder names to skip
+        :param progress: see import_files
+        :param cancel_event: see import_files
+        """
         folder = Path(folder_path)
         if not folder.exists() or not folder.is_dir():
             raise ValueError(f"Folder {folder_path} does not exist or is not a directory")
-        files = [str(f) for f in folder.glob("*") if f.suffix.lower() in self.SUPPORTED_EXTENSIONS]
-        return self.import_files(files, collection_id, default_styles)
+        if collection_id is None:
+            collection_id = self.db.get_or_create_collection(folder.name or str(folder), str(folder))
+        files = scan_folder(folder, self.SUPPORTED_EXTENSIONS, ignore=ignore, recursive=recursive)
+        return self.import_files(files, collection_id, default_styles, workers,
+                                 source_path=os.path.abspath(folder), progress=progress,
+                                 cancel_event=cancel_event)
 
-    def _import_file(self, file: Path, collection_id: int, default_styles=None):
-        if file.suffix.lower() not in self.SUPPORTED_EXTENSIONS:
-            raise ValueError(f"Unsupported file type: {file.suffix}")
+    def rescan_collection(self, collection_id: int, default_styles=None, workers=None):
+        """
+        Incremental rescan of the folder a collection was imported from: only
+        files added or changed since the last scan are analyzed (unchanged
+        ones are matched on size and mtime from the directory scan).
+        """
+        collection = self.db.get_collection(collection_id)
+        if not collection or not collection["source_path"]:
+            raise ValueError(f"Collection {collection_id} was not imported from a folder")
+        return self.import_folder(collection["source_path"], collection_id, default_styles, workers)
 
-        # --- Extract EXIF using the dedicated reader ---
-        exif = ExifReader.read_exif(file)
+    def watch_collection(self, collection_id: int, interval=60.0, stop_event=None, **kwargs):
+        """
+        Rescan a collection's folder every interval seconds until stop_event
+        (a threading.Event) is set. Meant to run on a background thread.
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.rescan_collection(collection_id, **kwargs)
+            except Exception as e:
+                print(f"Rescan of collection {collection_id} failed: {e}")
+            stop_event.wait(interval)
 
-        photo_id = self.db.add_photo(
-            collection_id=collection_id,
-            file_path=str(file),
-            file_name=file.name
-        )
+    # ----------------- Resume -----------------
+    def get_interrupted_imports(self):
+        """
+        Folder imports that never completed (the process died or the import
+        raised). A run still 'running' in a live process, here or elsewhere,
+        holds its lock (see Database.start_import_run) and is left out.
+        """
+        runs = [
+            run for run in self.db.get_import_runs()
+            if run["status"] in INTERRUPTED_STATUSES and run["source_path"]
+        ]
+        live = self.db.live_import_runs(run["id"] for run in runs)
+        return [run for run in runs if run["id"] not in live]
+
+    def resume_import(self, run, default_styles=None, workers=None, progress=None, cancel_event=None):
+        """
+        Finish an interrupted folder import; files committed before the interruption are skipped.
+        Does nothing (returns 0) if the run turns out to be live, or already resumed or abandoned.
+        """
+        if not self._claim(run):
+            return 0
+        try:
+            self.db.update_import_run(run["id"], self._run_counts(run), status="resumed")
+        finally:
+            self.db.unlock_import_run(run["id"])
+        return self.import_folder(run["source_path"], run["collection_id"], default_styles, workers,
+                                  progress=progress, cancel_event=cancel_event)
+
+    def abandon_import(self, run):
+        """
+        Stop offering an interrupted import for resuming; what it committed stays.
+        :return: False if the run was live (or no longer interrupted) and was left alone
+        """
+        if not self._claim(run):
+            return False
+        try:
+            self.db.update_import_run(run["id"], self._run_counts(run), status="abandoned")
+        finally:
+            self.db.unlock_import_run(run["id"])
+        return True
+
+    def _claim(self, run):
+        """Lock an interrupted run so no other process can resume or abandon it at the same time."""
+        if not self.db.lock_import_run(run["id"]):
+            print(f"Import of {run['source_path']} is still running elsewhere; leaving it alone")
+            return False
+        current = self.db.get_import_run(run["id"])
+        if current is None or current["status"] not in INTERRUPTED_STATUSES:
+            self.db.unlock_import_run(run["id"])
+            return False
+        return True
+
+    @staticmethod
+    def _run_counts(run):
+        return {
+            "imported": run["files_imported"], "updated": run["files_updated"], "relinked": run["files_relinked"],
+            "skipped": run["files_skipped"], "failed": run["files_failed"],
+        }
+
+    # ----------------- Planning -----------------
+    def _plan(self, file_paths, collection_id: int, stats, report=None, cancel_event=None):
+        """
+        Compare each file with what the collection already holds and yield a
+        job for every file that needs analysis ('photo_id' is set when an
+        existing photo is re-analyzed). Unchanged files cost one stat call;
+        only new or modified files are content-hashed. file_paths may be
+        paths or ScannedFiles, whose stat from the directory scan is reused.
+        Stops early once cancel_event is set.
+        """
+        known = {row["file_path"]: row for row in self.db.get_photo_fingerprints(collection_id)}
+        by_hash = {}
+        for row in known.values():
+            if row["content_hash"]:
+                by_hash.setdefault(row["content_hash"], row)
+        relinks = []
+
+        for planned, item in enumerate(file_paths, 1):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if report is not None and planned % self.batch_size == 0:
+                report()  # keeps progress moving through long runs of unchanged files
+            file_path = str(item)
+            try:
+                stat = item.stat if isinstance(item, ScannedFile) else os.stat(file_path)
+                stored = known.get(file_path)
+                if is_unchanged(stored, stat.st_size, stat.st_mtime_ns):
+                    stats["skipped"] += 1
+                    continue
+                fingerprint = file_fingerprint(file_path, stat)
+            except OSError as e:
+                stats["failed"] += 1
+                print(f"Skipping {file_path}: {e}")
+                continue
+
+            # Same content under the same path (only the mtime changed): just record
+            # the fingerprint. A photo imported before fingerprints existed has no
+            # content hash to compare with, so it is re-analyzed once like a changed file.
+            if stored is not None and stored["content_hash"] == fingerprint["content_hash"]:
+                relinks.append({"id": stored["id"], "file_path": file_path, **fingerprint})
+                stats["skipped"] += 1
+            else:
+                moved = by_hash.get(fingerprint["content_hash"]) if stored is None else None
+                if moved is not None and moved["file_path"] != file_path and not os.path.exists(moved["file_path"]):
+                    relinks.append({"id": moved["id"], "file_path": file_path, **fingerprint})
+                    known.pop(moved["file_path"], None)
+                    known[file_path] = dict(moved, file_path=file_path, **fingerprint)
+                    stats["relinked"] += 1
+                    print(f"Relinked {moved['file_path']} -> {file_path}")
+                else:
+                    yield {"file_path": file_path, "photo_id": stored["id"] if stored else None, **fingerprint}
 
-        # Store EXIF in DB
-        for key, value in exif.items():
-            self.db.add_exif(photo_id, key, str(value))
+            if len(relinks) >= self.batch_size:
+                self._relink(relinks)
+        if relinks:
+            self._relink(relinks)
 
-        # Assign default styles
-        if default_styles:
-            for style_name in default_styles:
-                style_id = self.db.add_style(style_name)
-                if style_id:
-                    self.db.assign_style(photo_id, style_id)
+    def _relink(self, relinks):
+        """Store new paths/fingerprints for photos whose content is already analyzed."""
+        self.db.update_photos([
+            {**relink, "file_name": Path(relink["file_path"]).name, "phash": None} for relink in relinks
+        ])
+        self.db.notify_changed(photo_ids=[relink["id"] for relink in relinks])
+        relinks.clear()
 
-        # Score image
+    # ----------------- Parallel -----------------
+    def _analyze_parallel(self, jobs, workers):
+        """
+        Fan EXIF extraction and scoring out to a process pool and yield the
+        results (merged with their job) as they complete. A bounded number of
+        files is kept in flight so memory stays flat on very large imports.
+        """
+        max_in_flight = workers * 4
+        pending = set()
+        jobs = iter(jobs)
+
+        with analysis_pool(workers) as executor:
+            def submit_next():
+                job = next(jobs, None)
+                if job is None:
+                    return False
+                future = executor.submit(_analyze_file, job["file_path"], max_edge=self.score_max_edge)
+                future.job = job
+                pending.add(future)
+                return True
+
+            while len(pending) < max_in_flight and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    try:
+                        yield {**future.result(), **future.job}
+                    except Exception as e:  # e.g. a worker process died
+                        yield {**future.job, "error": str(e)}
+                    submit_next()
+
+    # ----------------- Writer -----------------
+    def _write_results(self, results, collection_id: int, style_ids, stats, run_id, report=None):
+        """
+        Single writer: consume _analyze_file results and write them in batches
+        of batch_size photos, one transaction per batch, updating stats and the
+        import run after each batch and reporting the photos it added.
+        """
+        batch = []
+
+        def flush():
+            written = self._write_batch(batch, collection_id, style_ids)
+            updated = sum(1 for result in written if result["photo_id"] is not None)
+            stats["imported"] += len(written) - updated
+            stats["updated"] += updated
+            stats["failed"] += len(batch) - len(written)
+            batch.clear()
+            self.db.update_import_run(run_id, stats)
+            if report is not None:
+                report([result["id"] for result in written if result["photo_id"] is None])
+
+        for result in results:
+            if result.get("error"):
+                stats["failed"] += 1
+                print(f"Skipping {result['file_path']}: {result['error']}")
+                continue
+            name = Path(result["file_path"]).name
+            if result["score_error"]:
+                print(f"Failed to score {name}: {result['score_error']}")
+            if result["hash_error"]:
+                print(f"Failed to hash {name}: {result['hash_error']}")
+            if result["thumbnail_error"]:
+                print(f"Failed to make thumbnails of {name}: {result['thumbnail_error']}")
+            batch.append(result)
+            if len(batch) >= self.batch_size:
+                flush()
+        if batch:
+            flush()
+
+    def _write_batch(self, results, collection_id: int, style_ids):
+        """
+        Write photos, EXIF, scores and styles for a batch in one transaction.
+        If the batch fails, retry file by file so one bad row only costs one photo.
+        Returns the results that were written.
+        """
         try:
-            scores = self.scorer.score_and_store(photo_id, str(file))
-            print(f"Scores for {file.name}: {scores}")
+            self._store_results(results, collection_id, style_ids)
+            return list(results)
         except Exception as e:
-            print(f"Failed to score {file.name}: {e}")
+            if len(results) == 1:
+                print(f"Skipping {results[0]['file_path']}: {e}")
+                return []
+        return [
+            written for result in results
+            for written in self._write_batch([result], collection_id, style_ids)
+        ]
 
-        print(f"Imported {file}")
-        return photo_id
+    @staticmethod
+    def _photo_row(result):
+        return {
+            "file_path": result["file_path"],
+            "file_name": Path(result["file_path"]).name,
+            "phash": result["phash"],
+            "file_size": result.get("file_size"),
+            "file_mtime_ns": result.get("file_mtime_ns"),
+            "content_hash": result.get("content_hash"),
+        }
+
+    def _store_results(self, results, collection_id: int, style_ids):
+        """
+        New files are inserted; changed files (result['photo_id'] set) keep
+        their photo row, status and styles but get fresh EXIF and scores.
+        Changed files also leave their near-duplicate groups and are matched
+        again like new ones. Sets result['id'] to each written photo's ID.
+        """
+        new = [result for result in results if result.get("photo_id") is None]
+        changed = [result for result in results if result.get("photo_id") is not None]
+        left_groups = []
+        with self.db.transaction():
+            new_ids = self.db.add_photos(collection_id, [self._photo_row(r) for r in new]) if new else []
+            if changed:
+                self.db.update_photos([{**self._photo_row(r), "id": r["photo_id"]} for r in changed])
+                left_groups = self.db.clear_photo_metadata([r["photo_id"] for r in changed])
+            new_ids_iter = iter(new_ids)
+            photo_ids = [
+                result["photo_id"] if result.get("photo_id") is not None else next(new_ids_iter)
+                for result in results
+            ]
+            self.db.add_exif_batch({
+                photo_id: result["exif"] for photo_id, result in zip(photo_ids, results)
+            })
+            scored = [(photo_id, result) for photo_id, result in zip(photo_ids, results)
+                      if result["scores"] is not None]
+            self.db.add_scores_batch(
+                {photo_id: result["scores"] for photo_id, result in scored},
+                {photo_id: result["working_edge"] for photo_id, result in scored},
+            )
+            if style_ids and new_ids:
+                self.db.assign_styles_batch(new_ids, style_ids)
+        self.db.notify_changed(photo_ids=photo_ids, group_ids=left_groups or None)
+        for photo_id, result in zip(photo_ids, results):
+            result["id"] = photo_id
+
+        for result in results:
+            for size, data in result["thumbnails"].items():
+                self.thumbnail_cache.put_bytes(result["file_path"], size, data)
+            print(f"Imported {result['file_path']}")
+
+        if self.detect_duplicates:
+            try:
+                self.duplicates.find_duplicates_incremental([
+                    {"id": photo_id, "file_path": result["file_path"], "phash": result["phash"]}
+                    for photo_id, result in zip(photo_ids, results) if result["phash"] is not None
+                ], collection_id)
+            except Exception as e:
+                print(f"Near-duplicate matching failed: {e}")
+        return photo_ids
+
+    def _report(self, stats, elapsed, workers, cancelled=False):
+        processed = stats["imported"] + stats["updated"]  # files decoded and analyzed; relinks are not
+        files_per_sec = processed / elapsed if elapsed > 0 else 0.0
+        self.last_import_stats = {
+            **stats,
+            "elapsed": elapsed,
+            "files_per_sec": files_per_sec,
+            "workers": workers,
+            "cancelled": cancelled,
+        }
+        print(
+            f"{'Cancelled after importing' if cancelled else 'Imported'} {stats['imported']} new and {stats['updated']} changed photos, "
+            f"relinked {stats['relinked']} moved, "
+            f"skipped {stats['skipped']} unchanged ({stats['failed']} failed) in {elapsed:.1f}s "
+            f"- {files_per_sec:.2f} files/s with {workers} worker(s)"
+        )
@@ -1,61 +1,128 @@
 # photo_scorer.py
 import cv2
 import numpy as np
-from skimage import filters
-from db import Database
+from db import Database, SCORE_METRICS, SIZE_SCORE_METRICS
+from photo_analysis import PhotoAnalysis
+
+ALL_METRICS = SCORE_METRICS
+SIZE_METRICS = SIZE_SCORE_METRICS  # always from the original dimensions
+DEFAULT_WORKING_EDGE = 1024  # long edge used by the importer's working-resolution mode
+
 
 class PhotoScorer:
     """
-    Comprehensive image scoring using OpenCV and skimage.
+    Comprehensive image scoring using OpenCV.
     Stores all computed metrics in the database if a DB instance is provided.
+    With max_edge set, pixel metrics are computed at a working resolution
+    (long edge <= max_edge) instead of the full sensor resolution; see the
+    README for how those values compare with full-resolution ones.
     """
-    def __init__(self, db: Database = None):
+    def __init__(self, db: Database = None, max_edge=None, metrics=None):
+        """
+        :param max_edge: long edge of the working resolution; None scores at full resolution
+        :param metrics: names from ALL_METRICS to compute; None computes all of them
+        """
         self.db = db
+        self.max_edge = max_edge
+        self._buffers = {}
+        self.metrics = tuple(metrics) if metrics else ALL_METRICS
+        unknown = set(self.metrics) - set(ALL_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
 
     def score_photo(self, file_path):
         """
         Compute a variety of metrics for the image.
         Returns a dictionary of metric_name -> value.
         """
-        img = cv2.imread(file_path)
-        if img is None:
-            raise ValueError(f"Cannot read image: {file_path}")
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-
-        scores = {
-            # ---------------- Sharpness / focus ----------------
-            "laplacian_var": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
-            "sobel_energy": float(np.sum(np.square(cv2.Sobel(gray, cv2.CV_64F,1,0))) +
-                                  np.sum(np.square(cv2.Sobel(gray, cv2.CV_64F,0,1)))),
-
-            # ---------------- Noise ----------------
-            "noise": float(np.mean(np.abs(gray - cv2.GaussianBlur(gray,(3,3),0)))),
+        return self.score_analysis(PhotoAnalysis(file_path, max_edge=self.max_edge))
 
-            # ---------------- Exposure / brightness ----------------
-            "brightness_mean": float(np.mean(gray)),
-            "brightness_median": float(np.median(gray)),
-            "saturation_mean": float(np.mean(hsv[:,:,1])),
-            "saturation_std": float(np.std(hsv[:,:,1])),
-
-            # ---------------- Contrast ----------------
-            "contrast_std": float(np.std(gray)),
-            "contrast_range": float(gray.max() - gray.min()),
-
-            # ---------------- Colorfulness ----------------
-            "colorfulness": self._colorfulness(img),
-
-            # ---------------- Entropy / texture ----------------
-            "entropy": float(self._entropy(gray)),
-
-            # ---------------- Size / aspect ----------------
-            "width": img.shape[1],
-            "height": img.shape[0],
-            "aspect_ratio": img.shape[1] / img.shape[0],
-        }
-
-        return scores
+    def score_analysis(self, analysis: PhotoAnalysis):
+        """
+        Same as score_photo, but works on an already opened PhotoAnalysis so the
+        decoded buffer and grayscale/HSV planes are shared with other consumers.
+        Pixel metrics use the analysis' working resolution.
+
+        Intermediates are shared between metrics and computed at most once:
+        one grayscale histogram gives brightness, contrast and entropy, one
+        saturation histogram gives its mean and std. Derivatives are integer
+        valued, so they go into one CV_16S buffer (exact, a quarter of CV_64F)
+        reduced with cv2.norm / cv2.meanStdDev. Working buffers are kept on
+        the scorer and reused for the next photo of the same size, so use one
+        PhotoScorer per thread.
+        """
+        wanted = set(self.metrics)
+        scores = {}
+        gray = analysis.gray if wanted - set(SIZE_METRICS) - {"colorfulness"} else None
+
+        # ---------------- Sharpness / focus ----------------
+        if "laplacian_var" in wanted:
+            laplacian = cv2.Laplacian(gray, cv2.CV_16S, dst=self._buffer("derivative", gray.shape, np.int16))
+            scores["laplacian_var"] = float(cv2.meanStdDev(laplacian)[1][0, 0] ** 2)
+        if "sobel_energy" in wanted:
+            derivative = self._buffer("derivative", gray.shape, np.int16)
+            energy = cv2.norm(cv2.Sobel(gray, cv2.CV_16S, 1, 0, dst=derivative), cv2.NORM_L2SQR)
+            energy += cv2.norm(cv2.Sobel(gray, cv2.CV_16S, 0, 1, dst=derivative), cv2.NORM_L2SQR)
+            scores["sobel_energy"] = energy * self._pixel_ratio(analysis)
+
+        # ---------------- Noise ----------------
+        if "noise" in wanted:
+            # gray - blur wraps around in uint8, as the metric always has
+            residual = cv2.GaussianBlur(gray, (3, 3), 0, dst=self._buffer("residual", gray.shape, np.uint8))
+            np.subtract(gray, residual, out=residual)
+            scores["noise"] = float(cv2.mean(residual)[0])
+
+        # ---------------- Exposure / brightness / contrast / entropy ----------------
+        if wanted & {"brightness_mean", "brightness_median", "contrast_std", "contrast_range", "entropy"}:
+            hist = self._histogram(gray, 256)
+            count, mean, std = self._histogram_stats(hist)
+            if "brightness_mean" in wanted:
+                scores["brightness_mean"] = mean
+            if "brightness_median" in wanted:
+                scores["brightness_median"] = self._histogram_median(hist, count)
+            if "contrast_std" in wanted:
+                scores["contrast_std"] = std
+            if "contrast_range" in wanted:
+                occupied = np.flatnonzero(hist)
+                scores["contrast_range"] = float(occupied[-1] - occupied[0])
+            if "entropy" in wanted:
+                scores["entropy"] = self._entropy(hist)
+
+        if wanted & {"saturation_mean", "saturation_std"}:
+            hist = self._histogram(analysis.hsv, 256, channel=1)
+            _, mean, std = self._histogram_stats(hist)
+            if "saturation_mean" in wanted:
+                scores["saturation_mean"] = mean
+            if "saturation_std" in wanted:
+                scores["saturation_std"] = std
+
+        # ---------------- Colorfulness ----------------
+        if "colorfulness" in wanted:
+            scores["colorfulness"] = self._colorfulness(analysis.bgr)
+
+        # ---------------- Size / aspect ----------------
+        width, height = analysis.original_size if wanted & set(SIZE_METRICS) else (0, 0)
+        if "width" in wanted:
+            scores["width"] = width
+        if "height" in wanted:
+            scores["height"] = height
+        if "aspect_ratio" in wanted:
+            scores["aspect_ratio"] = width / height
+
+        # Keep the caller's metric order
+        return {metric: scores[metric] for metric in self.metrics}
+
+    @staticmethod
+    def _pixel_ratio(analysis: PhotoAnalysis):
+        """
+        Full-resolution pixels per working pixel. sobel_energy is a sum over
+        all pixels, so it is scaled by this to stay on the full-resolution scale.
+        """
+        if analysis.max_edge is None:
+            return 1.0
+        width, height = analysis.original_size
+        h, w = analysis.bgr.shape[:2]
+        return (width * height) / (w * h)
 
     def score_and_store(self, photo_id, file_path):
         """
@@ -63,29 +130,79 @@ class PhotoScorer:
         """
         if self.db is None:
             raise ValueError("Database instance not provided.")
-        scores = self.score_photo(file_path)
-
-        # Save all metrics
-        for metric_name, value in scores.items():
-            self.db.add_score(photo_id, metric_name, float(value))
-
+        analysis = PhotoAnalysis(file_path, max_edge=self.max_edge)
+        scores = self.score_analysis(analysis)
+        self.store_scores(photo_id, scores, analysis.working_edge)
         return scores
 
+    def store_scores(self, photo_id, scores, working_edge=None):
+        """
+        Store already computed metrics, e.g. ones produced by an import worker process.
+        :param working_edge: long edge (px) the pixel metrics were computed at
+        """
+        if self.db is None:
+            raise ValueError("Database instance not provided.")
+        self.db.add_scores_batch({photo_id: scores}, {photo_id: working_edge})
+        self.db.notify_changed(photo_ids=[photo_id])
+
     # ---------------- Metric helpers ----------------
+    def _buffer(self, name, shape, dtype):
+        """Reusable working array; reallocated only when the image size changes."""
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+    @staticmethod
+    def _histogram(img, bins, channel=0):
+        """Counts of the integer values 0..bins-1 in one channel, as float64."""
+        return cv2.calcHist([img], [channel], None, [bins], [0, bins]).ravel().astype(np.float64)
+
+    @staticmethod
+    def _histogram_stats(hist):
+        """(count, mean, population std) of the values a histogram counts."""
+        values = np.arange(len(hist), dtype=np.float64)
+        count = hist.sum()
+        mean = hist @ values / count
+        variance = hist @ np.square(values - mean) / count
+        return count, float(mean), float(np.sqrt(variance))
+
+    @staticmethod
+    def _histogram_median(hist, count):
+        """Median as np.median computes it (mean of the two middle values for an even count)."""
+        cumulative = np.cumsum(hist)
+        lower = np.searchsorted(cumulative, (count - 1) // 2, side="right")
+        upper = np.searchsorted(cumulative, count // 2, side="right")
+        return float(lower + upper) / 2
+
     def _colorfulness(self, img):
         """
         Measures colorfulness using the Hasler & Süsstrunk method.
+        rg = |R - G| fits uint8 and 2 * yb = |R + G - 2B| fits int16, so both
+        are computed exactly in integer buffers and summarized by histogram.
         """
-        (B, G, R) = cv2.split(img.astype("float"))
-        rg = np.abs(R - G)
-        yb = np.abs(0.5 * (R + G) - B)
-        return float(np.sqrt(rg.mean()**2 + yb.mean()**2) + 0.3 * (rg.std() + yb.std()))
-
-    def _entropy(self, gray):
+        shape = img.shape[:2]
+        b, g, r = (
+            cv2.extractChannel(img, i, dst=self._buffer(f"channel{i}", shape, np.uint8)) for i in range(3)
+        )
+        rg = cv2.absdiff(r, g, dst=self._buffer("rg", shape, np.uint8))
+        yb2 = self._buffer("yb2", shape, np.int16)
+        np.add(r, g, out=yb2, dtype=np.int16)
+        np.subtract(yb2, b, out=yb2)
+        np.subtract(yb2, b, out=yb2)
+        np.abs(yb2, out=yb2)
+
+        _, rg_mean, rg_std = self._histogram_stats(self._histogram(rg, 256))
+        _, yb_mean, yb_std = self._histogram_stats(self._histogram(yb2.view(np.uint16), 511))
+        yb_mean, yb_std = yb_mean / 2, yb_std / 2
+        return float(np.sqrt(rg_mean**2 + yb_mean**2) + 0.3 * (rg_std + yb_std))
+
+    @staticmethod
+    def _entropy(hist):
         """
-        Computes Shannon entropy of a grayscale image.
+        Computes Shannon entropy from a grayscale histogram.
         """
-        hist = cv2.calcHist([gray], [0], None, [256], [0,256])
-        hist_norm = hist.ravel() / hist.sum()
+        hist_norm = hist / hist.sum()
         hist_norm = hist_norm[hist_norm > 0]
         return float(-np.sum(hist_norm * np.log2(hist_norm)))
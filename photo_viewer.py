@@ -1,77 +1,113 @@
 # photo_viewer.py
 import tkinter as tk
-from PIL import Image, ImageTk
 from base_viewer import BaseThumbnailViewer
+from thumbnail_cache import GRID_THUMB_SIZE
 
 class PhotoViewer(BaseThumbnailViewer):
-    """Main center grid of photos with scrolling + keyboard navigation."""
+    """
+    Main center grid of photos with scrolling + keyboard navigation.
+    Virtualized: only rows in and near the viewport hold canvas items and images.
+    """
 
     def __init__(self, parent, db, **kwargs):
-        super().__init__(parent, db=db, thumb_size=120, padding=10, **kwargs)
+        super().__init__(parent, db=db, thumb_size=GRID_THUMB_SIZE, padding=10, **kwargs)
         self.selected_idx = None
-        self.canvas = tk.Canvas(self, bg="#141414")
-        self.scrollbar_y = tk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
-        self.canvas.configure(yscrollcommand=self.scrollbar_y.set)
+        self.collection_id = None  # collection on screen; None shows every photo
+        canvas = tk.Canvas(self, bg="#141414", highlightthickness=0)
+        self.scrollbar_y = tk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        canvas.configure(yscrollcommand=self._on_yscroll, yscrollincrement=self.cell_size)
 
         self.scrollbar_y.pack(side="right", fill="y")
-        self.canvas.pack(side="left", fill="both", expand=True)
+        canvas.pack(side="left", fill="both", expand=True)
+        self.setup_canvas(canvas)
 
-        self.inner_frame = tk.Frame(self.canvas, bg="#141414")
-        self.window_id = self.canvas.create_window((0, 0), window=self.inner_frame, anchor="nw")
-
-        # Update scroll region
-        self.inner_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        # Reflow on resize; cost is proportional to the visible rows only
         self.canvas.bind("<Configure>", lambda e: self._reflow_grid())
 
-        self.thumb_size = 120
-        self.padding = 10
         self.columns = 1
         self.refresh_photos()
 
     def refresh_photos(self, collection_id=None):
-        self.clear_thumbnails()
-        self.photos = self.db.get_photos(collection_id)
-
-        for photo in self.photos:
-            tk_img = self.load_thumbnail(photo["file_path"])
-            if not tk_img:
-                continue
-            self.thumbs.append(tk_img)
-            lbl = tk.Label(
-                self.inner_frame, image=tk_img, bg="#141414", cursor="hand2",
-                bd=2, relief="flat", highlightthickness=0
-            )
-            lbl.image = tk_img
-            lbl.photo_id = photo["id"]
-            lbl.photo_path = photo["file_path"]
-            lbl.bind("<Button-1>", lambda e, pid=photo["id"]: self._on_photo_click(pid))
-            self.labels.append(lbl)
-
-        self._reflow_grid()
+        self.selected_idx = None
+        self.collection_id = collection_id
+        self.set_photos(self.db.get_photos(collection_id))
 
-    def _on_photo_click(self, photo_id):
-        idx = next((i for i, lbl in enumerate(self.labels) if lbl.photo_id == photo_id), None)
-        if idx is not None:
-            self._select_idx(idx)
-        self.select_photo(photo_id)
+    # ----------------- Layout -----------------
+    def cell_origin(self, idx):
+        row, col = divmod(idx, self.columns)
+        return col * self.cell_size, row * self.cell_size
 
-    def _select_idx(self, idx):
-        if self.selected_idx is not None and 0 <= self.selected_idx < len(self.labels):
-            self.labels[self.selected_idx].config(highlightthickness=0)
-        self.selected_idx = idx
-        self.labels[idx].config(highlightthickness=3)
+    @property
+    def line_length(self):
+        return self.columns
+
+    def viewport_range(self):
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        first_row = max(0, int(top // self.cell_size))
+        last_row = int((top + height) // self.cell_size) + 1
+        return first_row * self.columns, min(len(self.photos), last_row * self.columns)
+
+    def index_at(self, x, y):
+        col, row = int(x // self.cell_size), int(y // self.cell_size)
+        if x < 0 or y < 0 or col >= self.columns:
+            return None
+        idx = row * self.columns + col
+        return idx if idx < len(self.photos) else None
+
+    def update_scrollregion(self):
+        rows = -(-len(self.photos) // self.columns)
+        width = self.canvas.winfo_width()
+        self.canvas.configure(scrollregion=(0, 0, width, rows * self.cell_size))
 
     def _reflow_grid(self):
-        if not self.labels:
-            return
         width = self.canvas.winfo_width()
         if width < 50:
             self.after(50, self._reflow_grid)
             return
-        self.columns = max(1, width // (self.thumb_size + self.padding))
-        for lbl in self.labels:
-            lbl.grid_forget()
-        for idx, lbl in enumerate(self.labels):
-            row, col = divmod(idx, self.columns)
-            lbl.grid(row=row, column=col, padx=5, pady=5, sticky="nw")
-        self.canvas.itemconfig(self.window_id, width=width)
+        columns = max(1, width // self.cell_size)
+        if columns != self.columns:
+            self.columns = columns
+            self.relayout()
+        else:
+            self.update_scrollregion()
+            self.schedule_render()
+
+    # ----------------- Scrolling -----------------
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar_y.set(first, last)
+        self.schedule_render()
+
+    def scroll_by(self, units):
+        self.canvas.yview_scroll(units, "units")
+
+    def see(self, idx):
+        """Scroll just enough to bring cell idx into view."""
+        rows = -(-len(self.photos) // self.columns)
+        if not rows:
+            return
+        row = idx // self.columns
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        y = row * self.cell_size
+        if y < top:
+            self.canvas.yview_moveto(y / (rows * self.cell_size))
+        elif y + self.cell_size > top + height:
+            self.canvas.yview_moveto((y + self.cell_size - height) / (rows * self.cell_size))
+
+    # ----------------- Selection -----------------
+    def on_photo_click(self, photo_id):
+        self._on_photo_click(photo_id)
+
+    def _on_photo_click(self, photo_id):
+        idx = self.index_of(photo_id)
+        if idx is not None:
+            self._select_idx(idx)
+        self.select_photo(photo_id)
+
+    def _select_idx(self, idx):
+        self.selected_idx = idx
+        self.see(idx)
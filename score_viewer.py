@@ -11,11 +11,11 @@ class ScoreViewer(BaseSidebarViewer):
         tree.column("metric", width=150, anchor="w")
         tree.column("value", width=150, anchor="w")
 
-    def update_content(self, photo_id):
+    def update_content(self, photo_id, details=None):
         self.clear_tree()
         if not photo_id:
             return
-        scores = self.db.get_scores(photo_id)
+        scores = self.get_details(photo_id, details).get("scores")
         if not scores:
             return
         for score in scores:
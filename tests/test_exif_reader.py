@@ -0,0 +1,136 @@
+# tests/test_exif_reader.py
+"""Header-only EXIF extraction: the JPEG marker walk and the memory-mapped TIFF path, on small synthetic files."""
+import io
+import struct
+
+import piexif
+import pytest
+from PIL import Image
+
+from exif_reader import ExifReader, jpeg_exif_block
+
+EXIF = piexif.dump({
+    "0th": {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"EOS R5"},
+    "Exif": {piexif.ExifIFD.ISOSpeedRatings: 400},
+})
+XMP = b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta xmlns:x='adobe:ns:meta/'/>"
+
+
+def segment(marker, payload):
+    return b"\xff" + bytes([marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+
+def jpeg_body():
+    """A plain JPEG's markers and image data, without its SOI."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 12), "red").save(buffer, format="JPEG")
+    return buffer.getvalue()[2:]
+
+
+def jpeg(*segments):
+    return b"\xff\xd8" + b"".join(segments) + jpeg_body()
+
+
+def tiff_with_exif():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 6), "red").save(buffer, format="TIFF", exif=EXIF)
+    return bytearray(buffer.getvalue())
+
+
+def ifd_entries(data, offset):
+    """(entry offset, tag) of every entry in the little-endian IFD at offset."""
+    count = struct.unpack("<H", data[offset:offset + 2])[0]
+    return [(offset + 2 + 12 * i, struct.unpack("<H", data[offset + 2 + 12 * i:offset + 4 + 12 * i])[0])
+            for i in range(count)]
+
+
+def read(tmp_path, data, name="photo.jpg"):
+    path = tmp_path / name
+    path.write_bytes(bytes(data))
+    return ExifReader.load(path)
+
+
+# ----------------- JPEG -----------------
+def test_exif_after_non_exif_app1(tmp_path):
+    exif = read(tmp_path, jpeg(segment(0xE1, XMP), segment(0xE1, EXIF)))
+    assert exif["Make"] == "Canon"
+    assert exif["ISOSpeedRatings"] == 400
+
+
+def test_skips_other_segments_fill_bytes_and_standalone_markers(tmp_path):
+    data = jpeg(
+        segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"),
+        segment(0xFE, b"a comment"),
+        b"\xff\xff\xff",  # fill bytes before the next marker
+        b"\xff\x01",      # TEM: no length
+        segment(0xE1, EXIF),
+    )
+    assert read(tmp_path, data)["Model"] == "EOS R5"
+
+
+def test_bytes_and_file_agree(tmp_path):
+    data = jpeg(segment(0xE1, XMP), segment(0xE1, EXIF))
+    assert ExifReader.parse_exif(ExifReader.raw_exif_from_bytes(data)) == read(tmp_path, data)
+
+
+def test_no_exif_before_image_data(tmp_path):
+    body = jpeg_body()
+    sos = body.index(b"\xff\xda")
+    # An Exif segment after the start of scan is image data, not metadata
+    data = b"\xff\xd8" + body[:sos] + b"\xff\xda" + segment(0xE1, EXIF)[2:] + body[sos + 2:]
+    assert read(tmp_path, data) == {}
+
+
+def test_truncated_exif_segment_is_corrupt(tmp_path):
+    exif = segment(0xE1, EXIF)
+    data = b"\xff\xd8" + segment(0xE1, XMP) + exif[:len(exif) // 2]
+    with pytest.raises(ValueError, match="truncated"):
+        ExifReader.raw_exif_from_bytes(data)
+    path = tmp_path / "cut.jpg"
+    path.write_bytes(data)
+    assert ExifReader.read_exif(path) == {}
+
+
+@pytest.mark.parametrize("cut", [3, 5, 12])
+def test_truncated_other_segment_has_no_exif(cut):
+    data = b"\xff\xd8" + segment(0xE1, XMP)[:cut]
+    assert ExifReader.raw_exif_from_bytes(data) is None
+
+
+def test_bad_marker_and_length_are_corrupt():
+    with pytest.raises(ValueError, match="expected a marker"):
+        jpeg_exif_block(io.BytesIO(b"\x00\xe1"))
+    with pytest.raises(ValueError, match="segment length"):
+        jpeg_exif_block(io.BytesIO(b"\xff\xe1\x00\x01"))
+
+
+# ----------------- TIFF -----------------
+def test_tiff_exif(tmp_path):
+    exif = read(tmp_path, tiff_with_exif(), "photo.tif")
+    assert exif["Make"] == "Canon"
+    assert exif["ISOSpeedRatings"] == 400
+    assert "StripOffsets" not in exif
+
+
+def test_tiff_ifd_offsets_that_loop(tmp_path):
+    data = tiff_with_exif()
+    ifd0 = struct.unpack("<I", data[4:8])[0]
+    entries = ifd_entries(data, ifd0)
+    next_at = ifd0 + 2 + 12 * len(entries)
+    data[next_at:next_at + 4] = struct.pack("<I", ifd0)  # IFD0 -> IFD0
+    assert read(tmp_path, data, "next.tif")["Make"] == "Canon"
+
+    for entry, tag in entries:
+        if tag == piexif.ImageIFD.ExifTag:
+            data[entry + 8:entry + 12] = struct.pack("<I", ifd0)  # Exif IFD -> IFD0
+    assert read(tmp_path, data, "exif.tif")["Make"] == "Canon"
+
+
+def test_batch_reports_unreadable_files(tmp_path):
+    good = tmp_path / "good.jpg"
+    good.write_bytes(jpeg(segment(0xE1, EXIF)))
+    bad = tmp_path / "bad.jpg"
+    bad.write_bytes(b"\xff\xd8\x00")
+    results, errors = ExifReader.read_exif_batch([good, bad], tags={"Make"}, workers=2)
+    assert results == {good: {"Make": "Canon"}}
+    assert list(errors) == [bad] and "ValueError" in errors[bad]
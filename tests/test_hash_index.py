@@ -0,0 +1,119 @@
+# tests/test_hash_index.py
+"""HammingIndex and hamming_clusters against brute-force pairwise Hamming grouping."""
+import random
+
+import pytest
+
+from hash_index import HASH_MASK, HammingIndex, hamming, hamming_clusters
+
+THRESHOLDS = (0, 1, 3, 5, 8)
+
+
+def brute_force_groups(hashes, max_distance):
+    """Connected components of the pairs within max_distance bits, singletons dropped."""
+    parent = list(range(len(hashes)))
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for i in range(len(hashes)):
+        for j in range(i + 1, len(hashes)):
+            if hamming(hashes[i], hashes[j]) <= max_distance:
+                parent[find(j)] = find(i)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), set()).add(i)
+    return {frozenset(group) for group in groups.values() if len(group) > 1}
+
+
+def label_groups(labels):
+    groups = {}
+    for i, label in enumerate(labels):
+        if label != -1:
+            groups.setdefault(int(label), set()).add(i)
+    return {frozenset(group) for group in groups.values()}
+
+
+def flip_bits(h, count, rng):
+    for bit in rng.sample(range(64), count):
+        h ^= 1 << bit
+    return h
+
+
+def corpus(seed=0, bases=40, max_flips=9):
+    """Random hashes with near copies at 0..max_flips bits, half of them with the top bit set."""
+    rng = random.Random(seed)
+    hashes = []
+    for i in range(bases):
+        base = rng.getrandbits(64)
+        base = base | (1 << 63) if i % 2 else base & ~(1 << 63)
+        hashes.append(base)
+        for _ in range(rng.randrange(0, 4)):
+            hashes.append(flip_bits(base, rng.randrange(0, max_flips + 1), rng))
+    hashes.append(hashes[0])  # exact duplicate
+    rng.shuffle(hashes)
+    return hashes
+
+
+def to_signed(h):
+    """A hash as Postgres BIGINT stores it."""
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+@pytest.mark.parametrize("max_distance", THRESHOLDS)
+def test_clusters_match_brute_force(max_distance):
+    hashes = corpus(seed=max_distance)
+    assert any(h >> 63 for h in hashes)
+    labels = hamming_clusters(hashes, max_distance)
+    assert label_groups(labels) == brute_force_groups(hashes, max_distance)
+
+
+@pytest.mark.parametrize("max_distance", THRESHOLDS)
+def test_clusters_accept_signed_hashes(max_distance):
+    hashes = corpus(seed=100 + max_distance)
+    signed = [to_signed(h) for h in hashes]
+    assert any(h < 0 for h in signed)
+    assert label_groups(hamming_clusters(signed, max_distance)) == brute_force_groups(hashes, max_distance)
+
+
+def test_threshold_zero_groups_identical_hashes_only():
+    top = (1 << 63) | 5
+    labels = hamming_clusters([top, 7, top, 6, 7, HASH_MASK], 0)
+    assert label_groups(labels) == {frozenset({0, 2}), frozenset({1, 4})}
+
+
+def test_clusters_small_memory_budget():
+    hashes = corpus(seed=7, bases=60)
+    labels = hamming_clusters(hashes, 5, memory_budget=64)
+    assert label_groups(labels) == brute_force_groups(hashes, 5)
+
+
+def test_clusters_empty():
+    assert len(hamming_clusters([], 5)) == 0
+
+
+@pytest.mark.parametrize("max_distance", THRESHOLDS)
+def test_index_query_matches_brute_force(max_distance):
+    hashes = corpus(seed=200 + max_distance)
+    index = HammingIndex(max_distance)
+    for i, h in enumerate(hashes):
+        index.add(i, to_signed(h) if i % 3 == 0 else h)
+    for i, h in enumerate(hashes):
+        expected = {(j, hamming(h, other)) for j, other in enumerate(hashes)
+                    if j != i and hamming(h, other) <= max_distance}
+        assert set(index.query(h, exclude=i)) == expected
+        assert set(index.query(to_signed(h), exclude=i)) == expected
+
+
+def test_index_add_replaces_and_remove_forgets():
+    index = HammingIndex(2)
+    index.add(1, 0b1111)
+    index.add(1, 1 << 63)
+    assert len(index) == 1
+    assert index.query(0b1111) == []
+    assert index.query((1 << 63) | 1) == [(1, 1)]
+    index.remove(1)
+    assert 1 not in index
+    assert index.query(1 << 63) == []
@@ -0,0 +1,199 @@
+# tests/test_image_decoder.py
+"""TIFF structure walking and embedded-preview selection, on small hand-built TIFF/RAW files."""
+import io
+import struct
+from itertools import islice
+
+import piexif
+import pytest
+from PIL import Image
+
+from image_decoder import (
+    COMPRESSION, JPEG_LENGTH, JPEG_OFFSET, MAX_IFDS, ORIENTATION, SOURCE_EXIF_THUMBNAIL, SOURCE_PREVIEW,
+    STRIP_BYTE_COUNTS, STRIP_OFFSETS, SUB_IFDS, _jpeg_frame_size, _jpeg_stream, _tiff_ifds, decode_image,
+)
+
+SHORT, LONG = 3, 4
+IFD_SLOT = 256  # bytes reserved per IFD, so every offset is known before the file is built
+IMAGE_WIDTH = 0x0100
+
+
+def ifd_offset(index):
+    return 8 + IFD_SLOT * index
+
+
+def build_tiff(ifds, payload=b"", endian="<"):
+    """
+    A TIFF whose IFD i starts at ifd_offset(i), followed by payload (at
+    ifd_offset(len(ifds))). The header points at IFD 0.
+    :param ifds: list of (entries, next_offset); entries are (tag, type, values)
+    """
+    out = bytearray(b"II*\x00" if endian == "<" else b"MM\x00*")
+    out += struct.pack(endian + "I", ifd_offset(0))
+    for index, (entries, next_offset) in enumerate(ifds):
+        extra_at = ifd_offset(index) + 2 + 12 * len(entries) + 4
+        body, extra = struct.pack(endian + "H", len(entries)), b""
+        for tag, value_type, values in entries:
+            data = struct.pack(endian + ("H" if value_type == SHORT else "I") * len(values), *values)
+            if len(data) <= 4:
+                field = data.ljust(4, b"\x00")
+            else:
+                field = struct.pack(endian + "I", extra_at + len(extra))
+                extra += data
+            body += struct.pack(endian + "HHI", tag, value_type, len(values)) + field
+        body += struct.pack(endian + "I", next_offset) + extra
+        assert len(body) <= IFD_SLOT
+        out += body.ljust(IFD_SLOT, b"\x00")
+    return bytes(out) + payload
+
+
+def jpeg_bytes(width, height, color="gray"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def lossless_jpeg(width, height):
+    """A stream with a lossless (SOF3) frame header, which PIL cannot display."""
+    frame = b"\xff\xc3" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + frame + b"\xff\xd9"
+
+
+def raw_file(previews, orientation=1):
+    """
+    A TIFF-based RAW: IFD0 carries a strip JPEG preview (old-style
+    Compression=6) and SubIFDs point at one JPEGInterchangeFormat preview each.
+    :param previews: JPEG streams; the first goes in IFD0
+    """
+    count = len(previews)
+    starts, payload = [], b""
+    for stream in previews:
+        starts.append(ifd_offset(count) + len(payload))
+        payload += stream
+    ifd0 = [
+        (COMPRESSION, SHORT, [6]), (STRIP_OFFSETS, LONG, [starts[0]]), (ORIENTATION, SHORT, [orientation]),
+        (STRIP_BYTE_COUNTS, LONG, [len(previews[0])]),
+        (SUB_IFDS, LONG, [ifd_offset(i) for i in range(1, count)]),
+    ]
+    subs = [
+        ([(JPEG_OFFSET, LONG, [start]), (JPEG_LENGTH, LONG, [len(stream)])], 0)
+        for start, stream in zip(starts[1:], previews[1:])
+    ]
+    return build_tiff([(ifd0, 0)] + subs, payload)
+
+
+def tags(ifds):
+    """IMAGE_WIDTH of each IFD visited; a walk that never ends fails instead of hanging."""
+    return [ifd[IMAGE_WIDTH][0] for ifd in islice(ifds, MAX_IFDS + 1)]
+
+
+# ----------------- IFD walking -----------------
+def test_ifd_chain_and_sub_ifds():
+    data = build_tiff([
+        ([(IMAGE_WIDTH, LONG, [0]), (SUB_IFDS, LONG, [ifd_offset(2), ifd_offset(3)])], ifd_offset(1)),
+        ([(IMAGE_WIDTH, LONG, [1])], 0),
+        ([(IMAGE_WIDTH, LONG, [2])], 0),
+        ([(IMAGE_WIDTH, LONG, [3])], 0),
+    ])
+    assert tags(_tiff_ifds(data)) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+def test_ifd_offsets_that_loop(endian):
+    data = build_tiff([
+        ([(IMAGE_WIDTH, SHORT, [0]), (SUB_IFDS, LONG, [ifd_offset(0)])], ifd_offset(1)),  # SubIFD -> itself
+        ([(IMAGE_WIDTH, SHORT, [1])], ifd_offset(0)),                                   # IFD1 -> IFD0
+    ], endian=endian)
+    assert tags(_tiff_ifds(data)) == [0, 1]
+
+    self_loop = build_tiff([([(IMAGE_WIDTH, SHORT, [7])], ifd_offset(0))], endian=endian)
+    assert tags(_tiff_ifds(self_loop)) == [7]
+
+
+def test_ifd_chain_is_bounded():
+    count = MAX_IFDS + 8
+    data = build_tiff([([(IMAGE_WIDTH, LONG, [i])], ifd_offset(i + 1) if i + 1 < count else 0)
+                       for i in range(count)])
+    assert tags(_tiff_ifds(data)) == list(range(MAX_IFDS))
+
+
+def test_ifd_offsets_out_of_bounds():
+    data = build_tiff([([(IMAGE_WIDTH, LONG, [0]), (SUB_IFDS, LONG, [4, 10 ** 9])], 10 ** 9)])
+    assert tags(_tiff_ifds(data)) == [0]
+    # An entry count running past the end of the file: only the complete entries are read
+    truncated = data[:ifd_offset(0) + 2 + 12]
+    assert tags(_tiff_ifds(truncated)) == [0]
+    # Out-of-line values past the end of the file are dropped
+    far = build_tiff([([(IMAGE_WIDTH, LONG, [1]), (SUB_IFDS, LONG, [1, 2, 3])], 0)])
+    cut = far[:ifd_offset(0) + 2 + 12 * 2 + 4]
+    assert list(_tiff_ifds(cut)) == [{IMAGE_WIDTH: (1,)}]
+
+
+# ----------------- JPEG streams -----------------
+def test_jpeg_stream_bounds():
+    preview = jpeg_bytes(64, 48)
+    data = raw_file([preview])
+    ifd0 = next(_tiff_ifds(data))
+    start, end, size = _jpeg_stream(data, ifd0)
+    assert data[start:end] == preview and size == (64, 48)
+    assert _jpeg_stream(data[:end - 1], ifd0) is None  # stream runs past the end
+    assert _jpeg_stream(data, {**ifd0, STRIP_OFFSETS: (start + 1,)}) is None  # no SOI there
+    assert _jpeg_frame_size(preview, 0, 4) is None
+
+
+# ----------------- RAW previews -----------------
+@pytest.mark.parametrize("order", [(0, 1, 2), (2, 0, 1), (1, 2, 0)])
+def test_raw_uses_largest_preview(tmp_path, order):
+    sizes = [(160, 120), (640, 480), (320, 240)]
+    previews = [jpeg_bytes(*sizes[i], color=("red", "green", "blue")[i]) for i in order]
+    path = tmp_path / "photo.dng"
+    path.write_bytes(raw_file(previews))
+
+    decoded = decode_image(path)
+    assert decoded.source == SOURCE_PREVIEW
+    assert decoded.image.size == (640, 480)
+    assert decoded.original_size == (640, 480)
+    assert decoded.image.getpixel((0, 0))[1] > 100  # the green one
+
+
+def test_raw_uses_smallest_preview_that_is_large_enough(tmp_path):
+    path = tmp_path / "photo.nef"
+    path.write_bytes(raw_file([jpeg_bytes(160, 120), jpeg_bytes(1280, 960), jpeg_bytes(320, 240)]))
+    decoded = decode_image(path, min_edge=300)
+    assert max(decoded.image.size) == 320
+    assert decoded.original_size == (1280, 960)  # always of the largest preview
+
+
+def test_raw_skips_lossless_streams_and_applies_orientation(tmp_path):
+    path = tmp_path / "photo.cr2"
+    path.write_bytes(raw_file([jpeg_bytes(200, 100), lossless_jpeg(4000, 3000)], orientation=6))
+    decoded = decode_image(path)
+    assert decoded.image.size == (100, 200)
+    assert decoded.original_size == (100, 200)
+
+
+def test_raw_without_preview(tmp_path):
+    path = tmp_path / "photo.arw"
+    path.write_bytes(build_tiff([([(IMAGE_WIDTH, LONG, [1])], 0)]))
+    with pytest.raises(ValueError, match="No embedded JPEG preview"):
+        decode_image(path)
+    path.write_bytes(b"not a tiff at all")
+    with pytest.raises(ValueError, match="Not a TIFF"):
+        decode_image(path)
+
+
+# ----------------- EXIF thumbnails -----------------
+def test_jpeg_exif_thumbnail_with_letterbox_bars(tmp_path):
+    thumb = Image.new("RGB", (160, 120), "black")
+    thumb.paste(Image.new("RGB", (160, 90), "white"), (0, 15))  # 16:9 picture padded to 4:3
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="JPEG", quality=95)
+    exif = piexif.dump({"0th": {}, "1st": {piexif.ImageIFD.Compression: 6}, "thumbnail": buffer.getvalue()})
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (1600, 900), "white").save(path, format="JPEG", exif=exif)
+
+    decoded = decode_image(path, min_edge=100)
+    assert decoded.source == SOURCE_EXIF_THUMBNAIL
+    assert decoded.image.size == (160, 90)
+    assert decoded.original_size == (1600, 900)
+    assert decode_image(path, min_edge=400).source != SOURCE_EXIF_THUMBNAIL
@@ -0,0 +1,157 @@
+# thumbnail_cache.py
+import hashlib
+import io
+import os
+import threading
+from pathlib import Path
+from PIL import Image
+
+GRID_THUMB_SIZE = 120
+FILMSTRIP_THUMB_SIZE = 80
+# Sizes written to the cache at import; ThumbnailPool scales the filmstrip's down from the grid's
+THUMB_SIZES = (GRID_THUMB_SIZE,)
+
+DEFAULT_CACHE_DIR = Path(os.getenv("AUTOCULL_CACHE_DIR", Path.home() / ".cache" / "autocull")) / "thumbnails"
+DEFAULT_MAX_MB = int(os.getenv("AUTOCULL_THUMB_CACHE_MB", "1024"))
+PRUNE_TARGET = 0.9  # after eviction, fill the cache up to this fraction of the cap
+JPEG_QUALITY = 85
+
+
+class ThumbnailCache:
+    """
+    Persistent on-disk thumbnail cache.
+    Entries are JPEG files keyed by (absolute path, file size, mtime, thumbnail size),
+    so an edited or replaced original never serves a stale thumbnail.
+    The cache is capped in bytes; when it grows past the cap the least recently
+    used entries (by file mtime, refreshed on every hit) are evicted.
+    Safe to use from several threads.
+    """
+
+    _shared = None
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None  # measured lazily on the first write
+
+    @classmethod
+    def shared(cls):
+        """Process-wide default cache used by the viewers and the importer."""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    # ----------------- Keys -----------------
+    @staticmethod
+    def key(file_path, size):
+        """Cache key for file_path at size, or None if the file cannot be stat'ed."""
+        try:
+            path = os.path.abspath(file_path)
+            st = os.stat(path)
+        except OSError:
+            return None
+        identity = f"{path}|{st.st_size}|{st.st_mtime_ns}|{size}"
+        return hashlib.sha1(identity.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.jpg"
+
+    # ----------------- Read -----------------
+    def get(self, file_path, size):
+        """Return the cached PIL thumbnail for file_path at size, or None on a miss."""
+        key = self.key(file_path, size)
+        if key is None:
+            return None
+        entry = self._entry_path(key)
+        try:
+            img = Image.open(entry)
+            img.load()
+            os.utime(entry)  # mark as recently used
+            return img
+        except OSError:
+            return None
+
+    # ----------------- Write -----------------
+    @staticmethod
+    def encode(img):
+        """Encode a PIL thumbnail the way it is stored, e.g. in an import worker."""
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=JPEG_QUALITY)
+        return buf.getvalue()
+
+    def put(self, file_path, size, img):
+        self.put_bytes(file_path, size, self.encode(img))
+
+    def put_bytes(self, file_path, size, data):
+        """Store an encoded thumbnail. Writes are atomic, so readers never see partial files."""
+        key = self.key(file_path, size)
+        if key is None:
+            return
+        entry = self._entry_path(key)
+        try:
+            replaced = entry.stat().st_size  # rewriting an entry only adds the difference
+        except OSError:
+            replaced = 0
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, entry)
+        except OSError as e:
+            print(f"Failed to cache thumbnail for {file_path}: {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._measure()
+            else:
+                self._total_bytes += len(data) - replaced
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.prune()
+
+    # ----------------- Eviction -----------------
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        entries = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".jpg"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _measure(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def prune(self):
+        """Evict least recently used entries until the cache is below PRUNE_TARGET of its cap."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * PRUNE_TARGET
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._total_bytes = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
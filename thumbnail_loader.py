@@ -0,0 +1,96 @@
+# thumbnail_loader.py
+import itertools
+import os
+import queue
+import threading
+
+LOADER_WORKERS = min(4, os.cpu_count() or 2)
+POLL_MS = 15       # how often the Tk loop collects finished thumbnails
+BATCH_SIZE = 32    # max thumbnails handed to the Tk loop per poll
+
+
+class ThumbnailLoader:
+    """
+    Decodes thumbnails on worker threads and hands them to the Tk loop in batches.
+
+    Requests carry a priority (lower first), so cells in the viewport are
+    decoded before the overscan around them. Requests can be withdrawn one by
+    one (discard, e.g. a cell scrolled away) or all at once (cancel_all, e.g.
+    the collection changed); withdrawn work is skipped by the workers and any
+    result that still arrives for it is dropped.
+
+    load_fn(payload) runs on a worker thread and must not touch Tk.
+    on_loaded(key, result) runs on the Tk thread.
+    """
+
+    def __init__(self, widget, load_fn, on_loaded, workers=LOADER_WORKERS):
+        self.widget = widget
+        self.load_fn = load_fn
+        self.on_loaded = on_loaded
+        self._requests = queue.PriorityQueue()
+        self._results = queue.SimpleQueue()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wanted = {}       # key -> generation of the live request
+        self._generation = 0
+        self._poll_id = None
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    # ----------------- Tk thread -----------------
+    def request(self, key, payload, priority=0):
+        with self._lock:
+            if key in self._wanted:
+                return
+            self._wanted[key] = self._generation
+            generation = self._generation
+        self._requests.put((priority, next(self._counter), generation, key, payload))
+        self._schedule_poll()
+
+    def discard(self, key):
+        with self._lock:
+            self._wanted.pop(key, None)
+
+    def cancel_all(self):
+        with self._lock:
+            self._generation += 1
+            self._wanted.clear()
+
+    def pending(self):
+        with self._lock:
+            return len(self._wanted)
+
+    def _schedule_poll(self):
+        if self._poll_id is None:
+            self._poll_id = self.widget.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        for _ in range(BATCH_SIZE):
+            try:
+                generation, key, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                live = self._wanted.get(key) == generation
+                if live:
+                    del self._wanted[key]
+            if live:
+                self.on_loaded(key, result)
+        if self.pending():
+            self._schedule_poll()
+
+    # ----------------- Worker threads -----------------
+    def _work(self):
+        while True:
+            _, _, generation, key, payload = self._requests.get()
+            with self._lock:
+                live = self._wanted.get(key) == generation
+            if not live:
+                continue
+            try:
+                result = self.load_fn(payload)
+            except Exception as e:
+                print(f"Failed to load thumbnail for {key}: {e}")
+                result = None
+            self._results.put((generation, key, result))
@@ -0,0 +1,131 @@
+# thumbnail_pool.py
+import os
+import threading
+from collections import OrderedDict
+from image_decoder import load_thumbnail
+from thumbnail_cache import ThumbnailCache, THUMB_SIZES
+
+DEFAULT_BUDGET_MB = int(os.getenv("AUTOCULL_THUMB_POOL_MB", "64"))
+
+
+class ThumbnailPool:
+    """
+    In-memory pool of decoded thumbnails shared by all thumbnail viewers.
+    Each photo is decoded once at source_size (from the on-disk cache when
+    possible); every smaller size is scaled down from that source. Entries are
+    kept in LRU order and evicted once their pixel data exceeds budget_bytes.
+    Hits and misses are counted per lookup. Safe to use from loader threads.
+    """
+
+    _shared = None
+
+    def __init__(self, cache=None, source_size=max(THUMB_SIZES), budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.cache = cache or ThumbnailCache.shared()
+        self.source_size = source_size
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()  # (file_path, size) -> PIL image
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    # ----------------- Lookup -----------------
+    def get(self, file_path, size):
+        """Return a PIL thumbnail of file_path fitting size x size, or None if it cannot be loaded."""
+        key = (file_path, size)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        if size > self.source_size:
+            return self._put(key, self._decode(file_path, size))
+
+        source = self._lookup((file_path, self.source_size))
+        if source is None:
+            source = self._put((file_path, self.source_size), self._load_source(file_path))
+        if source is None or size == self.source_size:
+            return source
+        img = source.copy()
+        img.thumbnail((size, size))
+        return self._put(key, img)
+
+    def peek(self, file_path, size):
+        """Return the thumbnail only if it is already in memory (never decodes; safe on the Tk thread)."""
+        with self._lock:
+            img = self._entries.get((file_path, size))
+            if img is not None:
+                self._entries.move_to_end((file_path, size))
+                self.hits += 1
+            return img
+
+    def _lookup(self, key):
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+            return img
+
+    def _load_source(self, file_path):
+        img = self.cache.get(file_path, self.source_size)
+        if img is None:
+            img = self._decode(file_path, self.source_size)
+            if img is not None:
+                self.cache.put(file_path, self.source_size, img)
+        return img
+
+    @staticmethod
+    def _decode(file_path, size):
+        try:
+            return load_thumbnail(file_path, size)
+        except Exception as e:
+            print(f"Failed to load thumbnail for {file_path}: {e}")
+            return None
+
+    # ----------------- Budget -----------------
+    @staticmethod
+    def _image_bytes(img):
+        return img.width * img.height * len(img.getbands())
+
+    def _put(self, key, img):
+        if img is None:
+            return None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._image_bytes(old)
+            self._entries[key] = img
+            self._bytes += self._image_bytes(img)
+            while self._bytes > self.budget_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._image_bytes(evicted)
+                self.evictions += 1
+        return img
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }